@@ -0,0 +1 @@
+"""Performance benchmarks for the detection core (not part of the app)."""
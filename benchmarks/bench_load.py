@@ -0,0 +1,402 @@
+"""End-to-end load test of the scoring service.
+
+Starts ``detector.service`` on a free local port (or targets ``--url``)
+and drives it with closed-loop virtual analysts. Each analyst sends a
+request, waits for the answer and sends the next one, picking the
+endpoint from a weighted mix of text, heuristic, CNN, tiled and cascade
+requests. Payloads are synthetic: multilingual texts and photo-like JPEGs
+from bench_scoring's generators. For every concurrency level it reports
+throughput, p50/p95/p99 latency (overall and per request kind), errors,
+and the CPU time and peak memory of the server and its worker processes.
+The service's result cache and near-duplicate lookup are switched off
+unless ``--cache`` is given, so every request runs the full pipeline.
+
+    python -m benchmarks.bench_load
+    python -m benchmarks.bench_load --concurrency 1 2 4 8 16 32 --mix text=6,heuristic=3,cnn=1 --slo-p99-ms 500
+    python -m benchmarks.bench_load --save-baseline load.json
+    python -m benchmarks.bench_load --compare load.json
+
+The load generator runs on the same machine as the service and takes
+some CPU from it, so compare runs made on the same hardware only.
+"""
+import argparse
+import http.client
+import io
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from benchmarks.bench_scoring import DEFAULT_THRESHOLD, environment, generate_image, generate_text
+from detector.metrics import memory_breakdown
+from detector.scoring import IMAGE_METHODS
+
+KINDS = ("text",) + IMAGE_METHODS
+DEFAULT_MIX = "text=4,heuristic=4,cnn=2"
+DEFAULT_CONCURRENCY = (1, 2, 4, 8, 16)
+# Distinct payloads per kind; requests cycle through them
+PAYLOAD_POOL = 16
+REQUEST_TIMEOUT = 120.0
+STARTUP_TIMEOUT = 300.0
+SAMPLE_INTERVAL = 0.5
+
+
+def parse_mix(spec):
+    """'text=4,cnn=1' -> {'text': 4.0, 'cnn': 1.0}"""
+    mix = {}
+    for part in filter(None, spec.split(",")):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in KINDS:
+            raise ValueError(f"Unknown request kind {kind!r}, expected one of {KINDS}")
+        mix[kind] = float(weight or 1)
+    if not mix or not any(mix.values()):
+        raise ValueError("The request mix needs at least one kind with a positive weight")
+    return mix
+
+
+def build_payloads(kinds, text_chars, image_size, pool=PAYLOAD_POOL):
+    """{kind: [(path, body, content type), ...]} of distinct synthetic requests"""
+    payloads = {}
+    images = None
+    for kind in kinds:
+        if kind == "text":
+            payloads[kind] = [("/v1/text", json.dumps({"text": generate_text(text_chars, seed=i)}).encode("utf-8"),
+                               "application/json") for i in range(pool)]
+            continue
+        if images is None:
+            images = []
+            for i in range(pool):
+                buffer = io.BytesIO()
+                generate_image(image_size, seed=i).save(buffer, format="JPEG", quality=90)
+                images.append(buffer.getvalue())
+        payloads[kind] = [(f"/v1/image?method={kind}", blob, "image/jpeg") for blob in images]
+    return payloads
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_service(port, workers, cache=False, extra_args=()):
+    env = dict(os.environ)
+    if not cache:
+        env.update(DETECTOR_CACHE_PATH="", DETECTOR_CACHE_MEMORY_ENTRIES="0", DETECTOR_NEAR_DUPLICATES="0")
+    command = [sys.executable, "-m", "detector.service", "--port", str(port), "--workers", str(workers), *extra_args]
+    return subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_until_healthy(host, port, process=None, timeout=STARTUP_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"The service exited with status {process.returncode} during start-up")
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=5)
+            conn.request("GET", "/healthz")
+            if conn.getresponse().status == 200:
+                conn.close()
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"The service did not become healthy within {timeout:.0f} s")
+
+
+def stop_service(process, timeout=30):
+    """Interrupt the service so it shuts its worker pool down; kill whatever is left after ``timeout``"""
+    pids = process_tree(process.pid)
+    process.send_signal(signal.SIGINT)
+    try:
+        process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+    for pid in pids[1:]:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+
+def process_tree(pid):
+    """``pid`` and all of its descendants, found through the parent pid in /proc/<pid>/stat"""
+    parents = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces, so fields are counted from the closing parenthesis
+                fields = f.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        parents.setdefault(int(fields[1]), []).append(int(entry))
+    tree, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        tree.append(current)
+        pending.extend(parents.get(current, ()))
+    return tree
+
+
+def cpu_seconds(pids):
+    """User plus system CPU time of the given processes, in seconds"""
+    ticks = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            ticks += int(fields[11]) + int(fields[12])
+        except (OSError, IndexError, ValueError):
+            continue
+    return ticks / os.sysconf("SC_CLK_TCK")
+
+
+class ResourceSampler(threading.Thread):
+    """Peak RSS and PSS of a process tree, sampled while a load level runs"""
+
+    def __init__(self, pid, interval=SAMPLE_INTERVAL):
+        super().__init__(name="load-sampler", daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.peak_rss = self.peak_pss = 0
+        self.pids = process_tree(pid)
+        self.cpu_start = cpu_seconds(self.pids)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        self.pids = process_tree(self.pid)
+        memories = [memory for memory in map(memory_breakdown, self.pids) if memory is not None]
+        self.peak_rss = max(self.peak_rss, sum(memory['rss'] for memory in memories))
+        # PSS splits shared pages (mapped weights, the interpreter) between workers instead of counting them per worker
+        self.peak_pss = max(self.peak_pss, sum(memory['pss'] for memory in memories))
+
+    def stop(self):
+        self.sample()
+        self.stopped.set()
+        self.join()
+        return cpu_seconds(self.pids) - self.cpu_start
+
+
+def _analyst(host, port, payloads, mix, seed, stop, records, in_flight):
+    rng = random.Random(seed)
+    kinds, weights = list(mix), list(mix.values())
+    conn = http.client.HTTPConnection(host, port, timeout=REQUEST_TIMEOUT)
+    name = threading.current_thread().name
+    while not stop.is_set():
+        kind = rng.choices(kinds, weights)[0]
+        path, body, content_type = rng.choice(payloads[kind])
+        start = time.perf_counter()
+        in_flight[name] = (kind, start)
+        try:
+            conn.request("POST", path, body, {"Content-Type": content_type})
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=REQUEST_TIMEOUT)
+            status = None
+        records.append((kind, start, time.perf_counter() - start, status))
+        del in_flight[name]
+    conn.close()
+
+
+def latency_summary(seconds):
+    if not len(seconds):
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None}
+    p50, p95, p99 = np.percentile(np.asarray(seconds) * 1000, [50, 95, 99])
+    return {'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99)}
+
+
+def run_level(host, port, payloads, mix, concurrency, duration, warmup, server_pid=None, seed=0):
+    """Drive ``concurrency`` analysts for ``warmup`` + ``duration`` seconds; only the last ``duration`` is measured
+
+    Every request started inside the measured window counts, however long
+    it takes to finish, so slow requests are never left out of the
+    percentiles. Analysts are waited for after the window; a request still
+    unanswered after REQUEST_TIMEOUT counts as an error.
+    """
+    stop = threading.Event()
+    records = []
+    in_flight = {}
+    analysts = [threading.Thread(target=_analyst, name=f"analyst-{i}", daemon=True,
+                                 args=(host, port, payloads, mix, seed * 1000 + i, stop, records, in_flight))
+                for i in range(concurrency)]
+    for analyst in analysts:
+        analyst.start()
+    time.sleep(warmup)
+    sampler = ResourceSampler(server_pid) if server_pid is not None else None
+    if sampler is not None:
+        sampler.start()
+    window_start = time.perf_counter()
+    time.sleep(duration)
+    window_end = time.perf_counter()
+    server_cpu = sampler.stop() if sampler is not None else None
+    stop.set()
+    deadline = time.perf_counter() + REQUEST_TIMEOUT
+    for analyst in analysts:
+        analyst.join(max(0.0, deadline - time.perf_counter()))
+    now = time.perf_counter()
+    unanswered = [(kind, start, now - start, None) for kind, start in list(in_flight.values())]
+
+    window = window_end - window_start
+    # Requests that started during the warm-up are left out; ones that started in the window count however long they took
+    measured = [record for record in records + unanswered if window_start <= record[1] < window_end]
+    succeeded = [record for record in measured if record[3] == 200]
+    result = {
+        'concurrency': concurrency,
+        'requests': len(measured),
+        'errors': len(measured) - len(succeeded),
+        'throughput_rps': len(succeeded) / window,
+        **latency_summary([record[2] for record in succeeded]),
+        'by_kind': {},
+        'cpu_percent': None if server_cpu is None else 100 * server_cpu / window,
+        'peak_rss_mb': None if sampler is None else sampler.peak_rss / 1024 ** 2,
+        'peak_pss_mb': None if sampler is None else sampler.peak_pss / 1024 ** 2,
+    }
+    for kind in mix:
+        latencies = [record[2] for record in succeeded if record[0] == kind]
+        result['by_kind'][kind] = {'requests': len(latencies), 'throughput_rps': len(latencies) / window,
+                                   **latency_summary(latencies)}
+    return result
+
+
+def max_concurrency_within(levels, slo_p99_ms):
+    """Highest concurrency that, like every lower level, meets the SLO without errors (None if the lowest misses)
+
+    A level where no request finished has no p99 and fails.
+    """
+    within = None
+    for level in sorted(levels, key=lambda level: level['concurrency']):
+        if (not level['requests'] or level['errors'] or level['p99_ms'] is None
+                or level['p99_ms'] > slo_p99_ms):
+            break
+        within = level['concurrency']
+    return within
+
+
+def compare(levels, baseline, threshold=DEFAULT_THRESHOLD):
+    """Levels whose throughput fell or whose p99 grew by more than ``threshold`` relative to the baseline"""
+    previous_levels = {level['concurrency']: level for level in baseline.get('levels', [])}
+    regressions = []
+    for level in levels:
+        previous = previous_levels.get(level['concurrency'])
+        if previous is None:
+            continue
+        if previous['throughput_rps'] and level['throughput_rps'] < previous['throughput_rps'] * (1 - threshold):
+            regressions.append({'concurrency': level['concurrency'], 'metric': "throughput_rps",
+                                'baseline': previous['throughput_rps'], 'current': level['throughput_rps']})
+        if previous['p99_ms'] and level['p99_ms'] is not None and level['p99_ms'] > previous['p99_ms'] * (1 + threshold):
+            regressions.append({'concurrency': level['concurrency'], 'metric': "p99_ms",
+                                'baseline': previous['p99_ms'], 'current': level['p99_ms']})
+    return regressions
+
+
+def _format(value, spec):
+    """format(value, spec), or a "-" padded to the same width for missing values"""
+    return format("-", ">" + spec.split(".")[0]) if value is None else format(value, spec)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the scoring service and report latency per concurrency level")
+    parser.add_argument("--url", help="test a service that is already running, e.g. http://127.0.0.1:8080")
+    parser.add_argument("--pid", type=int, help="with --url: the service's pid, to report its CPU and memory")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="scoring processes of the started service (0 = threads in the server process)")
+    parser.add_argument("--text-only", action="store_true", help="start the service with --text-only")
+    parser.add_argument("--cache", action="store_true", help="leave the result cache and near-duplicate lookup on")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=list(DEFAULT_CONCURRENCY))
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"weighted request kinds from {', '.join(KINDS)}")
+    parser.add_argument("--duration", type=float, default=15.0, help="measured seconds per level")
+    parser.add_argument("--warmup", type=float, default=3.0, help="unmeasured seconds before each level")
+    parser.add_argument("--text-chars", type=int, default=2000)
+    parser.add_argument("--image-size", type=int, nargs=2, default=(1024, 768), metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--slo-p99-ms", type=float, help="report the highest concurrency whose p99 stays within this")
+    parser.add_argument("--output", help="write this run's report as JSON")
+    parser.add_argument("--save-baseline", help="write this run as the new baseline file")
+    parser.add_argument("--compare", help="baseline file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="relative throughput drop or p99 growth that counts as a regression (default 0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as exc:
+        parser.error(str(exc))
+    payloads = build_payloads(mix, args.text_chars, tuple(args.image_size))
+
+    process = None
+    if args.url:
+        url = urlsplit(args.url)
+        host, port, server_pid = url.hostname, url.port or 80, args.pid
+    else:
+        host, port = "127.0.0.1", free_port()
+        process = start_service(port, args.workers, cache=args.cache, extra_args=["--text-only"] if args.text_only else [])
+        server_pid = process.pid
+    levels = []
+    try:
+        wait_until_healthy(host, port, process)
+        print(f"{'clients':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}{'CPU %':>8}{'RSS MB':>9}"
+              f"{'PSS MB':>9}", file=sys.stderr)
+        for i, concurrency in enumerate(args.concurrency):
+            level = run_level(host, port, payloads, mix, concurrency, args.duration, args.warmup,
+                              server_pid=server_pid, seed=i)
+            levels.append(level)
+            print(f"{concurrency:>8}{level['throughput_rps']:>9.1f}{_format(level['p50_ms'], '9.1f')}"
+                  f"{_format(level['p95_ms'], '9.1f')}{_format(level['p99_ms'], '9.1f')}{level['errors']:>8}"
+                  f"{_format(level['cpu_percent'], '8.0f')}{_format(level['peak_rss_mb'], '9.0f')}"
+                  f"{_format(level['peak_pss_mb'], '9.0f')}", file=sys.stderr)
+            for kind, stats in level['by_kind'].items():
+                print(f"{'':>8}  {kind:<10}{stats['throughput_rps']:>7.1f} req/s  "
+                      f"p50 {_format(stats['p50_ms'], '.1f')} / p99 {_format(stats['p99_ms'], '.1f')} ms",
+                      file=sys.stderr)
+    finally:
+        if process is not None:
+            stop_service(process)
+
+    report = {
+        'environment': environment(),
+        'created': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'config': {'mix': mix, 'workers': None if args.url else args.workers, 'cache': args.cache,
+                   'duration_s': args.duration, 'text_chars': args.text_chars, 'image_size': list(args.image_size)},
+        'levels': levels,
+    }
+    if args.slo_p99_ms is not None:
+        report['slo'] = {'p99_ms': args.slo_p99_ms, 'max_concurrency': max_concurrency_within(levels, args.slo_p99_ms)}
+        within = report['slo']['max_concurrency']
+        print(f"p99 <= {args.slo_p99_ms:.0f} ms without errors: "
+              f"{'no tested level' if within is None else f'up to {within} concurrent clients'}", file=sys.stderr)
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(levels, baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression['concurrency']} clients {regression['metric']}: "
+                  f"{regression['baseline']:.1f} -> {regression['current']:.1f}")
+        if regressions:
+            raise SystemExit(1)
+        print(f"No regressions beyond {args.threshold:.0%} against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Insert rate and lookup latency of the near-duplicate index at scale.
+
+Signatures are synthetic: random 64-bit pHash/dHash pairs for images and
+MinHash signatures of random shingle sets for texts. Lookups are split
+between near copies of stored items (a few hash bits flipped, or a few
+MinHash values replaced) and items that were never stored, and latency
+percentiles are reported for each.
+
+    python -m benchmarks.bench_neardup
+    python -m benchmarks.bench_neardup --entries 1000000 --queries 2000 --output neardup.json
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from detector.neardup import KINDS, MINHASH_PERMUTATIONS, NearDuplicateIndex
+
+SEED = 1234
+
+
+def synthetic_signatures(kind, n, rng):
+    width = 2 if kind == "image" else MINHASH_PERMUTATIONS
+    return rng.integers(0, 2**63, size=(n, width), dtype=np.uint64) * np.uint64(2)
+
+
+def near_copy(kind, signature, rng, max_distance):
+    copy = signature.copy()
+    if kind == "image":
+        for column in range(2):
+            for bit in rng.choice(64, size=int(max_distance), replace=False):
+                copy[column] ^= np.uint64(1) << np.uint64(bit)
+    else:
+        changed = rng.choice(len(copy), size=int(max_distance * len(copy)), replace=False)
+        copy[changed] = rng.integers(0, 2**63, size=len(changed), dtype=np.uint64)
+    return copy
+
+
+def percentiles(samples):
+    values = np.asarray(samples) * 1e6
+    return {f"p{q}_us": float(np.percentile(values, q)) for q in (50, 95, 99)}
+
+
+def measure_kind(kind, entries, queries, seed=SEED):
+    rng = np.random.default_rng(seed)
+    signatures = synthetic_signatures(kind, entries, rng)
+    index = NearDuplicateIndex(kind)
+    start = time.perf_counter()
+    for i, signature in enumerate(signatures):
+        index.add(f"key-{i}", signature)
+    index.compact()
+    insert_seconds = time.perf_counter() - start
+
+    timings = {"near": [], "miss": []}
+    found = 0
+    for _ in range(queries):
+        near = near_copy(kind, signatures[rng.integers(entries)], rng, index.max_distance)
+        start = time.perf_counter()
+        found += index.query(near) is not None
+        timings["near"].append(time.perf_counter() - start)
+        miss = synthetic_signatures(kind, 1, rng)[0]
+        start = time.perf_counter()
+        index.query(miss)
+        timings["miss"].append(time.perf_counter() - start)
+    return {
+        'entries': entries,
+        'inserts_per_second': entries / insert_seconds,
+        'recall': found / queries,
+        'near': percentiles(timings["near"]),
+        'miss': percentiles(timings["miss"]),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure near-duplicate index inserts and lookups")
+    parser.add_argument("--kinds", nargs="+", choices=KINDS, default=list(KINDS))
+    parser.add_argument("--entries", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args(argv)
+
+    results = {}
+    print(f"{'kind':<8}{'entries':>10}{'inserts/s':>12}{'recall':>8}{'near p50/p99 us':>18}{'miss p50/p99 us':>18}",
+          file=sys.stderr)
+    for kind in args.kinds:
+        result = results[kind] = measure_kind(kind, args.entries, args.queries)
+        print(f"{kind:<8}{result['entries']:>10}{result['inserts_per_second']:>12.0f}{result['recall']:>8.3f}"
+              f"{result['near']['p50_us']:>9.0f}/{result['near']['p99_us']:<8.0f}"
+              f"{result['miss']['p50_us']:>9.0f}/{result['miss']['p99_us']:<8.0f}", file=sys.stderr)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""Micro-benchmarks for the text and image scoring functions.
+
+Inputs are generated deterministically from a fixed seed: multilingual
+texts from 100 characters to 10 MB and images from 256 px to 8K. Each
+function is timed at every size. Results can be saved as a JSON baseline
+and later runs compared against it; a case whose median time grows by
+more than --threshold is flagged and the run exits non-zero.
+
+    python -m benchmarks.bench_scoring --save-baseline benchmarks/baseline.json
+    python -m benchmarks.bench_scoring --compare benchmarks/baseline.json
+    python -m benchmarks.bench_scoring --quick --filter perplexity
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+from detector.image import analyze_image_characteristics
+from detector.text import (
+    analyze_burstiness,
+    analyze_multilingual_patterns,
+    analyze_syntactic_complexity,
+    calculate_perplexity,
+    detect_language,
+)
+
+SEED = 1234
+TEXT_SIZES = [100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+IMAGE_SIZES = [(256, 256), (512, 512), (1024, 1024), (1920, 1080), (3840, 2160), (7680, 4320)]
+QUICK_TEXT_LIMIT = 100_000
+QUICK_IMAGE_LIMIT = 1024 * 1024
+DEFAULT_THRESHOLD = 0.25
+
+VOCABULARY = {
+    'en': "the model writes text quickly and every sentence looks similar to the last one we read".split(),
+    'hi': "मैं हम आप यह वह है था और लेकिन हालांकि इसके अलावा प्यार खुशी यार वाह कमाल घर काम".split(),
+    'mr': "मी आम्ही तुम्ही सगळे काम वेळ मिळाले आणि पण कारण घर शाळा".split(),
+    'bn': "আমি তুমি আমরা এবং কিন্তু বাড়ি কাজ ভালো সময় মানুষ".split(),
+    'ta': "நான் நாம் அவர் மற்றும் ஆனால் வீடு வேலை நல்ல நேரம்".split(),
+    'te': "నేను మేము మీరు మరియు కానీ ఇల్లు పని మంచి సమయం".split(),
+    'ur': "میں ہم آپ اور لیکن گھر کام اچھا وقت لوگ".split(),
+}
+PUNCTUATION = [".", ".", "?", "!", "।"]
+
+
+def generate_text(chars, seed=SEED):
+    """Deterministic multilingual prose of exactly ``chars`` characters"""
+    rng = random.Random(seed)
+    languages = list(VOCABULARY)
+    parts, length = [], 0
+    while length < chars:
+        words = VOCABULARY[rng.choice(languages)]
+        sentence = " ".join(rng.choice(words) for _ in range(rng.randint(4, 18))) + rng.choice(PUNCTUATION) + " "
+        parts.append(sentence)
+        length += len(sentence)
+    return "".join(parts)[:chars]
+
+
+def generate_image(size, seed=SEED):
+    """Deterministic RGB image: smooth gradients plus noise, like a photo rather than a flat fill"""
+    width, height = size
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)[None, :]
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    pixels = np.empty((height, width, 3), dtype=np.uint8)
+    for channel, (a, b) in enumerate([(0.6, 0.4), (0.3, 0.7), (0.5, 0.5)]):
+        noise = rng.integers(0, 48, (height, width), dtype=np.uint8)
+        pixels[..., channel] = np.clip(a * x + b * y, 0, 207).astype(np.uint8) + noise
+    return Image.fromarray(pixels)
+
+
+def measure(func, arg, min_time=0.2, max_repeats=20):
+    start = time.perf_counter()
+    func(arg)
+    first = time.perf_counter() - start
+    times = [first]
+    # Large inputs get a single extra run; small ones repeat until min_time has elapsed
+    target_repeats = 2 if first > 1.0 else max_repeats
+    while len(times) < target_repeats and (sum(times) < min_time or len(times) < 3):
+        start = time.perf_counter()
+        func(arg)
+        times.append(time.perf_counter() - start)
+    return {'median_s': statistics.median(times), 'min_s': min(times), 'repeats': len(times)}
+
+
+CNN_CASES = ('cnn_forward', 'prepare_image_jpeg', 'cnn_detect_jpeg')
+# Cases that run the model, so it is loaded before they are timed
+MODEL_CASES = ('cnn_forward', 'cnn_detect_jpeg')
+
+
+def _cnn_cases(wanted):
+    """(forward, per-JPEG) cases passing ``wanted``; torch and the model are only loaded if one needs them"""
+    if not any(wanted(name) for name in CNN_CASES):
+        return {}, {}
+    try:
+        import torch
+        from detector.models import detect_images, get_registry
+        from detector.preprocess import INPUT_SIZE, prepare_image
+    except ImportError:
+        return {}, {}
+    if any(wanted(name) for name in MODEL_CASES):
+        entry = get_registry().get()
+    forward = {}
+    if wanted('cnn_forward'):
+        batch = torch.rand(1, 3, *INPUT_SIZE, generator=torch.Generator().manual_seed(SEED))
+        forward['cnn_forward'] = lambda _: entry.forward(batch)
+    per_image = {
+        'prepare_image_jpeg': prepare_image,
+        'cnn_detect_jpeg': lambda blob: detect_images([prepare_image(blob)]),
+    }
+    return forward, {name: func for name, func in per_image.items() if wanted(name)}
+
+
+def _jpeg_bytes(image):
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def run_benchmarks(quick=False, name_filter=None, log=sys.stderr):
+    text_sizes = [s for s in TEXT_SIZES if not quick or s <= QUICK_TEXT_LIMIT]
+    image_sizes = [s for s in IMAGE_SIZES if not quick or s[0] * s[1] <= QUICK_IMAGE_LIMIT]
+
+    text_functions = {
+        'calculate_perplexity': calculate_perplexity,
+        'analyze_burstiness': analyze_burstiness,
+        'analyze_syntactic_complexity': analyze_syntactic_complexity,
+        'detect_language': detect_language,
+        'analyze_multilingual_patterns': lambda text: analyze_multilingual_patterns(text, 'hi'),
+    }
+    image_functions = {'analyze_image_characteristics': analyze_image_characteristics}
+
+    def wanted(name):
+        return name_filter is None or name_filter in name
+
+    forward_functions, jpeg_functions = _cnn_cases(wanted)
+
+    results = {}
+
+    def record(name, size_label, func, arg):
+        key = f"{name}[{size_label}]"
+        results[key] = measure(func, arg)
+        print(f"{key:<50} {results[key]['median_s'] * 1000:>12.3f} ms", file=log)
+
+    if any(wanted(name) for name in text_functions):
+        corpus = generate_text(max(text_sizes))
+        for size in text_sizes:
+            text = corpus[:size]
+            for name, func in text_functions.items():
+                if wanted(name):
+                    record(name, f"{size}c", func, text)
+
+    if any(wanted(name) for name in list(image_functions) + list(jpeg_functions)):
+        for size in image_sizes:
+            image = generate_image(size)
+            label = f"{size[0]}x{size[1]}"
+            for name, func in image_functions.items():
+                if wanted(name):
+                    record(name, label, func, image)
+            if any(wanted(name) for name in jpeg_functions):
+                blob = _jpeg_bytes(image)
+                for name, func in jpeg_functions.items():
+                    if wanted(name):
+                        record(name, label, func, blob)
+            del image
+
+    for name, func in forward_functions.items():
+        if wanted(name):
+            record(name, "224x224", func, None)
+    return results
+
+
+def environment():
+    info = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+    }
+    try:
+        import torch
+        info['torch'] = torch.__version__
+        info['torch_threads'] = torch.get_num_threads()
+    except ImportError:
+        pass
+    return info
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Cases whose median grew by more than ``threshold`` relative to the baseline"""
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get('results', {}).get(key)
+        if previous is None:
+            continue
+        ratio = current['median_s'] / previous['median_s'] if previous['median_s'] else float("inf")
+        if ratio > 1 + threshold:
+            regressions.append({'case': key, 'baseline_s': previous['median_s'], 'current_s': current['median_s'], 'ratio': ratio})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the text and image scoring functions")
+    parser.add_argument("--quick", action="store_true", help="only texts up to 100 KB and images up to 1 MP")
+    parser.add_argument("--filter", help="only run cases whose function name contains this string")
+    parser.add_argument("--output", help="write this run's results as JSON")
+    parser.add_argument("--save-baseline", help="write this run as the new baseline file")
+    parser.add_argument("--compare", help="baseline file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="relative slowdown that counts as a regression (default 0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(quick=args.quick, name_filter=args.filter)
+    report = {'environment': environment(), 'created': time.strftime("%Y-%m-%dT%H:%M:%S"), 'results': results}
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression['case']}: {regression['baseline_s'] * 1000:.3f} ms -> "
+                  f"{regression['current_s'] * 1000:.3f} ms ({regression['ratio']:.2f}x)")
+        if regressions:
+            raise SystemExit(1)
+        print(f"No regressions beyond {args.threshold:.0%} against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
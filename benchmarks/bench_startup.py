@@ -0,0 +1,87 @@
+"""Cold-start and rerun latency of the Streamlit app.
+
+Each mode runs in a fresh interpreter so imports are really cold. The app
+is driven headless through Streamlit's AppTest: the first run is the cold
+start a new server process pays, the following runs are the reruns every
+widget interaction triggers, and one text analysis is timed on top.
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --modes text-only --reruns 20 --output startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+MODES = {"full": {}, "text-only": {"DETECTOR_TEXT_ONLY": "1"}}
+SAMPLE_TEXT = "यह एक छोटा परीक्षण है। इसमें कुछ वाक्य हैं, और हर वाक्य अलग है! " * 10
+
+# Runs inside the child interpreter; prints one JSON line
+_CHILD = """
+import json, statistics, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+streamlit_seconds = time.perf_counter() - start
+app = AppTest.from_file({app!r}, default_timeout=300)
+start = time.perf_counter()
+app.run()
+first_run = time.perf_counter() - start
+reruns = []
+for _ in range({reruns}):
+    start = time.perf_counter()
+    app.run()
+    reruns.append(time.perf_counter() - start)
+app.text_area(key="text_input").input({text!r})
+start = time.perf_counter()
+app.button(key="analyze_text").click().run()
+analyze = time.perf_counter() - start
+print(json.dumps({{
+    'streamlit_import_seconds': streamlit_seconds,
+    'first_run_seconds': first_run,
+    'rerun_median_ms': statistics.median(reruns) * 1000,
+    'analyze_text_ms': analyze * 1000,
+    'torch_imported': 'torch' in sys.modules,
+    'pil_imported': 'PIL.Image' in sys.modules,
+    'exceptions': [str(e.value) for e in app.exception],
+}}))
+"""
+
+
+def measure_mode(mode, reruns):
+    env = dict(os.environ, DETECTOR_CACHE_PATH="", **MODES[mode])
+    code = _CHILD.format(app=APP_PATH, reruns=reruns, text=SAMPLE_TEXT)
+    output = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure app cold start and per-rerun latency")
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    parser.add_argument("--reruns", type=int, default=10)
+    parser.add_argument("--repeats", type=int, default=1, help="fresh interpreters per mode (medians are reported)")
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args(argv)
+
+    results = {}
+    print(f"{'mode':<12}{'first run s':>13}{'rerun ms':>10}{'analyze ms':>12}  imports", file=sys.stderr)
+    for mode in args.modes:
+        runs = [measure_mode(mode, args.reruns) for _ in range(args.repeats)]
+        result = {key: statistics.median(run[key] for run in runs) if isinstance(runs[0][key], float) else runs[0][key]
+                  for key in runs[0]}
+        results[mode] = result
+        imports = ", ".join(name for name, flag in (("torch", result['torch_imported']), ("PIL", result['pil_imported']))
+                            if flag) or "no torch/PIL"
+        print(f"{mode:<12}{result['first_run_seconds']:>13.2f}{result['rerun_median_ms']:>10.1f}"
+              f"{result['analyze_text_ms']:>12.1f}  {imports}", file=sys.stderr)
+        for exception in result['exceptions']:
+            print(f"  app raised: {exception}", file=sys.stderr)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
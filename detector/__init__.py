@@ -0,0 +1 @@
+"""Detection core shared by the Streamlit app and the headless entry points."""
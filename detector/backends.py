@@ -0,0 +1,159 @@
+"""CPU inference backends for the CNN detector.
+
+The backend is chosen once per process (DETECTOR_BACKEND or the registry
+argument) and applied when the model is loaded:
+
+    eager          fp32 eager mode (reference)
+    channels_last  fp32 with NHWC weights and inputs
+    int8           FX static int8 quantization for the x86/fbgemm engine
+    torchscript    scripted and frozen graph
+    compiled       torch.compile graph (dynamic batch size)
+
+``python -m detector.backends`` checks every backend's probabilities
+against eager fp32 and compares latency/throughput for batch sizes 1-64.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import time
+import warnings
+
+import torch
+
+BACKENDS = ("eager", "channels_last", "int8", "torchscript", "compiled")
+DEFAULT_BACKEND = os.environ.get("DETECTOR_BACKEND", "eager")
+CALIBRATION_BATCHES = 8
+# Largest absolute difference in AI probability from eager fp32 that a backend may show
+DEFAULT_TOLERANCE = 1e-2
+
+
+def unavailable_reason(backend):
+    """Why ``backend`` cannot be built on this host, or None when it can"""
+    if backend == "int8" and not {"x86", "fbgemm"} & set(torch.backends.quantized.supported_engines):
+        return "no x86/fbgemm quantized engine in this torch build"
+    if backend == "compiled" and not any(shutil.which(compiler) for compiler in ("cc", "gcc", "clang")):
+        return "torch.compile needs a C compiler"
+    return None
+
+
+def calibration_batches(input_size, batches=CALIBRATION_BATCHES, batch_size=8, seed=0):
+    """Synthetic calibration inputs (noise, gradients, flat colours) covering the [0, 1] range
+
+    Pass real images to build_backend for calibration that matches production data.
+    """
+    generator = torch.Generator().manual_seed(seed)
+    height, width = input_size
+    ramp = torch.linspace(0, 1, width).expand(3, height, width)
+    for i in range(batches):
+        noise = torch.rand(batch_size, 3, height, width, generator=generator)
+        flat = torch.rand(batch_size, 3, 1, 1, generator=generator).expand(-1, -1, height, width)
+        yield (noise + flat + ramp) / 3 if i % 2 else noise
+
+
+def _quantize_int8(model, example, calibration):
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    engine = "x86" if "x86" in torch.backends.quantized.supported_engines else "fbgemm"
+    torch.backends.quantized.engine = engine
+    prepared = prepare_fx(model, get_default_qconfig_mapping(engine), (example,))
+    with torch.inference_mode():
+        for batch in calibration:
+            prepared(batch)
+    return convert_fx(prepared)
+
+
+def build_backend(model, backend, input_size, calibration=None):
+    """Return (module, input memory format) for ``backend`` from an eval-mode fp32 model"""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+    example = torch.zeros(1, 3, *input_size)
+    # The TorchScript and FX quantization APIs emit deprecation warnings on recent torch
+    with warnings.catch_warnings():
+        for category in (FutureWarning, DeprecationWarning, UserWarning):
+            warnings.simplefilter("ignore", category)
+        if backend == "eager":
+            return model, torch.contiguous_format
+        if backend == "channels_last":
+            return model.to(memory_format=torch.channels_last), torch.channels_last
+        if backend == "int8":
+            return _quantize_int8(model, example, calibration or calibration_batches(input_size)), torch.contiguous_format
+        if backend == "torchscript":
+            return torch.jit.freeze(torch.jit.script(model)), torch.contiguous_format
+        return torch.compile(model, dynamic=True), torch.contiguous_format
+
+
+def _time_forward(entry, batch, repeats):
+    entry.forward(batch)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        entry.forward(batch)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def compare_backends(backends=BACKENDS, batch_sizes=(1, 2, 4, 8, 16, 32, 64), repeats=10, tolerance=DEFAULT_TOLERANCE, seed=0):
+    """Parity against eager fp32 plus median latency and throughput per batch size"""
+    from detector.models import ModelRegistry
+    from detector.preprocess import INPUT_SIZE
+
+    generator = torch.Generator().manual_seed(seed)
+    parity_batch = torch.rand(max(batch_sizes), 3, *INPUT_SIZE, generator=generator)
+    registry = ModelRegistry()
+    reference = registry.get(backend="eager").forward(parity_batch)
+
+    report = {}
+    for backend in backends:
+        entry = registry.get(backend=backend)
+        max_diff = (entry.forward(parity_batch) - reference).abs().max().item()
+        rows = []
+        for batch_size in batch_sizes:
+            latency = _time_forward(entry, parity_batch[:batch_size], repeats)
+            rows.append({'batch_size': batch_size, 'latency_ms': latency * 1000, 'images_per_s': batch_size / latency})
+        report[backend] = {
+            'max_prob_diff': max_diff,
+            'within_tolerance': max_diff <= tolerance,
+            'load_seconds': entry.load_seconds,
+            'warmup_seconds': entry.warmup_seconds,
+            'batches': rows,
+        }
+    return report
+
+
+def fastest_within_tolerance(report, batch_size):
+    candidates = []
+    for backend, result in report.items():
+        if result['within_tolerance']:
+            row = next((r for r in result['batches'] if r['batch_size'] == batch_size), None)
+            if row is not None:
+                candidates.append((row['images_per_s'], backend))
+    return max(candidates)[1] if candidates else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare CNN inference backends on this CPU")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="max absolute probability difference vs eager fp32")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    report = compare_backends(args.backends, args.batch_sizes, args.repeats, args.tolerance)
+    print(f"{'backend':<14}{'max diff':>10}  " + "".join(f"{'bs=' + str(b):>10}" for b in args.batch_sizes) + "   (images/s)")
+    for backend, result in report.items():
+        flag = "" if result['within_tolerance'] else " !"
+        print(f"{backend:<14}{result['max_prob_diff']:>10.2e}{flag:2}"
+              + "".join(f"{row['images_per_s']:>10.1f}" for row in result['batches']))
+    for batch_size in (args.batch_sizes[0], args.batch_sizes[-1]):
+        print(f"Fastest within tolerance at batch size {batch_size}: {fastest_within_tolerance(report, batch_size)}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""Bulk batch-scoring CLI.
+
+Scores a directory of images and/or a JSONL file of texts across a
+process pool and streams one record per item to a JSONL or CSV file.
+Re-running with ``--resume`` skips items already present in the output,
+so an interrupted back-fill continues where it stopped.
+
+    python -m detector.batch --images archive/ --texts posts.jsonl --output scores.jsonl --workers 8
+
+Text lines are JSON objects with a ``text`` field and an optional ``id``.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+
+from detector.corpus import score_corpus
+from detector.scoring import IMAGE_METHODS, json_default, score_images, score_text, warm_up
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+CSV_FIELDS = [
+    "id", "kind", "ai_prob", "real_prob", "human_prob",
+    "language", "perplexity", "burstiness", "syntactic_complexity", "error",
+]
+
+
+def iter_image_items(root):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                path = os.path.join(dirpath, filename)
+                yield os.path.relpath(path, root), path
+
+
+def iter_text_items(path):
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                text = record["text"]
+            except (ValueError, KeyError, TypeError):
+                print(f"Skipping malformed line {line_number} of {path}", file=sys.stderr)
+                continue
+            yield str(record.get("id", f"{os.path.basename(path)}:{line_number}")), text
+
+
+def chunked(items, size):
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _init_worker(cnn, torch_threads):
+    if cnn:
+        import torch
+        torch.set_num_threads(torch_threads)
+    warm_up(cnn)
+
+
+def score_image_chunk(items, method, batch_size):
+    """Worker task: score (id, path) pairs, falling back to one-by-one if the batch fails"""
+    start = time.perf_counter()
+    ids = [item_id for item_id, _ in items]
+    try:
+        scores = score_images([path for _, path in items], method=method, batch_size=batch_size)
+        records = [dict(id=item_id, kind="image", **score) for item_id, score in zip(ids, scores)]
+    except Exception:
+        records = []
+        for item_id, path in items:
+            try:
+                records.append(dict(id=item_id, kind="image", **score_images([path], method=method)[0]))
+            except Exception as exc:
+                records.append({'id': item_id, 'kind': "image", 'error': f"{type(exc).__name__}: {exc}"})
+    return os.getpid(), time.perf_counter() - start, records
+
+
+def score_text_chunk(items):
+    """Worker task: score (id, text) pairs as one vectorized corpus, falling back to one-by-one"""
+    start = time.perf_counter()
+    try:
+        scores = score_corpus([text for _, text in items])
+        records = [
+            {'id': item_id, 'kind': "text", 'ai_prob': ai_prob, 'human_prob': human_prob, 'insights': insights}
+            for (item_id, _), ai_prob, human_prob, insights
+            in zip(items, scores['ai_prob'].tolist(), scores['human_prob'].tolist(), scores['insights'])
+        ]
+    except Exception:
+        records = []
+        for item_id, text in items:
+            try:
+                records.append(dict(id=item_id, kind="text", **score_text(text)))
+            except Exception as exc:
+                records.append({'id': item_id, 'kind': "text", 'error': f"{type(exc).__name__}: {exc}"})
+    return os.getpid(), time.perf_counter() - start, records
+
+
+def _truncate_partial_line(path):
+    """Drop a half-written last line left behind by an interrupted run"""
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+
+def completed_ids(path, fmt):
+    if not os.path.exists(path):
+        return set()
+    _truncate_partial_line(path)
+    done = set()
+    with open(path, encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for row in rows:
+            done.add((row["kind"], row["id"]))
+    return done
+
+
+class JsonlWriter:
+    def __init__(self, f, include_insights=True):
+        self.f = f
+        self.include_insights = include_insights
+
+    def write(self, record):
+        if not self.include_insights:
+            record = {k: v for k, v in record.items() if k != "insights"}
+        self.f.write(json.dumps(record, default=json_default, ensure_ascii=False) + "\n")
+
+
+class CsvWriter:
+    def __init__(self, f, write_header):
+        self.writer = csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction="ignore")
+        if write_header:
+            self.writer.writeheader()
+
+    def write(self, record):
+        row = dict(record)
+        insights = row.pop("insights", None)
+        if insights:
+            row["language"] = insights["language"]["code"]
+            row.update({k: float(v) for k, v in insights["advanced_metrics"].items()})
+        self.writer.writerow(row)
+
+
+class ThroughputStats:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.items = 0
+        self.errors = 0
+        self.worker_items = defaultdict(int)
+        self.worker_seconds = defaultdict(float)
+        self.stages = defaultdict(int)
+
+    def record(self, pid, seconds, records):
+        self.items += len(records)
+        for record in records:
+            if "stage" in record:
+                self.stages[record["stage"]] += 1
+        self.errors += sum(1 for record in records if "error" in record)
+        self.worker_items[pid] += len(records)
+        self.worker_seconds[pid] += seconds
+
+    def summary(self):
+        wall = time.perf_counter() - self.start
+        lines = [f"Scored {self.items} items ({self.errors} errors) in {wall:.1f}s "
+                 f"- {self.items / wall if wall else 0:.1f} items/s overall"]
+        if self.stages:
+            resolved = sum(self.stages.values())
+            lines.append("  cascade: " + ", ".join(f"{count / resolved:.0%} resolved by {name}"
+                                                 for name, count in self.stages.items()))
+        for pid in sorted(self.worker_items):
+            items, busy = self.worker_items[pid], self.worker_seconds[pid]
+            lines.append(f"  worker {pid}: {items} items, {busy:.1f}s busy, {items / busy if busy else 0:.1f} items/s")
+        return "\n".join(lines)
+
+
+def run(args):
+    fmt = args.format or ("csv" if args.output.lower().endswith(".csv") else "jsonl")
+    done = completed_ids(args.output, fmt) if args.resume else set()
+    if args.resume and done:
+        print(f"Resuming: {len(done)} items already scored", file=sys.stderr)
+
+    def pending(kind, items):
+        return ((item_id, value) for item_id, value in items if (kind, item_id) not in done)
+
+    tasks = []
+    if args.images:
+        tasks.append(((score_image_chunk, chunk, args.image_method, args.batch_size)
+                      for chunk in chunked(pending("image", iter_image_items(args.images)), args.batch_size)))
+    if args.texts:
+        tasks.append(((score_text_chunk, chunk)
+                      for chunk in chunked(pending("text", iter_text_items(args.texts)), args.text_chunk)))
+
+    append = args.resume and os.path.exists(args.output)
+    use_cnn = bool(args.images) and args.image_method != "heuristic"
+    torch_threads = args.torch_threads or max(1, (os.cpu_count() or 1) // args.workers)
+    stats = ThroughputStats()
+
+    with open(args.output, "a" if append else "w", encoding="utf-8", newline="") as out, \
+            ProcessPoolExecutor(args.workers, initializer=_init_worker, initargs=(use_cnn, torch_threads)) as pool:
+        writer = CsvWriter(out, write_header=not append) if fmt == "csv" else JsonlWriter(out, not args.no_insights)
+        task_iter = (task for source in tasks for task in source)
+        in_flight = set()
+        # Keep a bounded number of chunks queued so millions of items never sit in memory
+        max_in_flight = args.workers * 2
+        while True:
+            for task in islice(task_iter, max_in_flight - len(in_flight)):
+                in_flight.add(pool.submit(*task))
+            if not in_flight:
+                break
+            finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                pid, seconds, records = future.result()
+                for record in records:
+                    writer.write(record)
+                stats.record(pid, seconds, records)
+            out.flush()
+
+    print(stats.summary(), file=sys.stderr)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score archived images and texts in bulk")
+    parser.add_argument("--images", help="directory scanned recursively for jpg/jpeg/png files")
+    parser.add_argument("--texts", help="JSONL file with one {\"id\": ..., \"text\": ...} object per line")
+    parser.add_argument("--output", required=True, help="results file (.jsonl or .csv)")
+    parser.add_argument("--format", choices=("jsonl", "csv"), help="defaults to the output file extension")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--image-method", choices=IMAGE_METHODS, default="cnn",
+                        help="tiled scores full-resolution patches instead of one 224x224 resize; "
+                             "cascade runs the CNN only where the heuristic is uncertain")
+    parser.add_argument("--batch-size", type=int, default=32, help="images per CNN forward pass")
+    parser.add_argument("--text-chunk", type=int, default=64, help="texts per worker task")
+    parser.add_argument("--torch-threads", type=int, help="intra-op threads per worker (default: cores / workers)")
+    parser.add_argument("--resume", action="store_true", help="skip items already present in --output")
+    parser.add_argument("--no-insights", action="store_true", help="omit the insights dict from JSONL output")
+    args = parser.parse_args(argv)
+
+    if not args.images and not args.texts:
+        parser.error("nothing to score: pass --images and/or --texts")
+    if args.workers < 1 or args.batch_size < 1 or args.text_chunk < 1:
+        parser.error("--workers, --batch-size and --text-chunk must be positive")
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
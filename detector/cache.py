@@ -0,0 +1,438 @@
+"""Content-addressed cache for detection results.
+
+Keys are a SHA-256 of the raw upload bytes (or normalized text) together
+with a tag naming the method and model version, e.g.
+``cnn:simple_resnet-v1:<checkpoint hash>``. Results live in a bounded
+in-memory LRU tier in front of a SQLite file shared by every session and
+process on the machine. Each tag is recorded with its generation: the
+code versions and model fingerprints in it, without per-process settings
+such as DETECTOR_BACKEND. The first time a process uses a tag, rows of
+the same method from any other generation are purged, so replacing the
+checkpoint invalidates stale CNN scores automatically, while processes
+with different settings sharing the file keep each other's rows.
+
+The disk tier is bounded: every PRUNE_EVERY stores, rows older than
+max_age_days and the oldest rows beyond max_rows are dropped.
+
+On an exact miss, texts and still images are also looked up in a
+near-duplicate index (detector.neardup) for the same tag. A close enough
+match returns the stored result with a 'near_duplicate' entry giving the
+distance, and is counted under near_duplicate_hits only (the exact
+lookup before it already counted a miss). Signatures are kept in the
+same SQLite file with their neardup.SIGNATURE_VERSIONS entry and loaded
+the first time a process uses a tag.
+
+Configure with DETECTOR_CACHE_PATH (empty string disables the disk tier),
+DETECTOR_CACHE_MEMORY_ENTRIES, DETECTOR_CACHE_MAX_ROWS and
+DETECTOR_CACHE_MAX_AGE_DAYS (0 lifts either bound).
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+from detector.cascade import CASCADE_VERSION, DEFAULT_BAND, DEFAULT_CNN_WEIGHT, DEFAULT_TEXT_BAND
+from detector.metrics import stage
+from detector.neardup import (NEAR_DUPLICATES, SIGNATURE_VERSIONS, NearDuplicateIndex, image_signature,
+                              text_signature)
+from detector.ngram import models_fingerprint
+from detector.scoring import json_default, score_images, score_text
+from detector.text import TEXT_ANALYSIS_VERSION
+
+DEFAULT_MEMORY_ENTRIES = 2048
+DEFAULT_MAX_ROWS = 200_000
+DEFAULT_MAX_AGE_DAYS = 30
+# Disk bounds are enforced once per this many stores in a process
+PRUNE_EVERY = 500
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "ai-content-detector", "results.sqlite3")
+
+
+def normalize_text(text):
+    """Canonical form used both for the cache key and for the analysis itself"""
+    return unicodedata.normalize("NFC", text.replace("\r\n", "\n")).strip()
+
+
+def content_key(data, tag):
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    digest = hashlib.sha256(data).hexdigest()
+    return f"{tag}:{digest}"
+
+
+class ResultCache:
+    def __init__(self, path=DEFAULT_PATH, max_memory_entries=DEFAULT_MEMORY_ENTRIES, max_rows=DEFAULT_MAX_ROWS,
+                 max_age_days=DEFAULT_MAX_AGE_DAYS):
+        self.path = path or None
+        self.max_memory_entries = max_memory_entries
+        self.max_rows = max_rows
+        self.max_age_days = max_age_days
+        self._stores_since_prune = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._checked_tags = set()
+        # method -> (tag, NearDuplicateIndex)
+        self._indexes = {}
+        self.counters = dict.fromkeys(("memory_hits", "disk_hits", "misses", "stores", "evictions", "invalidated",
+                                       "pruned", "near_duplicate_hits"), 0)
+
+    def _db(self):
+        conn = getattr(self._local, "conn", None)
+        # Connections must not be shared with a forked child
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, method TEXT NOT NULL, tag TEXT NOT NULL, value TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS results_created ON results (created)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS tags (tag TEXT PRIMARY KEY, method TEXT NOT NULL, generation TEXT NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS signatures ("
+                "key TEXT PRIMARY KEY, method TEXT NOT NULL, tag TEXT NOT NULL, signature BLOB NOT NULL, version TEXT)"
+            )
+            # Files written before signatures were versioned; their rows have no version and are never loaded
+            if "version" not in {row[1] for row in conn.execute("PRAGMA table_info(signatures)")}:
+                try:
+                    conn.execute("ALTER TABLE signatures ADD COLUMN version TEXT")
+                except sqlite3.OperationalError:
+                    pass  # Another process added it first
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def check_tag(self, method, tag, generation):
+        """Record ``tag`` under ``generation`` and purge rows of ``method`` from other generations
+
+        Runs once per tag per process. Rows under other tags of the same
+        generation were written with other settings and are kept.
+        """
+        if self.path is None or (method, tag) in self._checked_tags:
+            return
+        with self._db() as conn:
+            conn.execute("INSERT OR REPLACE INTO tags (tag, method, generation) VALUES (?, ?, ?)",
+                         (tag, method, generation))
+            conn.execute("DELETE FROM tags WHERE method = ? AND generation != ?", (method, generation))
+            current = {row[0] for row in conn.execute("SELECT tag FROM tags WHERE method = ?", (method,))}
+            # Tags with no row in tags were written before generations were recorded
+            removed = conn.execute("DELETE FROM results WHERE method = ? AND tag NOT IN (SELECT tag FROM tags)",
+                                   (method,)).rowcount
+            conn.execute("DELETE FROM signatures WHERE method = ? AND tag NOT IN (SELECT tag FROM tags)", (method,))
+        with self._lock:
+            self._checked_tags.add((method, tag))
+            self.counters["invalidated"] += max(removed, 0)
+            for key in [k for k in self._memory
+                        if k.startswith(f"{method}:") and k.rsplit(":", 1)[0] not in current]:
+                del self._memory[key]
+        self.prune()
+
+    def prune(self):
+        """Drop disk rows older than max_age_days and the oldest beyond max_rows; returns how many went"""
+        if self.path is None:
+            return 0
+        cutoffs = [time.time() - self.max_age_days * 86400] if self.max_age_days else []
+        with self._db() as conn:
+            if self.max_rows:
+                excess = conn.execute("SELECT COUNT(*) FROM results").fetchone()[0] - self.max_rows
+                if excess > 0:
+                    cutoffs.append(conn.execute("SELECT created FROM results ORDER BY created LIMIT 1 OFFSET ?",
+                                                (excess - 1,)).fetchone()[0])
+            if not cutoffs:
+                return 0
+            cutoff = max(cutoffs)
+            conn.execute("DELETE FROM signatures WHERE key IN (SELECT key FROM results WHERE created <= ?)", (cutoff,))
+            removed = max(conn.execute("DELETE FROM results WHERE created <= ?", (cutoff,)).rowcount, 0)
+        self._count("pruned", removed)
+        return removed
+
+    def _lookup(self, key):
+        """(value, "memory" or "disk") for key, or (None, None), without counting the lookup"""
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                return value, "memory"
+        if self.path is not None:
+            row = self._db().execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                value = json.loads(row[0])
+                self._remember(key, value)
+                return value, "disk"
+        return None, None
+
+    def get(self, key):
+        value, tier = self._lookup(key)
+        self._count(f"{tier}_hits" if value is not None else "misses")
+        return value
+
+    def put(self, key, value, method, tag):
+        """Store value and return it as later hits will see it (round-tripped through JSON)"""
+        encoded = json.dumps(value, default=json_default, ensure_ascii=False)
+        stored = json.loads(encoded)
+        self._remember(key, stored)
+        if self.path is not None:
+            with self._db() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO results (key, method, tag, value, created) VALUES (?, ?, ?, ?, ?)",
+                    (key, method, tag, encoded, time.time()),
+                )
+            with self._lock:
+                self._stores_since_prune += 1
+                due = self._stores_since_prune >= PRUNE_EVERY
+                if due:
+                    self._stores_since_prune = 0
+            if due:
+                self.prune()
+        self._count("stores")
+        return stored
+
+    def near_duplicates(self, method, tag, kind):
+        """The NearDuplicateIndex for ``method`` under ``tag``, loaded from disk on first use"""
+        with self._lock:
+            current = self._indexes.get(method)
+            if current is not None and current[0] == tag:
+                return current[1]
+        index = NearDuplicateIndex(kind)
+        if self.path is not None:
+            version = SIGNATURE_VERSIONS[kind]
+            with self._db() as conn:
+                conn.execute("DELETE FROM signatures WHERE method = ? AND (version IS NULL OR version != ?)",
+                             (method, version))
+            rows = self._db().execute("SELECT key, signature FROM signatures WHERE tag = ? AND version = ?",
+                                      (tag, version))
+            for key, blob in rows:
+                index.add(key, np.frombuffer(blob, dtype=np.uint64))
+            index.compact()
+        with self._lock:
+            current = self._indexes.get(method)
+            if current is None or current[0] != tag:
+                self._indexes[method] = current = (tag, index)
+        return current[1]
+
+    def add_signature(self, index, key, signature, method, tag):
+        if signature is None:
+            return
+        index.add(key, signature)
+        if self.path is not None:
+            with self._db() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO signatures (key, method, tag, signature, version) VALUES (?, ?, ?, ?, ?)",
+                    (key, method, tag, signature.tobytes(), SIGNATURE_VERSIONS[index.kind]),
+                )
+
+    def near_duplicate(self, index, signature):
+        """Stored result of the closest indexed item, flagged with 'near_duplicate', or None"""
+        if signature is None:
+            return None
+        match = index.query(signature)
+        # Rows can disappear under the index (clear(), another process purging a tag)
+        value = self._lookup(match[0])[0] if match is not None else None
+        if value is None:
+            return None
+        self._count("near_duplicate_hits")
+        return dict(value, near_duplicate={'distance': match[1], 'max_distance': index.max_distance})
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._indexes.clear()
+        if self.path is not None:
+            with self._db() as conn:
+                conn.execute("DELETE FROM results")
+                conn.execute("DELETE FROM signatures")
+                conn.execute("DELETE FROM tags")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters, memory_entries=len(self._memory), max_memory_entries=self.max_memory_entries,
+                         max_rows=self.max_rows, max_age_days=self.max_age_days)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        stats["path"] = self.path
+        with self._lock:
+            indexes = [index for _, index in self._indexes.values()]
+        stats["near_duplicate_entries"] = sum(len(index) for index in indexes)
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResultCache(
+                    path=os.environ.get("DETECTOR_CACHE_PATH", DEFAULT_PATH),
+                    max_memory_entries=int(os.environ.get("DETECTOR_CACHE_MEMORY_ENTRIES", DEFAULT_MEMORY_ENTRIES)),
+                    max_rows=int(os.environ.get("DETECTOR_CACHE_MAX_ROWS", DEFAULT_MAX_ROWS)),
+                    max_age_days=float(os.environ.get("DETECTOR_CACHE_MAX_AGE_DAYS", DEFAULT_MAX_AGE_DAYS)),
+                )
+    return _cache
+
+
+def result_tag(method):
+    """Method plus the version of whatever produces its scores"""
+    if method.startswith("frames-"):
+        from detector.frames import FRAMES_VERSION
+        return f"{method}:{result_tag(method[len('frames-'):])}:f{FRAMES_VERSION}"
+    if method in ("cnn", "tiled", "cascade", "heuristic"):
+        # Imported here so text-only callers never load PIL or torch
+        from detector.image import IMAGE_HEURISTIC_VERSION
+        if method == "heuristic":
+            return f"heuristic:{IMAGE_HEURISTIC_VERSION}"
+        from detector.models import get_registry
+        from detector.preprocess import PREPROCESS_VERSION
+        entry = get_registry().get()
+        model = f"{entry.name}-{entry.version}-{entry.backend}:{entry.fingerprint}"
+        if method == "cnn":
+            return f"cnn:{model}:p{PREPROCESS_VERSION}"
+        if method == "cascade":
+            return (f"cascade:{model}:p{PREPROCESS_VERSION}:h{IMAGE_HEURISTIC_VERSION}:"
+                    f"c{CASCADE_VERSION}-{DEFAULT_BAND}-{DEFAULT_CNN_WEIGHT}")
+        from detector.tiling import DEFAULT_EARLY_STOP, TILE_SIZE, TILING_VERSION
+        return f"tiled:{model}:t{TILING_VERSION}-{TILE_SIZE}-{DEFAULT_EARLY_STOP}"
+    if method == "text":
+        return f"text:{TEXT_ANALYSIS_VERSION}:lm{models_fingerprint()}"
+    if method == "text-cascade":
+        return f"text-cascade:{TEXT_ANALYSIS_VERSION}:lm{models_fingerprint()}:c{CASCADE_VERSION}-{DEFAULT_TEXT_BAND}"
+    raise ValueError(f"Unknown method {method!r}")
+
+
+def result_generation(method):
+    """The versions and model fingerprints in result_tag(method), without backend, band or tiling settings"""
+    if method.startswith("frames-"):
+        from detector.frames import FRAMES_VERSION
+        return f"{result_generation(method[len('frames-'):])}:f{FRAMES_VERSION}"
+    if method in ("cnn", "tiled", "cascade", "heuristic"):
+        # Imported here so text-only callers never load PIL or torch
+        from detector.image import IMAGE_HEURISTIC_VERSION
+        if method == "heuristic":
+            return f"heuristic:{IMAGE_HEURISTIC_VERSION}"
+        from detector.models import get_registry
+        from detector.preprocess import PREPROCESS_VERSION
+        entry = get_registry().get()
+        model = f"{entry.name}-{entry.version}:{entry.fingerprint}"
+        if method == "cnn":
+            return f"cnn:{model}:p{PREPROCESS_VERSION}"
+        if method == "cascade":
+            return f"cascade:{model}:p{PREPROCESS_VERSION}:h{IMAGE_HEURISTIC_VERSION}:c{CASCADE_VERSION}"
+        from detector.tiling import TILING_VERSION
+        return f"tiled:{model}:t{TILING_VERSION}"
+    if method == "text":
+        return f"text:{TEXT_ANALYSIS_VERSION}:lm{models_fingerprint()}"
+    if method == "text-cascade":
+        return f"text-cascade:{TEXT_ANALYSIS_VERSION}:lm{models_fingerprint()}:c{CASCADE_VERSION}"
+    raise ValueError(f"Unknown method {method!r}")
+
+
+def cached_score_text(text, cache=None, cascade=False):
+    """score_text on the normalized text, served from the cache when possible"""
+    cache = cache or get_cache()
+    text = normalize_text(text)
+    method = "text-cascade" if cascade else "text"
+    tag = result_tag(method)
+    cache.check_tag(method, tag, result_generation(method))
+    key = content_key(text, tag)
+    with stage("cache.lookup"):
+        result = cache.get(key)
+    if result is not None:
+        return result
+    signature = index = None
+    if NEAR_DUPLICATES:
+        with stage("cache.near_duplicate"):
+            index = cache.near_duplicates(method, tag, "text")
+            signature = text_signature(text)
+            result = cache.near_duplicate(index, signature)
+        if result is not None:
+            return result
+    result = score_text(text, cascade=cascade)
+    with stage("cache.store"):
+        result = cache.put(key, result, method, tag)
+        if index is not None:
+            cache.add_signature(index, key, signature, method, tag)
+    return result
+
+
+def cached_score_frames(blob, method="cnn", cache=None, scheduler=None, **options):
+    """score_frames keyed on the upload bytes and the sampling options"""
+    from detector.frames import score_frames
+    cache = cache or get_cache()
+    cache_method = f"frames-{method}"
+    tag = result_tag(cache_method)
+    cache.check_tag(cache_method, tag, result_generation(cache_method))
+    key = content_key(blob + json.dumps(options, sort_keys=True).encode("utf-8"), tag)
+    with stage("cache.lookup"):
+        result = cache.get(key)
+    if result is None:
+        result = score_frames(blob, method=method, scheduler=scheduler, **options)
+        with stage("cache.store"):
+            result = cache.put(key, result, cache_method, tag)
+    return result
+
+
+def cached_score_images(blobs, method="heuristic", batch_size=None, sources=None, cache=None, scheduler=None):
+    """score_images keyed on the raw upload bytes; only cache misses are decoded and scored
+
+    ``sources`` may carry already-decoded images (same order as ``blobs``)
+    to avoid decoding uploads a second time. ``scheduler`` is passed on to
+    score_images for the CNN.
+    """
+    cache = cache or get_cache()
+    tag = result_tag(method)
+    cache.check_tag(method, tag, result_generation(method))
+    with stage("cache.lookup"):
+        keys = [content_key(blob, tag) for blob in blobs]
+        results = [cache.get(key) for key in keys]
+    # Identical uploads in one call are scored once
+    missing = {}
+    for i, result in enumerate(results):
+        if result is None:
+            missing.setdefault(keys[i], i)
+    sources = sources or blobs
+    signatures = {}
+    index = None
+    if missing and NEAR_DUPLICATES:
+        with stage("cache.near_duplicate"):
+            index = cache.near_duplicates(method, tag, "image")
+            for key, i in list(missing.items()):
+                signatures[key] = image_signature(sources[i])
+                near = cache.near_duplicate(index, signatures[key])
+                if near is not None:
+                    results = [near if k == key else result for k, result in zip(keys, results)]
+                    del missing[key]
+    if missing:
+        fresh = score_images([sources[i] for i in missing.values()], method=method, batch_size=batch_size,
+                             scheduler=scheduler)
+        with stage("cache.store"):
+            stored = {key: cache.put(key, result, method, tag) for key, result in zip(missing, fresh)}
+            if index is not None:
+                for key in stored:
+                    cache.add_signature(index, key, signatures[key], method, tag)
+        results = [stored[key] if result is None else result for key, result in zip(keys, results)]
+    return results
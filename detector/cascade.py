@@ -0,0 +1,153 @@
+"""Cheap-first detection cascades.
+
+Images go through the size/colour heuristic first. Only those whose
+heuristic margin ``abs(real_prob - ai_prob)`` falls inside the uncertainty
+``band`` are escalated to the CNN (in one batch), and their score is a
+weighted blend of both stages. Texts are scored first from the quick
+statistics (script, sentence lengths and language patterns) and only
+escalated to perplexity, burstiness and complexity when that margin is
+inside the text band; escalated texts get exactly the enhanced_text_analysis
+score.
+
+A wider band means more items reach the expensive stage. Every result
+records the stage that resolved it, and the detector_cascade_items_total
+counter tracks the split, so the band can be tuned against compute.
+
+    DETECTOR_CASCADE_BAND=0.2        image heuristic margins below this run the CNN
+    DETECTOR_CASCADE_TEXT_BAND=0.15  quick text margins below this run the full metrics
+"""
+import io
+import math
+import os
+
+import numpy as np
+
+from detector.metrics import REGISTRY, stage
+from detector.text import (PERPLEXITY_THRESHOLDS, TextFeatures, analyze_burstiness, analyze_multilingual_patterns,
+                           analyze_scripts, analyze_syntactic_complexity, perplexity_thresholds,
+                           reference_perplexity, score_text_metrics)
+
+# Part of the cascade cache tags: bump when routing or fusion changes
+CASCADE_VERSION = "1"
+DEFAULT_BAND = float(os.environ.get("DETECTOR_CASCADE_BAND", 0.2))
+# Quick statistics alone move the margin by at most ~0.25, so only texts where they agree resolve early
+DEFAULT_TEXT_BAND = float(os.environ.get("DETECTOR_CASCADE_TEXT_BAND", 0.15))
+# Share of the fused image score taken from the CNN when both stages ran
+DEFAULT_CNN_WEIGHT = 0.75
+# Values inside every threshold of score_text_metrics, so unmeasured metrics add no evidence; the perplexity
+# holds for the self-unigram thresholds, texts scored against a reference model use neutral_perplexity
+NEUTRAL_METRICS = {'perplexity': 100.0, 'burstiness': 0.2, 'syntactic_complexity': 0.6}
+
+REGISTRY.describe("detector_cascade_items_total", "counter", "Items resolved by each cascade stage")
+
+
+def neutral_perplexity(lang_code, word_count):
+    """A perplexity between the thresholds score_text_metrics applies to such a text"""
+    low, high = perplexity_thresholds(lang_code, word_count)
+    if (low, high) == PERPLEXITY_THRESHOLDS:
+        return NEUTRAL_METRICS['perplexity']
+    return math.sqrt(low * high)
+
+
+def _reusable(source):
+    """Sources that can be decoded a second time as-is (file objects are rewound instead)"""
+    if isinstance(source, (bytes, bytearray, str, os.PathLike)):
+        return source
+    if isinstance(source, io.IOBase) and source.seekable():
+        source.seek(0)
+        return source
+    return None
+
+
+def cascade_images(sources, band=DEFAULT_BAND, cnn_weight=DEFAULT_CNN_WEIGHT, batch_size=None, scheduler=None):
+    """Heuristic first, CNN only for images whose heuristic margin is below ``band``
+
+    Returns a list of {'ai_prob', 'real_prob', 'stage', 'heuristic', 'cnn'}
+    dicts in input order; stage is "heuristic" or "cnn" and 'cnn' is None
+    for images the heuristic resolved.
+    """
+    # Imported here so text-only callers never load PIL
+    from detector.image import analyze_image_characteristics, open_image
+    results, escalated = [], []
+    for i, source in enumerate(sources):
+        with stage("image.decode"):
+            image = open_image(source)
+        with stage("image.heuristic"):
+            ai_prob, real_prob = analyze_image_characteristics(image)
+        heuristic = {'ai_prob': ai_prob, 'real_prob': real_prob}
+        results.append({'ai_prob': ai_prob, 'real_prob': real_prob, 'stage': "heuristic",
+                        'heuristic': heuristic, 'cnn': None})
+        if abs(real_prob - ai_prob) < band:
+            # The CNN input is decoded again at model resolution (JPEG draft mode) rather than
+            # downscaled from the full-resolution pixels, unless the source cannot be re-read
+            escalated.append((i, _reusable(source) or image))
+
+    if escalated:
+        from detector.scoring import score_images
+        scores = score_images([source for _, source in escalated], method="cnn", batch_size=batch_size,
+                              scheduler=scheduler)
+        for (i, _), cnn in zip(escalated, scores):
+            result = results[i]
+            ai_prob = cnn_weight * cnn['ai_prob'] + (1 - cnn_weight) * result['heuristic']['ai_prob']
+            result.update(ai_prob=ai_prob, real_prob=1 - ai_prob, stage="cnn", cnn=cnn)
+
+    for result in results:
+        REGISTRY.inc("detector_cascade_items_total", (("kind", "image"), ("stage", result['stage'])))
+    return results
+
+
+def cascade_text(text, band=DEFAULT_TEXT_BAND):
+    """Quick statistics first, perplexity/burstiness/complexity only when the quick margin is below ``band``
+
+    Returns {'ai_prob', 'human_prob', 'insights', 'stage'} with stage "quick"
+    or "full". Full results equal enhanced_text_analysis; quick results
+    report the unmeasured advanced metrics as None.
+    """
+    with stage("text.language"):
+        script_info = analyze_scripts(text)
+    with stage("text.tokenize"):
+        features = TextFeatures(text)
+        # Lower-cased tokens are reused by perplexity and burstiness if the text is escalated
+        word_count = len(features.tokens)
+        sentence_lengths = features.sentence_lengths
+    with stage("text.patterns"):
+        lang_patterns = analyze_multilingual_patterns(text, script_info['code'])
+    measured = dict(
+        script_info=script_info,
+        char_count=len(text),
+        word_count=word_count,
+        sentence_count=len(sentence_lengths),
+        avg_sentence_length=np.mean(sentence_lengths) if sentence_lengths else 0,
+        length_variance=np.var(sentence_lengths) if len(sentence_lengths) > 2 else None,
+        lang_patterns=lang_patterns,
+    )
+
+    with stage("text.score"):
+        neutral = dict(NEUTRAL_METRICS, perplexity=neutral_perplexity(script_info['code'], word_count))
+        ai_prob, human_prob, insights = score_text_metrics(**measured, **neutral)
+    if abs(human_prob - ai_prob) >= band:
+        insights['advanced_metrics'] = dict.fromkeys(NEUTRAL_METRICS)
+        REGISTRY.inc("detector_cascade_items_total", (("kind", "text"), ("stage", "quick")))
+        return {'ai_prob': ai_prob, 'human_prob': human_prob, 'insights': insights, 'stage': "quick"}
+
+    with stage("text.perplexity"):
+        perplexity = reference_perplexity(features, script_info['code'])
+    with stage("text.burstiness"):
+        burstiness = analyze_burstiness(features)
+    with stage("text.complexity"):
+        syntactic_complexity = analyze_syntactic_complexity(features)
+    with stage("text.score"):
+        ai_prob, human_prob, insights = score_text_metrics(
+            **measured, perplexity=perplexity, burstiness=burstiness, syntactic_complexity=syntactic_complexity,
+        )
+    REGISTRY.inc("detector_cascade_items_total", (("kind", "text"), ("stage", "full")))
+    return {'ai_prob': ai_prob, 'human_prob': human_prob, 'insights': insights, 'stage': "full"}
+
+
+def stage_fractions(results):
+    """Share of results resolved by each cascade stage, e.g. {'heuristic': 0.6, 'cnn': 0.4}"""
+    counts = {}
+    for result in results:
+        counts[result['stage']] = counts.get(result['stage'], 0) + 1
+    total = sum(counts.values())
+    return {name: count / total for name, count in counts.items()}
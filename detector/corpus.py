@@ -0,0 +1,199 @@
+"""Vectorized text features for many documents at once.
+
+Tokens of every document are mapped to integer IDs from one shared
+vocabulary. Perplexity then comes from np.unique counts of (document,
+token) pairs, burstiness from the distance between consecutive
+occurrences of a pair after a stable sort, and syntactic complexity from
+per-sentence segment reductions. The results match calculate_perplexity,
+analyze_burstiness and analyze_syntactic_complexity up to floating-point
+summation order, and scoring reuses score_text_metrics. Documents whose
+language has a reference n-gram model get its perplexity instead, scored
+in one vectorized lookup per language.
+
+    from detector.corpus import score_corpus
+    scores = score_corpus(texts)
+    scores['features']   # (len(texts), len(FEATURE_NAMES)) float64 matrix
+    scores['ai_prob']    # (len(texts),) array
+"""
+from itertools import chain, compress
+
+import numpy as np
+
+from detector.metrics import stage
+from detector.ngram import available_models, document_positions, get_model
+from detector.text import SENTENCE_SPLIT_RE, analyze_multilingual_patterns, analyze_scripts, score_text_metrics
+
+FEATURE_NAMES = (
+    "char_count", "word_count", "sentence_count", "avg_sentence_length",
+    "length_variance", "perplexity", "burstiness", "syntactic_complexity",
+)
+
+
+class Segments:
+    """Token IDs from a shared vocabulary plus the segment (document or sentence) owning each token"""
+
+    def __init__(self, token_lists):
+        self.tokens = list(chain.from_iterable(token_lists))
+        # dict.fromkeys and map keep the per-token work in C
+        vocab = {token: i for i, token in enumerate(dict.fromkeys(self.tokens))}
+        self.lengths = np.fromiter(map(len, token_lists), dtype=np.int64, count=len(token_lists))
+        self.ids = np.fromiter(map(vocab.__getitem__, self.tokens), dtype=np.int64, count=len(self.tokens))
+        self.owners = np.repeat(np.arange(len(token_lists), dtype=np.int64), self.lengths)
+        self.vocab_size = max(len(vocab), 1)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    @property
+    def keys(self):
+        """One integer per (segment, token) pair"""
+        return self.owners * self.vocab_size + self.ids
+
+    def distinct_counts(self):
+        """(segment, occurrences) for every distinct token of every segment"""
+        pairs, counts = np.unique(self.keys, return_counts=True)
+        return pairs // self.vocab_size, counts
+
+    def segment_mean(self, values, segments, default):
+        """Mean of ``values`` grouped by ``segments``; ``default`` where a segment has none"""
+        sums = np.bincount(segments, weights=values, minlength=len(self))
+        counts = np.bincount(segments, minlength=len(self))
+        return np.divide(sums, counts, out=np.full(len(self), default, dtype=np.float64), where=counts > 0)
+
+
+def corpus_perplexity(documents):
+    segment, counts = documents.distinct_counts()
+    totals = documents.lengths[segment]
+    log_sum = np.bincount(segment, weights=counts * np.log(counts / totals), minlength=len(documents))
+    lengths = np.maximum(documents.lengths, 1)
+    return np.where(documents.lengths < 10, 100.0, np.exp(-log_sum / lengths))
+
+
+def corpus_reference_perplexity(documents, lang_codes, perplexity):
+    """Overwrite ``perplexity`` for documents whose language has a reference model, as reference_perplexity would"""
+    lang_codes = np.asarray(lang_codes)
+    for code in dict.fromkeys(lang_codes.tolist()):
+        model = get_model(code)
+        if model is None:
+            continue
+        selected = np.flatnonzero((lang_codes == code) & (documents.lengths >= 10))
+        if not len(selected):
+            continue
+        lengths = documents.lengths[selected]
+        tokens = list(compress(documents.tokens, np.isin(documents.owners, selected)))
+        log_probs = model.log10_probs(tokens, document_positions(lengths))
+        sums = np.bincount(np.repeat(np.arange(len(selected)), lengths), weights=log_probs)
+        perplexity[selected] = 10 ** (-sums / lengths)
+
+
+def corpus_burstiness(documents):
+    keys = documents.keys
+    # Stable sort keeps positions ascending within a key, so neighbours are consecutive occurrences
+    order = np.argsort(keys, kind="stable")
+    repeats = keys[order[1:]] == keys[order[:-1]]
+    later, earlier = order[1:][repeats], order[:-1][repeats]
+    scores = 1.0 / (later - earlier + 1)
+    burstiness = documents.segment_mean(scores, documents.owners[later], 0.0)
+    return np.where(documents.lengths < 20, 0.5, burstiness)
+
+
+def corpus_sentence_stats(sentences, word_lengths, sentence_docs, n_docs):
+    """Per-document sentence count, mean/variance of sentence length and syntactic complexity"""
+    word_counts = sentences.lengths
+    distinct_segment, _ = sentences.distinct_counts()
+    unique_words = np.bincount(distinct_segment, minlength=len(sentences))
+    total_word_lengths = np.bincount(sentences.owners, weights=word_lengths, minlength=len(sentences))
+
+    sentence_count = np.bincount(sentence_docs, minlength=n_docs)
+    total_words = np.bincount(sentence_docs, weights=word_counts, minlength=n_docs)
+    avg_length = np.divide(total_words, sentence_count, out=np.zeros(n_docs), where=sentence_count > 0)
+    squared = np.bincount(sentence_docs, weights=(word_counts - avg_length[sentence_docs]) ** 2, minlength=n_docs)
+    variance = np.divide(squared, sentence_count, out=np.full(n_docs, np.nan), where=sentence_count > 2)
+
+    eligible = word_counts >= 5
+    safe_counts = np.maximum(word_counts, 1)
+    complexity = (unique_words / safe_counts) * ((total_word_lengths / safe_counts) / 5)
+    sums = np.bincount(sentence_docs[eligible], weights=complexity[eligible], minlength=n_docs)
+    counts = np.bincount(sentence_docs[eligible], minlength=n_docs)
+    mean_complexity = np.divide(sums, counts, out=np.full(n_docs, 0.5), where=counts > 0)
+    mean_complexity[sentence_count < 3] = 0.5
+    return sentence_count, avg_length, variance, mean_complexity
+
+
+def corpus_features(texts, lang_codes=None):
+    """Feature matrix with one row per text and FEATURE_NAMES columns (length_variance is NaN when undefined)
+
+    ``lang_codes`` selects the reference n-gram model for each text; they
+    are detected when omitted and a model is installed.
+    """
+    with stage("corpus.tokenize"):
+        documents = Segments([text.lower().split() for text in texts])
+        sentence_words, sentence_docs = [], []
+        for doc, text in enumerate(texts):
+            for sentence in SENTENCE_SPLIT_RE.split(text):
+                words = sentence.split()
+                if words:
+                    sentence_words.append(words)
+                    sentence_docs.append(doc)
+        sentences = Segments(sentence_words)
+        word_lengths = np.fromiter(map(len, sentences.tokens), dtype=np.float64, count=len(sentences.tokens))
+        sentence_docs = np.asarray(sentence_docs, dtype=np.int64)
+
+    with stage("corpus.features"):
+        features = np.empty((len(texts), len(FEATURE_NAMES)), dtype=np.float64)
+        features[:, 0] = [len(text) for text in texts]
+        features[:, 1] = documents.lengths
+        sentence_count, avg_length, variance, complexity = corpus_sentence_stats(
+            sentences, word_lengths, sentence_docs, len(texts),
+        )
+        features[:, 2] = sentence_count
+        features[:, 3] = avg_length
+        features[:, 4] = variance
+        features[:, 5] = corpus_perplexity(documents)
+        if lang_codes is None and available_models():
+            lang_codes = [analyze_scripts(text)['code'] for text in texts]
+        if lang_codes is not None:
+            corpus_reference_perplexity(documents, lang_codes, features[:, 5])
+        features[:, 6] = corpus_burstiness(documents)
+        features[:, 7] = complexity
+    return features
+
+
+def score_corpus(texts, insights=True):
+    """Score many texts at once
+
+    Returns {'feature_names', 'features', 'ai_prob', 'human_prob', 'insights'}
+    where insights is a list of the per-text insights dicts (None when
+    ``insights`` is False).
+    """
+    texts = list(texts)
+    with stage("corpus.language"):
+        script_infos = [analyze_scripts(text) for text in texts]
+    features = corpus_features(texts, [script_info['code'] for script_info in script_infos])
+    ai_probs = np.empty(len(texts))
+    human_probs = np.empty(len(texts))
+    all_insights = [] if insights else None
+    with stage("corpus.score"):
+        for i, (text, script_info, row) in enumerate(zip(texts, script_infos, features)):
+            char_count, word_count, sentence_count, avg_length, variance, perplexity, burstiness, complexity = row
+            ai_probs[i], human_probs[i], text_insights = score_text_metrics(
+                script_info=script_info,
+                char_count=int(char_count),
+                word_count=int(word_count),
+                sentence_count=int(sentence_count),
+                avg_sentence_length=float(avg_length),
+                length_variance=None if np.isnan(variance) else float(variance),
+                perplexity=float(perplexity),
+                burstiness=float(burstiness),
+                syntactic_complexity=float(complexity),
+                lang_patterns=analyze_multilingual_patterns(text, script_info['code']),
+            )
+            if insights:
+                all_insights.append(text_insights)
+    return {
+        'feature_names': FEATURE_NAMES,
+        'features': features,
+        'ai_prob': ai_probs,
+        'human_prob': human_probs,
+        'insights': all_insights,
+    }
@@ -0,0 +1,202 @@
+"""Frame-level detection for animated images and short video clips.
+
+Frames are decoded lazily from a generator: animated GIF/WebP/PNG through
+Pillow, video through PyAV when it is installed (``pip install av``). A
+frame is only converted to RGB when it is sampled, either every
+``stride``-th frame or, with ``scene_threshold``, when it differs enough
+from the last sampled frame. Sampled frames are scored in batches by the
+CNN or the heuristic, and decoding stops as soon as the running mean is
+decisive, so a long clip with a clear verdict costs a handful of frames.
+"""
+import io
+from functools import cached_property
+
+import numpy as np
+from PIL import Image, ImageSequence, UnidentifiedImageError
+
+from detector.image import analyze_image_characteristics
+from detector.metrics import stage
+from detector.preprocess import prepare_image
+
+# Part of the frames cache tag: bump when sampling or aggregation changes
+FRAMES_VERSION = "1"
+FRAME_METHODS = ("cnn", "heuristic")
+DEFAULT_STRIDE = 5
+DEFAULT_BATCH_SIZE = 8
+DEFAULT_EARLY_EXIT = 0.9
+DEFAULT_MIN_FRAMES = 4
+DEFAULT_MAX_FRAMES = 300
+# Mean absolute difference (0-255) between 32x32 greyscale thumbnails that counts as a new scene
+DEFAULT_SCENE_THRESHOLD = 12.0
+SCENE_THUMBNAIL = (32, 32)
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".webm", ".mkv", ".avi")
+
+
+class Frame:
+    """One decoded frame; ``image`` is only valid until the generator advances"""
+
+    def __init__(self, index, time, load):
+        self.index = index
+        self.time = time
+        self._load = load
+
+    @cached_property
+    def image(self):
+        return self._load()
+
+    def thumbnail(self):
+        return np.asarray(self.image.convert("L").resize(SCENE_THUMBNAIL, Image.BILINEAR), dtype=np.float32)
+
+
+def _open(source):
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source)
+    return source
+
+
+def _image_frames(image):
+    time = 0.0
+    for index, frame in enumerate(ImageSequence.Iterator(image)):
+        yield Frame(index, time, lambda frame=frame: frame.convert("RGB"))
+        time += frame.info.get("duration", 0) / 1000
+
+
+def _video_frames(source):
+    try:
+        import av
+    except ImportError:
+        raise ValueError("Video decoding needs PyAV: pip install av")
+    with av.open(source) as container:
+        stream = container.streams.video[0]
+        stream.thread_type = "AUTO"
+        for index, frame in enumerate(container.decode(stream)):
+            yield Frame(index, float(frame.time or 0.0), lambda frame=frame: frame.to_image())
+
+
+def iter_frames(source):
+    """Lazily yield Frames from an animated image, a still image or (with PyAV) a video"""
+    source = _open(source)
+    try:
+        image = Image.open(source)
+    except UnidentifiedImageError:
+        if hasattr(source, "seek"):
+            source.seek(0)
+        yield from _video_frames(source)
+        return
+    yield from _image_frames(image)
+
+
+def _has_video_stream(source):
+    """True when PyAV is installed and finds a video stream in ``source``"""
+    try:
+        import av
+    except ImportError:
+        return False
+    try:
+        with av.open(source) as container:
+            return bool(container.streams.video)
+    except av.error.FFmpegError:
+        return False
+
+
+def is_clip(data, name=""):
+    """True for animated images and videos, False for single-frame images
+
+    Data that is neither an image nor a video PyAV can open counts as a
+    still, so it fails with the image decoder's error.
+    """
+    if name.lower().endswith(VIDEO_EXTENSIONS):
+        return True
+    try:
+        return bool(getattr(Image.open(_open(data)), "is_animated", False))
+    except UnidentifiedImageError:
+        return _has_video_stream(_open(data))
+
+
+def sample_frames(frames, stride=DEFAULT_STRIDE, scene_threshold=None, max_frames=DEFAULT_MAX_FRAMES):
+    """Every ``stride``-th frame, optionally only those that start a new scene; at most ``max_frames``"""
+    previous, sampled = None, 0
+    for frame in frames:
+        if sampled >= max_frames:
+            return
+        if frame.index % stride:
+            continue
+        if scene_threshold is not None:
+            thumbnail = frame.thumbnail()
+            if previous is not None and np.abs(thumbnail - previous).mean() < scene_threshold:
+                continue
+            previous = thumbnail
+        sampled += 1
+        yield frame
+
+
+def _score_batch(images, method, scheduler):
+    if method == "heuristic":
+        return [dict(zip(('ai_prob', 'real_prob'), analyze_image_characteristics(image))) for image in images]
+    prepared = [prepare_image(image) for image in images]
+    if scheduler is not None:
+        return scheduler.submit(prepared)
+    from detector.models import detect_images
+    return detect_images(prepared, batch_size=len(prepared))
+
+
+def score_frames(source, method="cnn", stride=DEFAULT_STRIDE, scene_threshold=None, batch_size=DEFAULT_BATCH_SIZE,
+                 early_exit=DEFAULT_EARLY_EXIT, min_frames=DEFAULT_MIN_FRAMES, max_frames=DEFAULT_MAX_FRAMES,
+                 scheduler=None):
+    """Score sampled frames of a clip in batches, stopping once the verdict is decisive
+
+    Returns {'ai_prob', 'real_prob', 'verdict', 'frames', 'frames_decoded',
+    'frames_scored', 'early_exit'} where frames lists {'index', 'time',
+    'ai_prob', 'real_prob'} per scored frame. ``early_exit=None`` scores
+    every sampled frame.
+    """
+    if method not in FRAME_METHODS:
+        raise ValueError(f"Unknown frame method {method!r}, expected one of {FRAME_METHODS}")
+    if stride < 1 or batch_size < 1:
+        raise ValueError("stride and batch_size must be at least 1")
+
+    decoded = 0
+
+    def counted(frames):
+        nonlocal decoded
+        for frame in frames:
+            decoded += 1
+            yield frame
+
+    scored, batch, exited = [], [], False
+
+    def flush():
+        with stage("frames.score"):
+            results = _score_batch([image for _, image in batch], method, scheduler)
+        for (frame, _), result in zip(batch, results):
+            scored.append({'index': frame.index, 'time': frame.time, **result})
+        batch.clear()
+
+    for frame in sample_frames(counted(iter_frames(source)), stride, scene_threshold, max_frames):
+        with stage("frames.decode"):
+            # Converted now: animated-image frames are reused once the generator advances
+            image = frame.image
+        batch.append((frame, image))
+        if len(batch) == batch_size:
+            flush()
+            if early_exit is not None and len(scored) >= min_frames:
+                running = np.mean([result['ai_prob'] for result in scored])
+                if running >= early_exit or running <= 1 - early_exit:
+                    exited = True
+                    break
+    if batch:
+        flush()
+    if not scored:
+        raise ValueError("No frames could be decoded")
+
+    ai_prob = float(np.mean([result['ai_prob'] for result in scored]))
+    real_prob = float(np.mean([result['real_prob'] for result in scored]))
+    return {
+        'ai_prob': ai_prob,
+        'real_prob': real_prob,
+        'verdict': "ai" if ai_prob > real_prob else "real",
+        'frames': scored,
+        'frames_decoded': decoded,
+        'frames_scored': len(scored),
+        'early_exit': exited,
+    }
@@ -0,0 +1,447 @@
+"""Sentence-level text analysis that only re-analyses what an edit changed.
+
+IncrementalTextAnalyzer cuts a text into segments that end after a run of
+sentence delimiters and the whitespace following it. Segments partition
+the text, and no word, sentence or lexicon phrase crosses a segment
+boundary, so document metrics are exact sums of per-segment features:
+script histogram, lower-cased word counts, sentence lengths,
+per-sentence complexity scores and lexicon hits. Features are cached by segment text
+(i.e. by its hash). ``update(text)`` diffs the new segments against the
+previous ones, analyses only the changed run, and adjusts the running
+totals. Changed text is located by comparing the old and new strings in
+large chunks, and only the segments around it are re-split, so an edit
+costs about the size of the edit.
+
+Running totals are kept as integers so that no rounding error builds up
+over an editing session. Perplexity keeps the number of words seen
+exactly c times, for each count c, so it sums over distinct counts
+rather than the vocabulary. Complexity keeps per-sentence scores in one
+array, spliced like the word ids, and averages them as the full analysis
+does. With a reference n-gram model, each segment's log-probability is
+cached together with the tokens before it that the model conditions on,
+and the document's log-probability is a running exact sum of them: an
+update rescores only the new segments and those after them whose
+context changed. Burstiness keeps, for every word position, the distance
+back to the previous occurrence of the same word. Distances are kept
+relative, so an edit only relinks the inserted words and the first
+occurrence of each word after the edit; the mean is one vectorized pass.
+Results equal enhanced_text_analysis up to floating-point summation
+order in perplexity.
+
+    analyzer = IncrementalTextAnalyzer()
+    ai_prob, human_prob, insights = analyzer.update(text)
+    analyzer.sentence_scores()   # [{'text': ..., 'ai_prob': ...}, ...] for highlighting
+"""
+import math
+import re
+from collections import Counter
+from fractions import Fraction
+
+import numpy as np
+
+from detector.cascade import NEUTRAL_METRICS
+from detector.lexicon import CATEGORIES
+from detector.metrics import stage
+from detector.ngram import get_model
+from detector.text import (LEXICON_MATCHER, LEXICONS, SCRIPT_TABLE_SIZE, TextFeatures, analyze_scripts,
+                           scripts_from_histogram, score_text_metrics)
+
+# Where a segment ends: after sentence delimiters (as in SENTENCE_SPLIT_RE) and the whitespace that follows
+SEGMENT_END_RE = re.compile(r'[.!?।॥]+\s+')
+# Segments cached beyond those in the current text, so undo and re-typing hit the cache
+DEFAULT_SPARE_SEGMENTS = 4096
+# Characters compared at a time when looking for the edited span
+DIFF_CHUNK_CHARS = 1 << 16
+
+
+def split_segments(text):
+    """``text`` cut after every delimiter run followed by whitespace; the pieces join back to ``text``"""
+    segments, start = [], 0
+    for match in SEGMENT_END_RE.finditer(text):
+        segments.append(text[start:match.end()])
+        start = match.end()
+    if start < len(text):
+        segments.append(text[start:])
+    return segments
+
+
+def common_length(old, new, limit, from_end=False, chunk=DIFF_CHUNK_CHARS):
+    """Length of the common prefix (or suffix) of two strings, at most ``limit``
+
+    Equal chunks are skipped with one C-level comparison each; the first
+    differing chunk is narrowed down by halving.
+    """
+    def same(start, stop):
+        if from_end:
+            return old[len(old) - stop:len(old) - start] == new[len(new) - stop:len(new) - start]
+        return old[start:stop] == new[start:stop]
+
+    common = 0
+    while common < limit:
+        stop = min(common + chunk, limit)
+        if same(common, stop):
+            common = stop
+            continue
+        while stop - common > 1:
+            middle = (common + stop) // 2
+            if same(common, middle):
+                common = middle
+            else:
+                stop = middle
+        break
+    return common
+
+
+def repeat_gaps(ids):
+    """Distance from each position back to the previous occurrence of its id, 0 where there is none"""
+    # Stable sort keeps positions ascending within an id, so neighbours are consecutive occurrences
+    order = np.argsort(ids, kind="stable")
+    repeats = ids[order[1:]] == ids[order[:-1]]
+    gaps = np.zeros(len(ids), dtype=np.int64)
+    gaps[order[1:][repeats]] = (order[1:] - order[:-1])[repeats]
+    return gaps
+
+
+def last_occurrences(ids, queries):
+    """Index of the last occurrence in ``ids`` of each query, -1 where it does not occur"""
+    distinct = np.unique(queries)
+    hits = np.flatnonzero(np.isin(ids, distinct))
+    last = np.full(len(distinct), -1, dtype=np.int64)
+    # Unbuffered, so repeated ids keep their highest position without sorting the hits
+    np.maximum.at(last, np.searchsorted(distinct, ids[hits]), hits)
+    return last[np.searchsorted(distinct, queries)]
+
+
+class SegmentFeatures:
+    """Everything the document metrics need from one segment"""
+
+    __slots__ = ("text", "tokens", "token_counts", "script_bins", "script_counts", "sentence_lengths",
+                 "complexities", "lexicon", "word_ids", "scores")
+
+    def __init__(self, text, vocab):
+        self.text = text
+        features = TextFeatures(text)
+        self.tokens = features.tokens
+        self.token_counts = Counter(self.tokens)
+        # Sparse form of script_histogram; a dense one per segment would dwarf the text
+        codepoints = np.frombuffer(text.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+        self.script_bins, self.script_counts = np.unique(np.minimum(codepoints, SCRIPT_TABLE_SIZE),
+                                                         return_counts=True)
+        self.sentence_lengths = []
+        complexities = []
+        for word_count, unique_words, total_word_len in features.sentence_stats:
+            self.sentence_lengths.append(word_count)
+            if word_count >= 5:
+                complexities.append((unique_words / word_count) * ((total_word_len / word_count) / 5))
+        self.complexities = np.array(complexities, dtype=np.float64)
+        self.lexicon = Counter()
+        for code, categories in LEXICON_MATCHER.count(text).items():
+            for category, n in categories.items():
+                if n:
+                    self.lexicon[(code, category)] = n
+        for token in self.token_counts:
+            vocab.setdefault(token, len(vocab))
+        self.word_ids = np.fromiter(map(vocab.__getitem__, self.tokens), dtype=np.int64, count=len(self.tokens))
+        # Per-language local scores, filled in by sentence_scores
+        self.scores = {}
+
+
+class IncrementalTextAnalyzer:
+    def __init__(self, spare_segments=DEFAULT_SPARE_SEGMENTS):
+        self.spare_segments = spare_segments
+        self.vocab = {}
+        self.cache = {}
+        self.text = ""
+        self.segments = []
+        self.segment_chars = np.zeros(0, dtype=np.int64)
+        self.segment_tokens = np.zeros(0, dtype=np.int64)
+        self.word_ids = np.zeros(0, dtype=np.int64)
+        # Distance back to the previous occurrence of the same word, 0 for a first occurrence
+        self.gaps = np.zeros(0, dtype=np.int64)
+
+        self.char_count = 0
+        self.script_counts = np.zeros(SCRIPT_TABLE_SIZE + 1, dtype=np.int64)
+        self.word_freq = Counter()
+        self.token_count = 0
+        # count -> number of distinct words seen that many times
+        self.count_counts = Counter()
+        self.sentence_count = 0
+        self.length_sum = 0
+        self.length_square_sum = 0
+        self.complexities = np.zeros(0, dtype=np.float64)
+        self.segment_complexities = np.zeros(0, dtype=np.int64)
+        self.lexicon = Counter()
+
+        # Reference-model log10 probability per segment: (preceding tokens, log sum) or None, for reference_model
+        self.reference = []
+        self.reference_model = None
+        # Exact sum of the cached log sums, so no rounding error builds up over a session
+        self.reference_total = Fraction(0)
+        # (first, stop) span of segments that may need rescoring, or None
+        self.reference_dirty = None
+        self.last_stats = {'segments': 0, 'reanalyzed': 0, 'reused': 0}
+
+    def _features(self, text):
+        features = self.cache.get(text)
+        if features is None:
+            features = self.cache[text] = SegmentFeatures(text, self.vocab)
+            self.last_stats['reanalyzed'] += 1
+        return features
+
+    def _apply(self, features, sign):
+        self.char_count += sign * len(features.text)
+        self.script_counts[features.script_bins] += sign * features.script_counts
+        for token, count in features.token_counts.items():
+            old = self.word_freq[token]
+            new = old + sign * count
+            self.count_counts[old] -= 1
+            self.count_counts[new] += 1
+            if new:
+                self.word_freq[token] = new
+            else:
+                del self.word_freq[token]
+        self.token_count += sign * len(features.tokens)
+        self.sentence_count += sign * len(features.sentence_lengths)
+        self.length_sum += sign * sum(features.sentence_lengths)
+        self.length_square_sum += sign * sum(length * length for length in features.sentence_lengths)
+        for key, n in features.lexicon.items():
+            self.lexicon[key] += sign * n
+
+    def update(self, text):
+        """Analyse ``text``, reusing every segment unchanged since the last call
+
+        Returns (ai_prob, human_prob, insights) like enhanced_text_analysis;
+        insights['incremental'] reports how many segments were re-analysed.
+        """
+        with stage("text.incremental.diff"):
+            old = self.text
+            limit = min(len(old), len(text))
+            prefix = common_length(old, text, limit)
+            suffix = common_length(old, text, limit - prefix, from_end=True)
+            ends = np.cumsum(self.segment_chars)
+            # One segment of margin on each side: an edit next to a boundary can move or remove it
+            first = max(int(np.searchsorted(ends, prefix, side="right")) - 1, 0)
+            last = min(int(np.searchsorted(ends, len(old) - suffix, side="right")) + 2, len(self.segments))
+            start = int(ends[first - 1]) if first else 0
+            old_stop = int(ends[last - 1]) if last else 0
+            new_stop = old_stop + len(text) - len(old) if last < len(self.segments) else len(text)
+            new_segments = split_segments(text[start:new_stop])
+
+        self.last_stats = {'segments': 0, 'reanalyzed': 0, 'reused': 0}
+        with stage("text.incremental.segments"):
+            removed = self.segments[first:last]
+            added = [self._features(segment) for segment in new_segments]
+            for features in removed:
+                self._apply(features, -1)
+            for features in added:
+                self._apply(features, 1)
+            token_start = int(self.segment_tokens[:first].sum())
+            token_stop = int(self.segment_tokens[:last].sum())
+            added_ids = np.concatenate([np.zeros(0, dtype=np.int64)] + [features.word_ids for features in added])
+            self._splice_gaps(token_start, token_stop, added_ids)
+            self.word_ids = np.concatenate([self.word_ids[:token_start], added_ids, self.word_ids[token_stop:]])
+            self.segment_chars = np.concatenate([self.segment_chars[:first],
+                                                 [len(features.text) for features in added],
+                                                 self.segment_chars[last:]]).astype(np.int64)
+            self.segment_tokens = np.concatenate([self.segment_tokens[:first],
+                                                  [len(features.tokens) for features in added],
+                                                  self.segment_tokens[last:]]).astype(np.int64)
+            complexity_start = int(self.segment_complexities[:first].sum())
+            complexity_stop = int(self.segment_complexities[:last].sum())
+            self.complexities = np.concatenate([self.complexities[:complexity_start]]
+                                               + [features.complexities for features in added]
+                                               + [self.complexities[complexity_stop:]])
+            self.segment_complexities = np.concatenate([self.segment_complexities[:first],
+                                                        [len(features.complexities) for features in added],
+                                                        self.segment_complexities[last:]]).astype(np.int64)
+            self.segments[first:last] = added
+            self._splice_reference(first, last, len(added))
+            self.text = text
+        self.last_stats['segments'] = len(self.segments)
+        self.last_stats['reused'] = len(self.segments) - self.last_stats['reanalyzed']
+        self._prune_cache()
+
+        with stage("text.language"):
+            script_info = scripts_from_histogram(self.script_counts)
+        lang_code = script_info['code']
+        with stage("text.perplexity"):
+            perplexity = self._perplexity(lang_code)
+        with stage("text.burstiness"):
+            burstiness = self._burstiness()
+        syntactic_complexity = 0.5
+        if self.sentence_count >= 3 and len(self.complexities):
+            # Same values in the same order as analyze_syntactic_complexity, so the same mean
+            syntactic_complexity = np.mean(self.complexities)
+        lang_patterns = {}
+        if lang_code in LEXICONS:
+            lang_patterns = {category: self.lexicon[(lang_code, category)] for category in CATEGORIES}
+
+        with stage("text.score"):
+            n = self.sentence_count
+            ai_prob, human_prob, insights = score_text_metrics(
+                script_info=script_info,
+                char_count=self.char_count,
+                word_count=self.token_count,
+                sentence_count=n,
+                avg_sentence_length=self.length_sum / n if n else 0,
+                length_variance=(self.length_square_sum * n - self.length_sum ** 2) / (n * n) if n > 2 else None,
+                perplexity=perplexity,
+                burstiness=burstiness,
+                syntactic_complexity=syntactic_complexity,
+                lang_patterns=lang_patterns,
+            )
+        insights['incremental'] = dict(self.last_stats)
+        return ai_prob, human_prob, insights
+
+    def _prune_cache(self):
+        if len(self.cache) <= len(self.segments) + self.spare_segments:
+            return
+        live = {features.text for features in self.segments}
+        for text in [text for text in self.cache if text not in live]:
+            del self.cache[text]
+
+    def _perplexity(self, lang_code):
+        n = self.token_count
+        if n < 10:
+            return 100
+        model = get_model(lang_code)
+        if model is None:
+            # exp(-sum(log(c / n)) / n) over tokens, i.e. one term per distinct count c
+            log_sum = math.fsum(words * count * math.log(count / n)
+                                for count, words in self.count_counts.items() if count and words)
+            return math.exp(-log_sum / n)
+        return 10 ** (-self._reference_log10(model) / n)
+
+    def _splice_gaps(self, token_start, token_stop, added_ids):
+        """Splice gaps like word_ids, relinking the inserted words and each word's next occurrence after them"""
+        ids, gaps = self.word_ids, self.gaps
+        added_gaps = repeat_gaps(added_ids)
+        starts = np.flatnonzero(added_gaps == 0)
+        previous = last_occurrences(ids[:token_start], added_ids[starts])
+        linked = previous >= 0
+        added_gaps[starts[linked]] = token_start + starts[linked] - previous[linked]
+
+        # After the edit, only a word's first occurrence can have its previous one at or before the edit
+        tail_gaps = gaps[token_stop:].copy()
+        firsts = np.flatnonzero((tail_gaps == 0) | (tail_gaps > np.arange(len(tail_gaps))))
+        old_gaps = tail_gaps[firsts]
+        before = np.where(old_gaps > 0, token_stop + firsts - old_gaps, -1)
+        # Follow removed occurrences back until the last one before the edit
+        removed = np.flatnonzero(before >= token_start)
+        while len(removed):
+            back = gaps[before[removed]]
+            before[removed] = np.where(back > 0, before[removed] - back, -1)
+            removed = removed[before[removed] >= token_start]
+        inside = last_occurrences(added_ids, ids[token_stop + firsts])
+        previous = np.where(inside >= 0, token_start + inside, before)
+        positions = token_start + len(added_ids) + firsts
+        tail_gaps[firsts] = np.where(previous >= 0, positions - previous, 0)
+        self.gaps = np.concatenate([gaps[:token_start], added_gaps, tail_gaps])
+
+    def _splice_reference(self, first, last, count):
+        """Drop the replaced segments' log sums and widen the span _reference_log10 rescans"""
+        for cached in self.reference[first:last]:
+            if cached is not None:
+                self.reference_total -= Fraction(cached[1])
+        self.reference[first:last] = [None] * count
+
+        def moved(index):
+            return index if index <= first else max(index + count - (last - first), first + count)
+
+        if self.reference_dirty is None:
+            self.reference_dirty = (first, first + count)
+        else:
+            start, stop = self.reference_dirty
+            self.reference_dirty = (min(moved(start), first), max(moved(stop), first + count))
+
+    def _reference_log10(self, model):
+        """Running sum of per-segment log10 probabilities; a segment is rescored when it or its context changed"""
+        if model is not self.reference_model:
+            self.reference_model = model
+            self.reference = [None] * len(self.segments)
+            self.reference_total = Fraction(0)
+            self.reference_dirty = (0, len(self.segments))
+        if self.reference_dirty is None:
+            return float(self.reference_total)
+
+        start, stop = self.reference_dirty
+        context_size = model.order - 1
+        history, i = [], start
+        while i and len(history) < context_size:
+            i -= 1
+            history = self.segments[i].tokens + history
+        token_start = int(self.segment_tokens[:start].sum())
+        for i in range(start, len(self.segments)):
+            features = self.segments[i]
+            # A context shorter than the order only happens at the start of the text, so it also fixes positions
+            context = tuple(history[max(len(history) - context_size, 0):])
+            cached = self.reference[i]
+            if cached is not None and cached[0] == context:
+                # Past the edits, an unchanged context means every later segment is unchanged too
+                if i >= stop:
+                    break
+            else:
+                tokens = list(context) + features.tokens
+                offset = token_start - len(context)
+                positions = np.arange(offset, offset + len(tokens), dtype=np.int64)
+                log_sum = float(model.log10_probs(tokens, positions)[len(context):].sum()) if features.tokens else 0.0
+                if cached is not None:
+                    self.reference_total -= Fraction(cached[1])
+                self.reference_total += Fraction(log_sum)
+                self.reference[i] = (context, log_sum)
+            token_start += len(features.tokens)
+            if context_size:
+                history = (list(context) + features.tokens)[-context_size:]
+        self.reference_dirty = None
+        return float(self.reference_total)
+
+    def _burstiness(self):
+        if len(self.word_ids) < 20:
+            return 0.5
+        # In position order, as analyze_burstiness appends them
+        distances = self.gaps[self.gaps > 0]
+        return float(np.mean(1.0 / (distances + 1))) if len(distances) else 0.0
+
+    def sentence_scores(self):
+        """[{'text', 'ai_prob'}] per segment, scored from its own complexity, lexicon hits and reference perplexity
+
+        Burstiness and length variance say nothing about a single sentence,
+        so they are held neutral; scores are cached per segment and language.
+        """
+        lang_code = scripts_from_histogram(self.script_counts)['code']
+        model = get_model(lang_code)
+        results = []
+        for features in self.segments:
+            ai_prob = features.scores.get(lang_code)
+            if ai_prob is None:
+                ai_prob = features.scores[lang_code] = self._sentence_score(features, lang_code, model)
+            results.append({'text': features.text, 'ai_prob': ai_prob})
+        return results
+
+    @staticmethod
+    def _sentence_score(features, lang_code, model):
+        if not features.tokens:
+            return 0.5
+        perplexity = NEUTRAL_METRICS['perplexity']
+        if model is not None and len(features.tokens) >= 10:
+            perplexity = model.perplexity(features.tokens)
+        complexity = NEUTRAL_METRICS['syntactic_complexity']
+        if len(features.complexities):
+            complexity = float(np.mean(features.complexities))
+        lang_patterns = {}
+        if lang_code in LEXICONS:
+            lang_patterns = {category: features.lexicon.get((lang_code, category), 0) for category in CATEGORIES}
+        ai_prob, _, _ = score_text_metrics(
+            # The document's language, whose model (and so perplexity thresholds) scored the segment
+            script_info=dict(analyze_scripts(features.text), code=lang_code),
+            char_count=len(features.text),
+            word_count=len(features.tokens),
+            sentence_count=max(len(features.sentence_lengths), 1),
+            avg_sentence_length=len(features.tokens),
+            length_variance=None,
+            perplexity=perplexity,
+            burstiness=NEUTRAL_METRICS['burstiness'],
+            syntactic_complexity=complexity,
+            lang_patterns=lang_patterns,
+        )
+        return ai_prob
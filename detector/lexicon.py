@@ -0,0 +1,111 @@
+"""Single-pass lexicon matching for language-specific writing patterns.
+
+Word lists live in ``detector/lexicons/<code>.json``, one file per language
+with a list of words or phrases for each category in CATEGORIES. Every
+entry of every language is compiled into one character trie, emitted as a
+single regular expression, so a text is scanned once whatever the number
+of languages and categories.
+
+``\\b`` is not used: Python treats Indic vowel signs and viramas as
+non-word characters, so ``\\b`` fires inside words like ``मैं``. A match
+must instead start and end next to a character outside WORD_CHARS
+(letters, digits, combining marks of the supported scripts, ZWJ/ZWNJ).
+"""
+import json
+import os
+import re
+import unicodedata
+
+LEXICON_DIR = os.path.join(os.path.dirname(__file__), "lexicons")
+CATEGORIES = ("formal", "emotional", "personal", "informal")
+
+# Letters and digits, plus the marks that Python's \w leaves out; the Indic blocks minus the dandas
+WORD_CHARS = "\\w\u0300-\u036f\u064b-\u065f\u0670\u0900-\u0963\u0966-\u0dff\u200c\u200d"
+
+# Nukta letters such as क़ are excluded from NFC composition, yet texts often carry them precomposed
+_EXCLUDED_COMPOSITIONS = {
+    unicodedata.normalize("NFD", chr(codepoint)): chr(codepoint)
+    for codepoint in range(0x0900, 0x0E00)
+    if unicodedata.normalize("NFC", chr(codepoint)) != chr(codepoint)
+}
+
+
+def spellings(entry):
+    """The ways ``entry`` can be encoded: NFC, NFD and NFC with excluded compositions applied"""
+    nfc = unicodedata.normalize("NFC", entry).lower()
+    composed = nfc
+    for sequence, char in _EXCLUDED_COMPOSITIONS.items():
+        composed = composed.replace(sequence, char)
+    return {nfc, unicodedata.normalize("NFD", nfc), composed}
+
+
+def load_lexicons(directory=LEXICON_DIR):
+    """{language code: {category: tuple of entries}} from every <code>.json in ``directory``"""
+    lexicons = {}
+    for filename in sorted(os.listdir(directory)):
+        code, extension = os.path.splitext(filename)
+        if extension != ".json":
+            continue
+        with open(os.path.join(directory, filename), encoding="utf-8") as f:
+            data = json.load(f)
+        unknown = set(data) - set(CATEGORIES)
+        if unknown:
+            raise ValueError(f"{filename}: unknown categories {sorted(unknown)}")
+        lexicons[code] = {category: tuple(unicodedata.normalize("NFC", entry).lower()
+                                          for entry in data.get(category, ()))
+                          for category in CATEGORIES}
+    return lexicons
+
+
+def _trie_pattern(entries):
+    """Regex alternation shaped like a trie of ``entries``; longer entries win at the same start"""
+    root = {}
+    for entry in entries:
+        node = root
+        for char in entry:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def emit(node):
+        branches = [(r"\s+" if char == " " else re.escape(char)) + emit(child)
+                    for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            # Optional and greedy, so the longest entry is tried first and shorter ones on backtrack
+            return ("(?:" + body + ")" if len(branches) == 1 else body) + "?"
+        return body
+
+    return emit(root)
+
+
+class LexiconMatcher:
+    """Counts lexicon hits for every language and category in one scan"""
+
+    def __init__(self, lexicons):
+        self.lexicons = lexicons
+        self.hits = {}
+        for code, categories in lexicons.items():
+            for category, entries in categories.items():
+                for entry in entries:
+                    # Phrases match across any whitespace, so they are keyed by their words
+                    for spelling in spellings(" ".join(entry.split())):
+                        self.hits.setdefault(spelling, []).append((code, category))
+        self.pattern = re.compile(f"(?<![{WORD_CHARS}]){_trie_pattern(self.hits)}(?![{WORD_CHARS}])")
+
+    def empty_counts(self):
+        return {code: dict.fromkeys(CATEGORIES, 0) for code in self.lexicons}
+
+    def count(self, text, counts=None):
+        """Add the hits in ``text`` to ``counts`` ({code: {category: n}}, created when None) and return it"""
+        if counts is None:
+            counts = self.empty_counts()
+        # Lexicons hold every normalization form, so the text itself is only lower-cased
+        hits = self.hits
+        for match in self.pattern.finditer(text.lower()):
+            found = match.group()
+            # Only phrases matched across unusual whitespace need re-joining
+            for code, category in hits.get(found) or hits[" ".join(found.split())]:
+                counts[code][category] += 1
+        return counts
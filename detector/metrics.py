@@ -0,0 +1,259 @@
+"""Per-stage latency and memory instrumentation.
+
+Each stage of the image path and of enhanced_text_analysis runs inside
+``stage("name")``. While a ``trace()`` is open the stage timings are
+collected for that request (the caller decides whether to record them in
+the process registry); otherwise they go straight into the registry,
+which renders Prometheus text exposition format for a /metrics endpoint.
+
+    DETECTOR_METRICS=0          stage() becomes a shared no-op context manager
+    DETECTOR_METRICS_MEMORY=1   also sample the resident-set change per stage
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+ENABLED = os.environ.get("DETECTOR_METRICS", "1") != "0"
+SAMPLE_MEMORY = os.environ.get("DETECTOR_METRICS_MEMORY", "0") == "1"
+
+SECONDS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BYTES_BUCKETS = tuple(float(1 << shift) for shift in range(16, 32, 2))
+
+_current_trace = ContextVar("detector_trace", default=None)
+
+
+def current_rss():
+    """Resident set size of this process in bytes, or None where /proc is unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def memory_breakdown(pid="self", path=None):
+    """Resident memory of a process split into unique and shared bytes, from /proc/<pid>/smaps
+
+    'unique' pages (Private_*) are freed when the process exits; 'shared'
+    pages are also mapped by another process, such as the page-cache pages
+    of a memory-mapped checkpoint. With ``path``, 'file' breaks down the
+    mappings of that file alone. Returns None where smaps is unavailable.
+    """
+    fields = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+    totals = dict.fromkeys(fields, 0)
+    in_file = dict.fromkeys(fields, 0)
+    current = None
+    try:
+        with open(f"/proc/{pid}/smaps") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name in totals:
+                    kilobytes = int(value.split()[0])
+                    totals[name] += kilobytes
+                    if current == path:
+                        in_file[name] += kilobytes
+                elif "-" in name and " " in line:
+                    # Mapping header: "start-end perms offset dev inode [pathname]"
+                    parts = line.split(None, 5)
+                    current = parts[5].strip() if len(parts) > 5 else None
+    except (OSError, ValueError, IndexError):
+        return None
+
+    def summarize(counts):
+        return {
+            'rss': counts['Rss'] * 1024,
+            'pss': counts['Pss'] * 1024,
+            'unique': (counts['Private_Clean'] + counts['Private_Dirty']) * 1024,
+            'shared': (counts['Shared_Clean'] + counts['Shared_Dirty']) * 1024,
+        }
+
+    result = summarize(totals)
+    if path is not None:
+        result['file'] = summarize(in_file)
+    return result
+
+
+class Span:
+    __slots__ = ("name", "seconds", "rss_delta_bytes")
+
+    def __init__(self, name, seconds, rss_delta_bytes=None):
+        self.name = name
+        self.seconds = seconds
+        self.rss_delta_bytes = rss_delta_bytes
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Counters and histograms keyed by metric name and label values"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._help = {}
+
+    def describe(self, name, kind, help_text):
+        self._help[name] = (kind, help_text)
+
+    def inc(self, name, labels=(), amount=1):
+        key = (name, tuple(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set_gauge(self, name, value, labels=()):
+        with self._lock:
+            self._gauges[(name, tuple(labels))] = value
+
+    def observe(self, name, value, labels=(), buckets=SECONDS_BUCKETS):
+        key = (name, tuple(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def record_spans(self, spans):
+        for span in spans:
+            labels = (("stage", span.name),)
+            self.observe("detector_stage_seconds", span.seconds, labels)
+            if span.rss_delta_bytes is not None:
+                self.observe("detector_stage_rss_growth_bytes", max(span.rss_delta_bytes, 0), labels, BYTES_BUCKETS)
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+            histograms = sorted((key, (h.buckets, list(h.counts), h.sum, h.count))
+                                for key, h in self._histograms.items())
+        lines = []
+        described = set()
+
+        def header(name, kind):
+            if name not in described:
+                described.add(name)
+                help_kind, help_text = self._help.get(name, (kind, name))
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {help_kind}")
+
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{name}{_labels(labels)} {value}")
+        for (name, labels), value in gauges:
+            header(name, "gauge")
+            lines.append(f"{name}{_labels(labels)} {value}")
+        for (name, labels), (buckets, counts, total, count) in histograms:
+            header(name, "histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {total}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REGISTRY = MetricsRegistry()
+REGISTRY.describe("detector_stage_seconds", "histogram", "Time spent in each scoring stage")
+REGISTRY.describe("detector_stage_rss_growth_bytes", "histogram", "Resident memory growth during each scoring stage")
+
+
+class _NoopStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopStage()
+
+
+class _Stage:
+    __slots__ = ("name", "start", "rss")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.rss = current_rss() if SAMPLE_MEMORY else None
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        rss_delta = None
+        if self.rss is not None:
+            after = current_rss()
+            rss_delta = after - self.rss if after is not None else None
+        span = Span(self.name, seconds, rss_delta)
+        spans = _current_trace.get()
+        if spans is not None:
+            spans.append(span)
+        else:
+            REGISTRY.record_spans((span,))
+        return False
+
+
+def stage(name):
+    """Context manager timing one stage; free when instrumentation is disabled"""
+    return _Stage(name) if ENABLED else _NOOP
+
+
+@contextmanager
+def trace():
+    """Collect the stages run in this context into a list of Spans instead of the registry"""
+    spans = []
+    token = _current_trace.set(spans)
+    try:
+        yield spans
+    finally:
+        _current_trace.reset(token)
+
+
+def run_traced(func, *args, **kwargs):
+    """Call func inside a trace and return (result, spans); picklable for process pools"""
+    with trace() as spans:
+        result = func(*args, **kwargs)
+    return result, spans
+
+
+def breakdown(spans):
+    """Total seconds and RSS growth per stage name, in first-seen order"""
+    totals = {}
+    for span in spans:
+        entry = totals.setdefault(span.name, {'seconds': 0.0, 'calls': 0, 'rss_delta_bytes': None})
+        entry['seconds'] += span.seconds
+        entry['calls'] += 1
+        if span.rss_delta_bytes is not None:
+            entry['rss_delta_bytes'] = (entry['rss_delta_bytes'] or 0) + span.rss_delta_bytes
+    return totals
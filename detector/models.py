@@ -0,0 +1,326 @@
+"""CNN image detector and the process-wide model registry.
+
+Checkpoints are loaded with ``torch.load(mmap=True)`` and assigned to a
+module built on the meta device, so the weights stay backed by the
+checkpoint file: every worker process on a node maps the same page-cache
+pages instead of holding a private copy. Backends that repack the weights
+(channels_last, int8, torchscript) end up with private copies again.
+
+    DETECTOR_MMAP_WEIGHTS=0   copy checkpoint weights into process memory
+
+``python -m detector.models memory --workers 4`` loads the model in that
+many processes and reports each one's unique and shared resident memory.
+"""
+import argparse
+import hashlib
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from torchvision import transforms
+
+from detector.backends import DEFAULT_BACKEND, build_backend
+from detector.metrics import current_rss, memory_breakdown, stage
+from detector.preprocess import INPUT_SIZE, PreparedImage
+
+MODEL_NAME = "simple_resnet"
+MODEL_VERSION = "v1"
+DEFAULT_BATCH_SIZE = 32
+# Used only when no checkpoint is present so every process gets the same weights
+FALLBACK_SEED = 0
+MMAP_WEIGHTS = os.environ.get("DETECTOR_MMAP_WEIGHTS", "1") != "0"
+# Backends that run on the loaded parameters as they are, so mapped weights stay shared
+MAPPED_BACKENDS = ("eager", "compiled")
+
+CHECKPOINT_DIR = os.environ.get(
+    "DETECTOR_CHECKPOINT_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "checkpoints"),
+)
+
+
+class SimpleResNetAIDetector(nn.Module):
+    def __init__(self):
+        super(SimpleResNetAIDetector, self).__init__()
+        self.conv1 = nn.Conv2d(3, 32, kernel_size=3, stride=1, padding=1)
+        self.conv2 = nn.Conv2d(32, 64, kernel_size=3, stride=1, padding=1)
+        self.conv3 = nn.Conv2d(64, 128, kernel_size=3, stride=1, padding=1)
+        self.pool = nn.AdaptiveAvgPool2d((1, 1))
+        self.fc = nn.Linear(128, 2)
+
+    def forward(self, x):
+        x = F.relu(self.conv1(x))
+        x = F.max_pool2d(x, 2)
+        x = F.relu(self.conv2(x))
+        x = F.max_pool2d(x, 2)
+        x = F.relu(self.conv3(x))
+        x = self.pool(x)
+        x = x.view(x.size(0), -1)
+        x = self.fc(x)
+        return x
+
+
+MODEL_BUILDERS = {
+    MODEL_NAME: SimpleResNetAIDetector,
+}
+
+
+def build_transform():
+    return transforms.Compose([transforms.Resize(INPUT_SIZE), transforms.ToTensor()])
+
+
+def checkpoint_path(name=MODEL_NAME, version=MODEL_VERSION):
+    return os.path.join(CHECKPOINT_DIR, f"{name}-{version}.pt")
+
+
+def save_checkpoint(model, path, version=MODEL_VERSION):
+    """Write a versioned checkpoint that ModelRegistry can load"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    torch.save({'version': version, 'state_dict': model.state_dict()}, path)
+
+
+def load_checkpoint(model, path, version=MODEL_VERSION, mmap=False):
+    """Load a checkpoint into ``model``; with ``mmap`` the parameters become views of the file"""
+    checkpoint = torch.load(path, map_location="cpu", weights_only=True, mmap=mmap)
+    if checkpoint.get('version') != version:
+        raise ValueError(f"Checkpoint {path} has version {checkpoint.get('version')!r}, expected {version!r}")
+    # assign keeps the loaded (mapped) tensors instead of copying them into the module's own
+    model.load_state_dict(checkpoint['state_dict'], assign=mmap)
+    return model
+
+
+def file_fingerprint(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def model_nbytes(model):
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+class LoadedModel:
+    """A detector in inference mode together with its preprocessing pipeline"""
+
+    def __init__(self, name, version, model, transform, checkpoint, backend="eager",
+                 memory_format=torch.contiguous_format):
+        self.name = name
+        self.version = version
+        self.model = model
+        self.backend = backend
+        self.memory_format = memory_format
+        self.transform = transform
+        self.checkpoint = checkpoint
+        # Identifies the exact weights, so cached results can be invalidated when they change
+        self.fingerprint = file_fingerprint(checkpoint) if checkpoint else f"seed{FALLBACK_SEED}"
+        self.load_seconds = 0.0
+        self.warmup_seconds = 0.0
+        self.param_bytes = model_nbytes(model)
+        self.rss_delta_bytes = None
+        self.mapped = False
+
+    def forward(self, batch):
+        with torch.inference_mode():
+            if self.memory_format is not torch.contiguous_format:
+                batch = batch.contiguous(memory_format=self.memory_format)
+            return F.softmax(self.model(batch), dim=1)
+
+    def warm_up(self):
+        start = time.perf_counter()
+        self.forward(torch.zeros(1, 3, *INPUT_SIZE))
+        self.warmup_seconds = time.perf_counter() - start
+
+    def stats(self):
+        return {
+            'name': self.name,
+            'version': self.version,
+            'backend': self.backend,
+            'checkpoint': self.checkpoint,
+            'fingerprint': self.fingerprint,
+            'load_seconds': self.load_seconds,
+            'warmup_seconds': self.warmup_seconds,
+            'param_bytes': self.param_bytes,
+            'rss_delta_bytes': self.rss_delta_bytes,
+            'mapped': self.mapped,
+        }
+
+    def memory(self):
+        """memory_breakdown of this process, with the checkpoint's own mapping under 'file'"""
+        return memory_breakdown(path=os.path.realpath(self.checkpoint) if self.checkpoint else None)
+
+
+class ModelRegistry:
+    """Builds each detector once per process and hands out the same instance"""
+
+    def __init__(self, checkpoint_dir=None, backend=DEFAULT_BACKEND):
+        self.checkpoint_dir = checkpoint_dir
+        self.backend = backend
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _checkpoint_path(self, name, version):
+        if self.checkpoint_dir is None:
+            return checkpoint_path(name, version)
+        return os.path.join(self.checkpoint_dir, f"{name}-{version}.pt")
+
+    def _load(self, name, version, backend):
+        if name not in MODEL_BUILDERS:
+            raise KeyError(f"Unknown model {name!r}")
+        rss_before = current_rss()
+        start = time.perf_counter()
+
+        path = self._checkpoint_path(name, version)
+        mapped = False
+        if os.path.exists(path):
+            if MMAP_WEIGHTS:
+                # Meta tensors allocate nothing; load_checkpoint assigns the mapped ones
+                with torch.device("meta"):
+                    model = MODEL_BUILDERS[name]()
+                model = load_checkpoint(model, path, version, mmap=True)
+                mapped = backend in MAPPED_BACKENDS
+            else:
+                model = load_checkpoint(MODEL_BUILDERS[name](), path, version)
+            checkpoint = path
+        else:
+            with torch.random.fork_rng():
+                torch.manual_seed(FALLBACK_SEED)
+                model = MODEL_BUILDERS[name]()
+            checkpoint = None
+        model.eval()
+        for param in model.parameters():
+            param.requires_grad_(False)
+        # Weight size is reported for the fp32 model; backends may repack it
+        param_bytes = model_nbytes(model)
+        model, memory_format = build_backend(model, backend, INPUT_SIZE)
+
+        entry = LoadedModel(name, version, model, build_transform(), checkpoint, backend, memory_format)
+        entry.param_bytes = param_bytes
+        entry.mapped = mapped
+        entry.load_seconds = time.perf_counter() - start
+        entry.warm_up()
+        rss_after = current_rss()
+        if rss_before is not None and rss_after is not None:
+            entry.rss_delta_bytes = rss_after - rss_before
+        return entry
+
+    def get(self, name=MODEL_NAME, version=MODEL_VERSION, backend=None):
+        key = (name, version, backend or self.backend)
+        entry = self._models.get(key)
+        if entry is None:
+            with self._lock:
+                entry = self._models.get(key)
+                if entry is None:
+                    with stage("model.load"):
+                        entry = self._load(*key)
+                    self._models[key] = entry
+        return entry
+
+    def stats(self):
+        return {f"{name}-{version}-{backend}": entry.stats() for (name, version, backend), entry in self._models.items()}
+
+
+_registry = ModelRegistry()
+
+
+def get_registry():
+    return _registry
+
+
+def input_tensor(entry, image):
+    if isinstance(image, PreparedImage):
+        return image.tensor
+    return entry.transform(image)
+
+
+def detect_images(images, batch_size=DEFAULT_BATCH_SIZE, name=MODEL_NAME, version=MODEL_VERSION):
+    """Score a list of RGB PIL images or PreparedImages, one forward pass per batch
+
+    Returns a list of {'ai_prob', 'real_prob'} dicts in input order.
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+    entry = get_registry().get(name, version)
+    results = []
+    for start in range(0, len(images), batch_size):
+        with stage("image.tensor"):
+            batch = torch.stack([input_tensor(entry, image) for image in images[start:start + batch_size]])
+        with stage("model.forward"):
+            probs = entry.forward(batch).tolist()
+        for real_prob, ai_prob in probs:
+            results.append({'ai_prob': ai_prob, 'real_prob': real_prob})
+    return results
+
+
+def detect_image(image, name=MODEL_NAME, version=MODEL_VERSION):
+    """Return (ai_prob, real_prob) for a PIL image using the cached detector"""
+    result = detect_images([image], batch_size=1, name=name, version=version)[0]
+    return result['ai_prob'], result['real_prob']
+
+
+def _memory_worker(checkpoint_dir, backend, barrier, results):
+    entry = ModelRegistry(checkpoint_dir, backend).get()
+    entry.forward(torch.zeros(4, 3, *INPUT_SIZE))
+    # Measure only once every worker has the weights resident, and stay alive until all have measured
+    barrier.wait()
+    results.put((os.getpid(), entry.stats(), entry.memory()))
+    barrier.wait()
+
+
+def measure_workers(workers, backend=DEFAULT_BACKEND, checkpoint_dir=None):
+    """Load the detector in ``workers`` fresh processes; (pid, stats, memory_breakdown) for each"""
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [context.Process(target=_memory_worker, args=(checkpoint_dir, backend, barrier, results))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    reports = sorted(results.get(timeout=300) for _ in processes)
+    for process in processes:
+        process.join()
+    return reports
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect the CNN detector")
+    commands = parser.add_subparsers(dest="command", required=True)
+    memory = commands.add_parser("memory", help="per-worker unique vs shared resident memory")
+    memory.add_argument("--workers", type=int, default=4)
+    memory.add_argument("--backend", default=DEFAULT_BACKEND)
+    memory.add_argument("--checkpoint-dir", help=f"default {CHECKPOINT_DIR}")
+    memory.add_argument("--no-mmap", action="store_true", help="copy the weights into each worker for comparison")
+    args = parser.parse_args(argv)
+
+    if args.workers < 1:
+        parser.error("--workers must be positive")
+    # Read by the spawned workers when they import this module
+    os.environ["DETECTOR_MMAP_WEIGHTS"] = "0" if args.no_mmap else "1"
+    reports = measure_workers(args.workers, args.backend, args.checkpoint_dir)
+    if reports[0][2] is None:
+        print("/proc/<pid>/smaps is not available on this platform", file=sys.stderr)
+        return
+    mb = 1024 ** 2
+    stats = reports[0][1]
+    print(f"checkpoint: {stats['checkpoint'] or 'none (seeded weights, not mapped)'}; "
+          f"backend {stats['backend']}; weights {stats['param_bytes'] / mb:.1f} MB, "
+          f"{'shared via mmap' if stats['mapped'] else 'private per worker'}")
+    print(f"{'pid':>8}{'rss MB':>10}{'unique MB':>11}{'shared MB':>11}{'pss MB':>9}"
+          f"{'ckpt rss MB':>13}{'ckpt shared MB':>16}")
+    for pid, _, usage in reports:
+        file_usage = usage.get('file') or dict.fromkeys(('rss', 'shared'), 0)
+        print(f"{pid:>8}{usage['rss'] / mb:>10.1f}{usage['unique'] / mb:>11.1f}{usage['shared'] / mb:>11.1f}"
+              f"{usage['pss'] / mb:>9.1f}{file_usage['rss'] / mb:>13.1f}{file_usage['shared'] / mb:>16.1f}")
+    # PSS splits each shared page between the processes mapping it, so it sums to the real footprint
+    print(f"total PSS across workers: {sum(usage['pss'] for _, _, usage in reports) / mb:.1f} MB "
+          f"(sum of RSS {sum(usage['rss'] for _, _, usage in reports) / mb:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,426 @@
+"""Memory-mapped reference n-gram language models.
+
+One flat file per language holds an interpolated absolute-discounting
+n-gram model as plain arrays: for each order, the sorted 64-bit hashes of
+its n-grams, a uint8 code for each n-gram's log10 probability and a uint8
+code for its backoff weight (used when it is the context of a longer
+n-gram), with a 256-entry codebook per array. Files are opened with mmap,
+so opening a model costs one header read and every worker process shares
+the same page-cache pages. Lookups are np.searchsorted over all the
+positions of a text at once, one call per order.
+
+File layout (little-endian):
+    b"DNGRAM01"      magic
+    uint64           header length
+    header           UTF-8 JSON: order, unk_log10, fingerprint,
+                     perplexity_thresholds and, per order, count, array
+                     offsets and codebooks
+    arrays           per order: keys (uint64), prob codes and backoff
+                     codes (uint8), each aligned to 8 bytes
+
+Build a model from a local corpus (one document per line):
+
+    python -m detector.ngram build --lang hi --order 3 corpus/hi/*.txt
+    python -m detector.ngram score --lang hi "कुछ पाठ"
+
+Perplexity under a reference model runs far higher than a text's
+perplexity against its own word counts, so the build holds out every
+tenth document and stores the 20th and 80th percentiles of their
+perplexities as the model's (low, high) scoring thresholds. A model is
+only used once it has them.
+
+Models are looked up as ``<DETECTOR_NGRAM_DIR>/<code>.ngram`` (default
+``checkpoints/ngram``); languages without a calibrated model fall back to
+the text's own unigram perplexity.
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+
+import numpy as np
+
+MAGIC = b"DNGRAM01"
+FORMAT_VERSION = 1
+DEFAULT_ORDER = 3
+CODEBOOK_SIZE = 256
+# Multiplier folding token hashes into n-gram keys (wraps modulo 2**64)
+KEY_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+MIN_DISCOUNT, MAX_DISCOUNT = 0.1, 0.9
+# Held-out perplexity quantiles stored as a model's (low, high) thresholds
+CALIBRATION_QUANTILES = (0.2, 0.8)
+DEFAULT_HOLDOUT = 0.1
+# Held-out documents of at least MIN_SCORED_TOKENS tokens needed to calibrate
+MIN_CALIBRATION_DOCUMENTS = 20
+# Shorter texts are never scored against a model (see text.reference_perplexity)
+MIN_SCORED_TOKENS = 10
+
+NGRAM_DIR = os.environ.get(
+    "DETECTOR_NGRAM_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "checkpoints", "ngram"),
+)
+
+
+def tokenize(text):
+    """The tokenization calculate_perplexity uses"""
+    return text.lower().split()
+
+
+def token_hashes(tokens):
+    """Stable 64-bit hash per token; each distinct token is hashed once"""
+    vocab = {token: int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+             for token in dict.fromkeys(tokens)}
+    return np.fromiter(map(vocab.__getitem__, tokens), dtype=np.uint64, count=len(tokens))
+
+
+def ngram_keys(hashes, order):
+    """keys[k - 1][i] identifies the k-gram ending at token i (meaningful where i has k - 1 predecessors)"""
+    keys = [hashes]
+    for _ in range(1, order):
+        previous = keys[-1]
+        current = np.zeros_like(hashes)
+        current[1:] = previous[:-1] * KEY_MULTIPLIER + hashes[1:]
+        keys.append(current)
+    return keys
+
+
+def document_positions(lengths):
+    """Index of every token within its own document, for documents of the given lengths"""
+    lengths = np.asarray(lengths, dtype=np.int64)
+    starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return np.arange(lengths.sum(), dtype=np.int64) - starts
+
+
+class _Table:
+    """One order of a model: sorted keys with their log10 probabilities and backoff weights"""
+
+    def __init__(self, keys, probs, backoffs):
+        self.keys = keys
+        self.probs = probs
+        self.backoffs = backoffs
+
+    def find(self, queries):
+        """(found mask, slot of each query in keys)"""
+        if not len(self.keys):
+            return np.zeros(len(queries), dtype=bool), np.zeros(len(queries), dtype=np.intp)
+        slots = np.minimum(np.searchsorted(self.keys, queries), len(self.keys) - 1)
+        return self.keys[slots] == queries, slots
+
+
+def _log10_probs(tables, unk_log10, hashes, positions):
+    """Backed-off log10 p(token | up to order - 1 previous tokens of the same document), per token"""
+    order = len(tables)
+    keys = ngram_keys(hashes, order)
+    result = np.full(len(hashes), unk_log10, dtype=np.float64)
+    backoff = np.zeros(len(hashes), dtype=np.float64)
+    resolved = np.zeros(len(hashes), dtype=bool)
+    for k in range(order, 0, -1):
+        candidates = np.flatnonzero(~resolved & (positions >= k - 1))
+        found, slots = tables[k - 1].find(keys[k - 1][candidates])
+        hits = candidates[found]
+        result[hits] = backoff[hits] + tables[k - 1].probs[slots[found]]
+        resolved[hits] = True
+        if k > 1:
+            # Not seen at this order: pay the backoff weight of the k - 1 token context, if it was seen
+            missing = candidates[~found]
+            found, slots = tables[k - 2].find(keys[k - 2][missing - 1])
+            backoff[missing[found]] += tables[k - 2].backoffs[slots[found]]
+    unknown = ~resolved
+    result[unknown] += backoff[unknown]
+    return result
+
+
+class NGramModel:
+    """A model file mapped read-only; arrays are views into the mapping"""
+
+    def __init__(self, path):
+        self.path = path
+        start = time.perf_counter()
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not an n-gram model file")
+        (header_length,) = struct.unpack_from("<Q", self._mmap, len(MAGIC))
+        header_start = len(MAGIC) + 8
+        header = json.loads(bytes(self._mmap[header_start:header_start + header_length]))
+        if header['format'] != FORMAT_VERSION:
+            raise ValueError(f"{path} has format {header['format']}, expected {FORMAT_VERSION}")
+        data_start = _align(header_start + header_length)
+
+        self.order = header['order']
+        self.unk_log10 = header['unk_log10']
+        self.fingerprint = header['fingerprint']
+        thresholds = header.get('perplexity_thresholds')
+        self.perplexity_thresholds = tuple(thresholds) if thresholds else None
+        self.tables = []
+        for entry in header['orders']:
+            count = entry['count']
+            keys = np.frombuffer(self._mmap, np.uint64, count, data_start + entry['keys'])
+            probs = np.frombuffer(self._mmap, np.uint8, count, data_start + entry['probs'])
+            backoffs = np.frombuffer(self._mmap, np.uint8, count, data_start + entry['backoffs'])
+            self.tables.append(_Table(keys, _Decoded(probs, entry['prob_codebook']),
+                                      _Decoded(backoffs, entry['backoff_codebook'])))
+        self.load_seconds = time.perf_counter() - start
+
+    @property
+    def nbytes(self):
+        return len(self._mmap)
+
+    def log10_probs(self, tokens, positions=None):
+        """log10 probability of every token; ``positions`` (index within its document) defaults to one document"""
+        hashes = token_hashes(tokens)
+        if positions is None:
+            positions = np.arange(len(tokens), dtype=np.int64)
+        return _log10_probs(self.tables, self.unk_log10, hashes, positions)
+
+    def perplexity(self, tokens):
+        if not tokens:
+            return float("inf")
+        return float(10 ** -self.log10_probs(tokens).mean())
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'order': self.order,
+            'ngrams': [len(table.keys) for table in self.tables],
+            'file_bytes': self.nbytes,
+            'load_seconds': self.load_seconds,
+            'fingerprint': self.fingerprint,
+            'perplexity_thresholds': self.perplexity_thresholds,
+        }
+
+
+class _Decoded:
+    """uint8 codes indexed through a codebook, so only the looked-up values are decoded"""
+
+    def __init__(self, codes, codebook):
+        self.codes = codes
+        self.codebook = np.asarray(codebook, dtype=np.float64)
+
+    def __getitem__(self, slots):
+        return self.codebook[self.codes[slots]]
+
+
+def _align(offset, alignment=8):
+    return -(-offset // alignment) * alignment
+
+
+def quantize(values, size=CODEBOOK_SIZE):
+    """(uint8 codes, codebook) mapping each value to the nearest of up to ``size`` quantile levels"""
+    if not len(values):
+        return np.zeros(0, dtype=np.uint8), [0.0]
+    levels = np.unique(np.quantile(values, np.linspace(0, 1, size)))
+    codes = np.searchsorted((levels[1:] + levels[:-1]) / 2, values)
+    return codes.astype(np.uint8), levels.tolist()
+
+
+def _discount(counts):
+    """Ney's estimate D = n1 / (n1 + 2 n2) from the counts-of-counts"""
+    n1, n2 = np.count_nonzero(counts == 1), np.count_nonzero(counts == 2)
+    if n1 == 0 or n2 == 0:
+        return 0.75
+    return float(np.clip(n1 / (n1 + 2 * n2), MIN_DISCOUNT, MAX_DISCOUNT))
+
+
+def build_tables(documents, order=DEFAULT_ORDER, min_count=1):
+    """Estimate an interpolated absolute-discounting model from token lists
+
+    Returns (tables, unk_log10) with float log10 probabilities and
+    backoff weights. N-grams above order 1 seen fewer than ``min_count``
+    times are pruned.
+    """
+    lengths = [len(document) for document in documents]
+    tokens = [token for document in documents for token in document]
+    if not tokens:
+        raise ValueError("The corpus has no tokens")
+    hashes = token_hashes(tokens)
+    positions = document_positions(lengths)
+    keys = ngram_keys(hashes, order)
+
+    # Unigrams with add-one smoothing, which also leaves mass for unseen tokens
+    unigrams, counts = np.unique(hashes, return_counts=True)
+    denominator = len(tokens) + len(unigrams) + 1
+    tables = [_Table(unigrams, np.log10((counts + 1) / denominator), np.zeros(len(unigrams)))]
+    unk_log10 = float(np.log10(1 / denominator))
+
+    for k in range(2, order + 1):
+        valid = np.flatnonzero(positions >= k - 1)
+        ngrams, first, counts = np.unique(keys[k - 1][valid], return_index=True, return_counts=True)
+        at = valid[first]
+        contexts = keys[k - 2][at - 1]
+        discount = _discount(counts)
+
+        # Context totals and distinct continuations, over all n-grams before pruning
+        context_keys, context_index = np.unique(contexts, return_inverse=True)
+        context_totals = np.bincount(context_index, weights=counts)
+        continuations = np.bincount(context_index)
+        gamma = discount * continuations / context_totals
+
+        # Interpolate with the lower order's estimate for the same suffix
+        lower = 10 ** _log10_probs(tables, unk_log10, hashes, positions)[at]
+        probs = np.maximum(counts - discount, 0) / context_totals[context_index] + gamma[context_index] * lower
+
+        parent = tables[k - 2]
+        found, slots = parent.find(context_keys)
+        parent.backoffs[slots[found]] = np.log10(gamma[found])
+
+        keep = counts >= min_count
+        tables.append(_Table(ngrams[keep], np.log10(probs[keep]), np.zeros(int(keep.sum()))))
+    return tables, unk_log10
+
+
+def split_holdout(documents, fraction=DEFAULT_HOLDOUT):
+    """(training, held-out) documents, holding out every ``1 / fraction``-th one"""
+    if fraction <= 0:
+        return list(documents), []
+    step = max(round(1 / fraction), 2)
+    training, held_out = [], []
+    for i, document in enumerate(documents):
+        (held_out if i % step == step - 1 else training).append(document)
+    return training, held_out
+
+
+def calibrate(tables, unk_log10, documents, quantiles=CALIBRATION_QUANTILES):
+    """(low, high) quantiles of per-document perplexity over held-out token lists; None when too few"""
+    documents = [document for document in documents if len(document) >= MIN_SCORED_TOKENS]
+    if len(documents) < MIN_CALIBRATION_DOCUMENTS:
+        return None
+    lengths = np.array([len(document) for document in documents], dtype=np.int64)
+    hashes = token_hashes([token for document in documents for token in document])
+    log10 = _log10_probs(tables, unk_log10, hashes, document_positions(lengths))
+    sums = np.add.reduceat(log10, np.cumsum(lengths) - lengths)
+    return tuple(float(value) for value in np.quantile(10 ** (-sums / lengths), quantiles))
+
+
+def write_model(tables, unk_log10, path, perplexity_thresholds=None):
+    """Quantize ``tables`` and write them in the flat file format"""
+    orders, chunks, offset = [], [], 0
+    digest = hashlib.blake2b(digest_size=8)
+    for table in tables:
+        prob_codes, prob_codebook = quantize(table.probs)
+        backoff_codes, backoff_codebook = quantize(table.backoffs)
+        entry = {'count': len(table.keys), 'prob_codebook': prob_codebook, 'backoff_codebook': backoff_codebook}
+        for name, array in (("keys", table.keys.astype("<u8")), ("probs", prob_codes), ("backoffs", backoff_codes)):
+            offset = _align(offset)
+            entry[name] = offset
+            chunks.append((offset, array.tobytes()))
+            digest.update(chunks[-1][1])
+            offset += array.nbytes
+        digest.update(json.dumps([prob_codebook, backoff_codebook]).encode())
+        orders.append(entry)
+    if perplexity_thresholds is not None:
+        perplexity_thresholds = [float(value) for value in perplexity_thresholds]
+    digest.update(json.dumps(perplexity_thresholds).encode())
+
+    header = json.dumps({
+        'format': FORMAT_VERSION,
+        'order': len(tables),
+        'unk_log10': unk_log10,
+        'fingerprint': digest.hexdigest(),
+        'perplexity_thresholds': perplexity_thresholds,
+        'orders': orders,
+    }).encode("utf-8")
+    data_start = _align(len(MAGIC) + 8 + len(header))
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + struct.pack("<Q", len(header)) + header)
+        for chunk_offset, data in chunks:
+            f.seek(data_start + chunk_offset)
+            f.write(data)
+    # Workers may have the old file mapped; replacing it leaves their mapping intact
+    os.replace(tmp, path)
+
+
+def model_path(lang_code, directory=None):
+    return os.path.join(directory or NGRAM_DIR, f"{lang_code}.ngram")
+
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def get_model(lang_code):
+    """The reference model for ``lang_code``, mapped once per process; None when there is no calibrated file"""
+    if lang_code not in _models:
+        with _models_lock:
+            if lang_code not in _models:
+                path = model_path(lang_code)
+                model = NGramModel(path) if os.path.exists(path) else None
+                # Without thresholds on its own scale the model's perplexity cannot be scored
+                _models[lang_code] = model if model is not None and model.perplexity_thresholds else None
+    return _models[lang_code]
+
+
+def available_models():
+    """{language code: model} for every model file in DETECTOR_NGRAM_DIR"""
+    if not os.path.isdir(NGRAM_DIR):
+        return {}
+    codes = sorted(name[:-len(".ngram")] for name in os.listdir(NGRAM_DIR) if name.endswith(".ngram"))
+    return {code: model for code in codes if (model := get_model(code)) is not None}
+
+
+def models_fingerprint():
+    """Identifies the reference models in use, for cache tags"""
+    models = available_models()
+    return ",".join(f"{code}-{model.fingerprint}" for code, model in models.items()) or "none"
+
+
+def iter_corpus(paths):
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                tokens = tokenize(line)
+                if tokens:
+                    yield tokens
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and inspect reference n-gram language models")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="build a model from text files, one document per line")
+    build.add_argument("corpus", nargs="+", help="UTF-8 text files")
+    build.add_argument("--lang", required=True, help="language code the model is used for, e.g. hi")
+    build.add_argument("--order", type=int, default=DEFAULT_ORDER)
+    build.add_argument("--min-count", type=int, default=1, help="prune longer n-grams seen fewer times")
+    build.add_argument("--holdout", type=float, default=DEFAULT_HOLDOUT,
+                       help="fraction of documents held out to calibrate the perplexity thresholds")
+    build.add_argument("--output", help=f"model file (default {model_path('<lang>')})")
+    score = commands.add_parser("score", help="perplexity of a text under a model")
+    score.add_argument("text")
+    score.add_argument("--lang", required=True)
+    score.add_argument("--model", help="model file (default: the one for --lang)")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        if args.order < 1 or args.min_count < 1:
+            parser.error("--order and --min-count must be positive")
+        if not 0 <= args.holdout < 1:
+            parser.error("--holdout must be in [0, 1)")
+        start = time.perf_counter()
+        documents, held_out = split_holdout(list(iter_corpus(args.corpus)), args.holdout)
+        tables, unk_log10 = build_tables(documents, order=args.order, min_count=args.min_count)
+        thresholds = calibrate(tables, unk_log10, held_out)
+        output = args.output or model_path(args.lang)
+        write_model(tables, unk_log10, output, thresholds)
+        model = NGramModel(output)
+        print(f"Wrote {output}: {sum(map(len, documents))} tokens, n-grams per order {model.stats()['ngrams']}, "
+              f"{model.nbytes / 1024 ** 2:.1f} MB in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+        if thresholds is None:
+            print(f"Not calibrated: fewer than {MIN_CALIBRATION_DOCUMENTS} held-out documents of "
+                  f"{MIN_SCORED_TOKENS}+ tokens, so the model will not be used for scoring", file=sys.stderr)
+        else:
+            print(f"Perplexity thresholds {thresholds[0]:.1f} / {thresholds[1]:.1f}", file=sys.stderr)
+    else:
+        model = NGramModel(args.model or model_path(args.lang))
+        tokens = tokenize(args.text)
+        print(json.dumps({'perplexity': model.perplexity(tokens), 'tokens': len(tokens), **model.stats()}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Decode uploads once, close to model resolution.
+
+JPEGs are decoded with PIL's draft mode, which lets libjpeg scale by
+1/2-1/8 while decoding, so a 12 MP phone photo never exists at full size.
+Other formats are resized with a reducing gap. The resulting 224x224
+image is used both for the UI preview and for the model tensor.
+"""
+import io
+from functools import cached_property
+
+import numpy as np
+from PIL import Image
+
+from detector.metrics import stage
+
+INPUT_SIZE = (224, 224)
+# Part of the CNN cache tag: bump when the pixels fed to the model change
+PREPROCESS_VERSION = "1"
+REDUCING_GAP = 3.0
+# Modes that can be resized directly and still convert to RGB identically afterwards
+RESIZE_FIRST_MODES = ("RGB", "L")
+
+
+class PreparedImage:
+    """An upload decoded once: original size/format plus the model-sized RGB image"""
+
+    def __init__(self, size, format, image):
+        self.size = size
+        self.format = format
+        self.image = image
+
+    @cached_property
+    def tensor(self):
+        """CHW float tensor in [0, 1], equivalent to transforms.ToTensor() on self.image"""
+        import torch
+        pixels = torch.from_numpy(np.array(self.image))
+        return pixels.permute(2, 0, 1).float().div_(255)
+
+
+def prepare_image(source, target=INPUT_SIZE):
+    """Build a PreparedImage from a path, file object, raw bytes or PIL image"""
+    if isinstance(source, PreparedImage):
+        return source
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    with stage("image.decode"):
+        image = source if isinstance(source, Image.Image) else Image.open(source)
+        size, format = image.size, image.format
+        if image.format == "JPEG":
+            # Only takes effect before the pixels are loaded
+            image.draft("RGB", target)
+        image.load()
+
+    with stage("image.resize"):
+        if image.mode not in RESIZE_FIRST_MODES:
+            image = image.convert("RGB")
+        if image.size != target:
+            image = image.resize(target, Image.BILINEAR, reducing_gap=REDUCING_GAP)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+    return PreparedImage(size, format, image)
@@ -0,0 +1,222 @@
+"""Shared CNN inference scheduler with dynamic micro-batching.
+
+Streamlit sessions and service threads hand their prepared images to one
+inference thread instead of calling the model themselves. The thread
+waits up to ``max_wait_ms`` after the first request for others to arrive,
+runs them as a single batch with a pinned torch thread count, and hands
+each caller its own results. The queue is bounded by the number of
+images waiting, not requests, since one request may carry a whole tiled
+batch: when it is full ``submit`` raises SchedulerBusy immediately rather
+than letting requests pile up. A caller whose results are not ready
+within ``timeout`` seconds gets SchedulerTimeout (a SchedulerBusy), and
+its request is dropped if its batch has not started yet.
+
+Configure with DETECTOR_SCHEDULER_WAIT_MS, DETECTOR_SCHEDULER_QUEUE,
+DETECTOR_SCHEDULER_BATCH, DETECTOR_SCHEDULER_TIMEOUT and
+DETECTOR_TORCH_THREADS.
+"""
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from detector.metrics import REGISTRY, stage
+
+DEFAULT_MAX_WAIT_MS = 10.0
+# Images waiting for the inference thread, across all requests
+DEFAULT_MAX_QUEUE = 256
+DEFAULT_MAX_BATCH = 32
+DEFAULT_TIMEOUT = 60.0
+BATCH_SIZE_BUCKETS = (1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 64.0)
+
+REGISTRY.describe("detector_scheduler_batch_size", "histogram", "Images per scheduled forward pass")
+REGISTRY.describe("detector_scheduler_queue_seconds", "histogram", "Time requests wait before their batch starts")
+REGISTRY.describe("detector_scheduler_rejected_total", "counter", "Requests turned away because the queue was full")
+REGISTRY.describe("detector_scheduler_timeouts_total", "counter", "Requests whose results were not ready in time")
+
+
+class SchedulerBusy(Exception):
+    """The inference queue is full; retry later"""
+
+
+class SchedulerTimeout(SchedulerBusy):
+    """Results were not ready within the timeout; retry later"""
+
+
+class _Request:
+    __slots__ = ("images", "future", "enqueued")
+
+    def __init__(self, images):
+        self.images = images
+        self.future = Future()
+        self.enqueued = time.perf_counter()
+
+
+class InferenceScheduler:
+    def __init__(self, max_batch_size=DEFAULT_MAX_BATCH, max_wait_ms=DEFAULT_MAX_WAIT_MS,
+                 max_queue=DEFAULT_MAX_QUEUE, torch_threads=None, timeout=DEFAULT_TIMEOUT):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue = max_queue
+        self.torch_threads = torch_threads or os.cpu_count() or 1
+        self.timeout = timeout
+        # Bounded by queued_images instead of its length
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self.queued_images = 0
+        self.submitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.peak_queue_depth = 0
+        self.batch_sizes = Counter()
+        self.queue_seconds = 0.0
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="inference-scheduler", daemon=True)
+                    self._thread.start()
+
+    def submit(self, images, timeout=None):
+        """Score PreparedImages (or RGB PIL images) and return {'ai_prob', 'real_prob'} dicts in order
+
+        ``timeout`` defaults to the scheduler's; None there waits forever.
+        A request larger than max_queue is only accepted into an empty queue.
+        """
+        if not images:
+            return []
+        if self._closed:
+            raise RuntimeError("Scheduler is closed")
+        self._ensure_started()
+        request = _Request(list(images))
+        with self._lock:
+            full = self.queued_images and self.queued_images + len(request.images) > self.max_queue
+            if full:
+                self.rejected += 1
+            else:
+                self.queued_images += len(request.images)
+                self.submitted += 1
+                self.peak_queue_depth = max(self.peak_queue_depth, self.queued_images)
+        if full:
+            REGISTRY.inc("detector_scheduler_rejected_total")
+            raise SchedulerBusy(f"Inference queue is full ({self.max_queue} images waiting)")
+        self._queue.put(request)
+        timeout = self.timeout if timeout is None else timeout
+        with stage("scheduler.wait"):
+            try:
+                return request.future.result(timeout)
+            except FutureTimeout:
+                # Drops the request if its batch has not started; otherwise its results are discarded
+                request.future.cancel()
+                with self._lock:
+                    self.timed_out += 1
+                REGISTRY.inc("detector_scheduler_timeouts_total")
+                raise SchedulerTimeout(f"No inference results within {timeout:g} s") from None
+
+    def _collect(self, first):
+        """First request plus whatever else arrives within the wait window, up to max_batch_size images"""
+        batch, count = [first], len(first.images)
+        deadline = time.perf_counter() + self.max_wait
+        while count < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                self._queue.put(None)
+                break
+            batch.append(request)
+            count += len(request.images)
+        return batch
+
+    def _start(self, batch):
+        """Requests of ``batch`` still wanted, marked running so they can no longer be cancelled"""
+        with self._lock:
+            self.queued_images -= sum(len(request.images) for request in batch)
+        return [request for request in batch if request.future.set_running_or_notify_cancel()]
+
+    def _run(self):
+        import torch
+        from detector.models import detect_images
+        torch.set_num_threads(self.torch_threads)
+
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = self._start(self._collect(first))
+            if not batch:
+                continue
+            started = time.perf_counter()
+            images = [image for request in batch for image in request.images]
+            with self._lock:
+                self.batch_sizes[len(images)] += 1
+                self.queue_seconds += sum(started - request.enqueued for request in batch)
+            REGISTRY.observe("detector_scheduler_batch_size", len(images), buckets=BATCH_SIZE_BUCKETS)
+            for request in batch:
+                REGISTRY.observe("detector_scheduler_queue_seconds", started - request.enqueued)
+            try:
+                results = detect_images(images, batch_size=self.max_batch_size)
+            except Exception as exc:
+                for request in batch:
+                    request.future.set_exception(exc)
+                continue
+            offset = 0
+            for request in batch:
+                request.future.set_result(results[offset:offset + len(request.images)])
+                offset += len(request.images)
+
+    def stats(self):
+        with self._lock:
+            batches = sum(self.batch_sizes.values())
+            images = sum(size * n for size, n in self.batch_sizes.items())
+            return {
+                'queue_depth': self.queued_images,
+                'queued_requests': self._queue.qsize(),
+                'peak_queue_depth': self.peak_queue_depth,
+                'max_queue': self.max_queue,
+                'submitted': self.submitted,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+                'timeout': self.timeout,
+                'batches': batches,
+                'mean_batch_size': images / batches if batches else 0.0,
+                'batch_sizes': dict(sorted(self.batch_sizes.items())),
+                'mean_queue_ms': self.queue_seconds / self.submitted * 1000 if self.submitted else 0.0,
+                'torch_threads': self.torch_threads,
+                'max_wait_ms': self.max_wait * 1000,
+            }
+
+    def close(self):
+        self._closed = True
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                threads = os.environ.get("DETECTOR_TORCH_THREADS")
+                timeout = float(os.environ.get("DETECTOR_SCHEDULER_TIMEOUT", DEFAULT_TIMEOUT))
+                _scheduler = InferenceScheduler(
+                    max_batch_size=int(os.environ.get("DETECTOR_SCHEDULER_BATCH", DEFAULT_MAX_BATCH)),
+                    max_wait_ms=float(os.environ.get("DETECTOR_SCHEDULER_WAIT_MS", DEFAULT_MAX_WAIT_MS)),
+                    max_queue=int(os.environ.get("DETECTOR_SCHEDULER_QUEUE", DEFAULT_MAX_QUEUE)),
+                    torch_threads=int(threads) if threads else None,
+                    timeout=timeout or None,
+                )
+    return _scheduler
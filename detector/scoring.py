@@ -0,0 +1,91 @@
+"""UI-independent scoring entry points shared by the HTTP service and batch tools."""
+import os
+import threading
+
+from detector.cascade import cascade_images, cascade_text
+from detector.metrics import stage
+from detector.text import enhanced_text_analysis
+
+IMAGE_METHODS = ("heuristic", "cnn", "tiled", "cascade")
+# Text-only deployments refuse image scoring, so torch and PIL are never imported
+TEXT_ONLY = os.environ.get("DETECTOR_TEXT_ONLY", "0") == "1"
+
+
+def score_text(text, cascade=False):
+    """enhanced_text_analysis as a dict; ``cascade`` skips the heavy metrics when quick stats are decisive"""
+    if cascade:
+        return cascade_text(text)
+    ai_prob, human_prob, insights = enhanced_text_analysis(text)
+    return {'ai_prob': ai_prob, 'human_prob': human_prob, 'insights': insights}
+
+
+def score_images(sources, method="heuristic", batch_size=None, scheduler=None):
+    """Score uploads (paths, file objects, raw bytes or images) with the heuristic, the CNN or both
+
+    The CNN path decodes each upload straight to model resolution; the
+    heuristic, the tiled CNN and the cascade (heuristic first, CNN only
+    when it is uncertain) need the full-resolution image. With a ``scheduler`` the
+    forward pass is queued on its shared inference thread instead of
+    running on the caller's thread.
+
+    Returns a list of {'ai_prob', 'real_prob'} dicts in input order.
+    """
+    if method not in IMAGE_METHODS:
+        raise ValueError(f"Unknown image method {method!r}, expected one of {IMAGE_METHODS}")
+    if TEXT_ONLY:
+        raise ValueError("Image scoring is disabled (DETECTOR_TEXT_ONLY=1)")
+    # Imported here so text-only callers never load PIL
+    from detector.image import analyze_image_characteristics, open_image
+    from detector.preprocess import prepare_image
+    if method == "cnn":
+        # Imported here so text-only callers never pay for loading torch
+        from detector.models import DEFAULT_BATCH_SIZE, detect_images
+        prepared = [prepare_image(source) for source in sources]
+        if scheduler is not None:
+            return scheduler.submit(prepared)
+        return detect_images(prepared, batch_size=batch_size or DEFAULT_BATCH_SIZE)
+    if method == "cascade":
+        return cascade_images(sources, batch_size=batch_size, scheduler=scheduler)
+    if method == "tiled":
+        from detector.tiling import DEFAULT_TILE_BATCH, score_tiled
+        return [score_tiled(source, batch_size=batch_size or DEFAULT_TILE_BATCH, scheduler=scheduler)
+                for source in sources]
+    results = []
+    for source in sources:
+        with stage("image.decode"):
+            image = open_image(source)
+        with stage("image.heuristic"):
+            ai_prob, real_prob = analyze_image_characteristics(image)
+        results.append({'ai_prob': ai_prob, 'real_prob': real_prob})
+    return results
+
+
+def score_image(source, method="heuristic"):
+    return score_images([source], method=method)[0]
+
+
+def json_default(value):
+    """json.dumps hook for the numpy scalars that appear in text insights"""
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def warm_up(cnn=True):
+    """Load the CNN ahead of the first request (used as a worker initializer)"""
+    if cnn:
+        from detector.models import get_registry
+        get_registry().get()
+
+
+_background_warm_up = None
+_background_lock = threading.Lock()
+
+
+def warm_up_in_background():
+    """Start loading the CNN on a daemon thread, once per process, and return immediately"""
+    global _background_warm_up
+    with _background_lock:
+        if _background_warm_up is None:
+            _background_warm_up = threading.Thread(target=warm_up, name="detector-warm-up", daemon=True)
+            _background_warm_up.start()
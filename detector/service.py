@@ -0,0 +1,392 @@
+"""Headless HTTP scoring service.
+
+A small asyncio HTTP/1.1 server with keep-alive that runs the detectors
+without Streamlit. Scoring runs in an executor so the event loop stays
+responsive; ``--workers`` selects a process pool of that size (0 runs
+scoring on threads inside the server process).
+
+    python -m detector.service --port 8080 --workers 4
+
+Endpoints (JSON in, JSON out):
+    GET  /healthz
+    GET  /metrics   Prometheus text format: per-stage and per-route latency
+    POST /v1/text   {"text": "...", "cascade": false}
+    POST /v1/image  {"image": "<base64>", "method": "heuristic" | "cnn" | "tiled" | "cascade"}
+                    or raw image bytes with ?method=...
+    POST /v1/batch  {"texts": [...], "images": ["<base64>", ...], "method": ..., "batch_size": ...,
+                     "text_cascade": false}
+    POST /v1/frames {"media": "<base64 GIF/WebP/video>", "method": "cnn" | "heuristic",
+                     "stride": 5, "scene_threshold": null, "early_exit": 0.9}
+                    or raw bytes with the options as query parameters
+
+With ``--workers 0`` CNN requests from all threads share one inference
+scheduler that micro-batches them; a full queue, or no result within
+DETECTOR_SCHEDULER_TIMEOUT, answers 503.
+
+``--text-only`` (or DETECTOR_TEXT_ONLY=1) serves /v1/text and text
+batches only, and never imports torch or PIL.
+"""
+import argparse
+import asyncio
+import base64
+import binascii
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+from detector.cache import cached_score_frames, cached_score_images, cached_score_text
+from detector.metrics import REGISTRY, run_traced
+from detector.scheduler import SchedulerBusy, get_scheduler
+from detector.scoring import IMAGE_METHODS, TEXT_ONLY, json_default, warm_up
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BODY_BYTES = 32 * 1024 * 1024
+DEFAULT_KEEPALIVE_TIMEOUT = 15.0
+MAX_HEADERS = 100
+JSON_CONTENT_TYPE = "application/json; charset=utf-8"
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+REGISTRY.describe("detector_requests_total", "counter", "HTTP requests by route and status")
+REGISTRY.describe("detector_request_seconds", "histogram", "HTTP request latency by route")
+REGISTRY.describe("detector_scheduler_queue_depth", "gauge", "Images waiting for the inference thread")
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class RawBody:
+    """A non-JSON response body"""
+
+    def __init__(self, content_type, data):
+        self.content_type = content_type
+        self.data = data
+
+
+class Request:
+    def __init__(self, method, target, headers, body, keep_alive):
+        url = urlsplit(target)
+        self.method = method
+        self.path = url.path
+        self.query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        self.headers = headers
+        self.body = body
+        self.keep_alive = keep_alive
+
+    def json(self):
+        try:
+            payload = json.loads(self.body or b"{}")
+        except ValueError:
+            raise HTTPError(400, "Request body is not valid JSON")
+        if not isinstance(payload, dict):
+            raise HTTPError(400, "Request body must be a JSON object")
+        return payload
+
+
+async def read_request(reader, max_body_bytes):
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, version = line.decode("latin-1").rstrip("\r\n").split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "Malformed request line")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        if len(headers) >= MAX_HEADERS:
+            raise HTTPError(431, "Too many headers")
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        raise HTTPError(411, "Chunked bodies are not supported, send Content-Length")
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise HTTPError(400, "Invalid Content-Length")
+    if length < 0:
+        raise HTTPError(400, "Invalid Content-Length")
+    if length > max_body_bytes:
+        raise HTTPError(413, f"Body exceeds {max_body_bytes} bytes")
+    body = await reader.readexactly(length) if length else b""
+
+    connection = headers.get("connection", "").lower()
+    if version == "HTTP/1.1":
+        keep_alive = connection != "close"
+    else:
+        keep_alive = connection == "keep-alive"
+    return Request(method.upper(), target, headers, body, keep_alive)
+
+
+def encode_response(status, payload, keep_alive, keepalive_timeout):
+    if isinstance(payload, RawBody):
+        content_type, body = payload.content_type, payload.data
+    else:
+        content_type = JSON_CONTENT_TYPE
+        body = json.dumps(payload, default=json_default, ensure_ascii=False).encode("utf-8")
+    headers = [
+        f"HTTP/1.1 {status} {HTTPStatus(status).phrase}",
+        f"Content-Type: {content_type}",
+        f"Content-Length: {len(body)}",
+    ]
+    if keep_alive:
+        headers.append("Connection: keep-alive")
+        headers.append(f"Keep-Alive: timeout={int(keepalive_timeout)}")
+    else:
+        headers.append("Connection: close")
+    return ("\r\n".join(headers) + "\r\n\r\n").encode("latin-1") + body
+
+
+def _decode_image(value):
+    if not isinstance(value, str):
+        raise HTTPError(400, "Images must be base64-encoded strings")
+    try:
+        return base64.b64decode(value, validate=True)
+    except (binascii.Error, ValueError):
+        raise HTTPError(400, "Image is not valid base64")
+
+
+def _frame_options(source):
+    """stride / scene_threshold / early_exit from a JSON payload or query string"""
+    options = {}
+    for name, convert, minimum in (("stride", int, 1), ("scene_threshold", float, 0), ("early_exit", float, 0.5)):
+        value = source.get(name)
+        if value is None:
+            continue
+        try:
+            value = convert(value)
+        except (TypeError, ValueError):
+            raise HTTPError(400, f"'{name}' must be a number")
+        if value < minimum or (name == "early_exit" and value > 1):
+            raise HTTPError(400, f"'{name}' is out of range")
+        options[name] = value
+    return options
+
+
+def _flag(payload, name):
+    value = payload.get(name, False)
+    if not isinstance(value, bool):
+        raise HTTPError(400, f"'{name}' must be true or false")
+    return value
+
+
+def _undecodable(exc):
+    """PIL's UnidentifiedImageError, checked without importing PIL into text-only servers"""
+    pil_image = sys.modules.get("PIL.Image")
+    return pil_image is not None and isinstance(exc, pil_image.UnidentifiedImageError)
+
+
+def _image_method(value):
+    method = value or "heuristic"
+    if method not in IMAGE_METHODS:
+        raise HTTPError(400, f"method must be one of {', '.join(IMAGE_METHODS)}")
+    return method
+
+
+class ScoringService:
+    def __init__(self, workers=0, max_body_bytes=DEFAULT_MAX_BODY_BYTES,
+                 keepalive_timeout=DEFAULT_KEEPALIVE_TIMEOUT, preload_cnn=True, text_only=TEXT_ONLY):
+        self.text_only = text_only
+        preload_cnn = preload_cnn and not text_only
+        if workers > 0:
+            self.executor = ProcessPoolExecutor(workers, initializer=warm_up, initargs=(preload_cnn,))
+            self.scheduler = None
+        else:
+            warm_up(preload_cnn)
+            self.executor = ThreadPoolExecutor(os.cpu_count() or 1)
+            # Threads share one model, so their forward passes are coalesced instead of competing
+            self.scheduler = None if text_only else get_scheduler()
+        self.max_body_bytes = max_body_bytes
+        self.keepalive_timeout = keepalive_timeout
+        self.routes = {
+            ("GET", "/healthz"): self.healthz,
+            ("GET", "/metrics"): self.metrics,
+            ("POST", "/v1/text"): self.text,
+            ("POST", "/v1/image"): self.image,
+            ("POST", "/v1/batch"): self.batch,
+            ("POST", "/v1/frames"): self.frames,
+        }
+        if text_only:
+            del self.routes[("POST", "/v1/image")], self.routes[("POST", "/v1/frames")]
+
+    async def _run(self, func, *args, **kwargs):
+        """Run func in the executor; stage timings come back with the result, even from worker processes"""
+        loop = asyncio.get_running_loop()
+        result, spans = await loop.run_in_executor(self.executor, partial(run_traced, func, *args, **kwargs))
+        REGISTRY.record_spans(spans)
+        return result
+
+    async def healthz(self, request):
+        return {'status': "ok"}
+
+    async def metrics(self, request):
+        if self.scheduler is not None:
+            REGISTRY.set_gauge("detector_scheduler_queue_depth", self.scheduler.stats()['queue_depth'])
+        return RawBody(PROMETHEUS_CONTENT_TYPE, REGISTRY.render().encode("utf-8"))
+
+    async def text(self, request):
+        payload = request.json()
+        text = payload.get("text")
+        if not isinstance(text, str) or not text.strip():
+            raise HTTPError(400, "'text' must be a non-empty string")
+        return await self._run(cached_score_text, text, cascade=_flag(payload, "cascade"))
+
+    async def image(self, request):
+        if request.headers.get("content-type", "").startswith("image/"):
+            blob, method = request.body, request.query.get("method")
+        else:
+            payload = request.json()
+            blob, method = _decode_image(payload.get("image")), payload.get("method")
+        if not blob:
+            raise HTTPError(400, "No image data")
+        results = await self._run(cached_score_images, [blob], method=_image_method(method), scheduler=self.scheduler)
+        return results[0]
+
+    async def frames(self, request):
+        if request.headers.get("content-type", "").startswith(("image/", "video/", "application/octet-stream")):
+            blob, options = request.body, request.query
+        else:
+            options = request.json()
+            blob = _decode_image(options.get("media"))
+        if not blob:
+            raise HTTPError(400, "No media data")
+        method = options.get("method") or "cnn"
+        from detector.frames import FRAME_METHODS
+        if method not in FRAME_METHODS:
+            raise HTTPError(400, f"method must be one of {', '.join(FRAME_METHODS)}")
+        return await self._run(cached_score_frames, blob, method=method, scheduler=self.scheduler,
+                               **_frame_options(options))
+
+    async def batch(self, request):
+        payload = request.json()
+        texts = payload.get("texts") or []
+        images = payload.get("images") or []
+        if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+            raise HTTPError(400, "'texts' must be a list of strings")
+        if not isinstance(images, list):
+            raise HTTPError(400, "'images' must be a list of base64 strings")
+        if images and self.text_only:
+            raise HTTPError(400, "This server scores text only")
+        blobs = [_decode_image(value) for value in images]
+        method = _image_method(payload.get("method"))
+        batch_size = payload.get("batch_size")
+        if batch_size is not None and (not isinstance(batch_size, int) or batch_size < 1):
+            raise HTTPError(400, "'batch_size' must be a positive integer")
+
+        cascade = _flag(payload, "text_cascade")
+        text_jobs = [self._run(cached_score_text, text, cascade=cascade) for text in texts]
+        image_job = self._run(cached_score_images, blobs, method=method, batch_size=batch_size,
+                              scheduler=self.scheduler) if blobs else None
+        text_results = await asyncio.gather(*text_jobs)
+        image_results = await image_job if image_job is not None else []
+        return {'texts': list(text_results), 'images': image_results}
+
+    async def dispatch(self, request):
+        handler = self.routes.get((request.method, request.path))
+        if handler is None:
+            if any(path == request.path for _, path in self.routes):
+                raise HTTPError(405, f"{request.method} not allowed on {request.path}")
+            raise HTTPError(404, f"No route for {request.path}")
+        return await handler(request)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(read_request(reader, self.max_body_bytes), self.keepalive_timeout)
+                except HTTPError as exc:
+                    # The rest of the stream cannot be trusted after a framing error
+                    writer.write(encode_response(exc.status, {'error': exc.message}, False, self.keepalive_timeout))
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+
+                start = time.perf_counter()
+                try:
+                    status, payload = 200, await self.dispatch(request)
+                except HTTPError as exc:
+                    status, payload = exc.status, {'error': exc.message}
+                except SchedulerBusy as exc:
+                    status, payload = 503, {'error': str(exc)}
+                except ValueError as exc:
+                    status, payload = 400, {'error': str(exc)}
+                except Exception as exc:
+                    if _undecodable(exc):
+                        status, payload = 400, {'error': "Could not decode image"}
+                    else:
+                        logger.exception("Scoring failed for %s %s", request.method, request.path)
+                        status, payload = 500, {'error': "Internal error"}
+                # Unknown paths share one label so scanners cannot grow the series count
+                route = request.path if any(path == request.path for _, path in self.routes) else "other"
+                REGISTRY.inc("detector_requests_total", (("route", route), ("status", str(status))))
+                REGISTRY.observe("detector_request_seconds", time.perf_counter() - start, (("route", route),))
+
+                writer.write(encode_response(status, payload, request.keep_alive, self.keepalive_timeout))
+                await writer.drain()
+                if not request.keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        logger.info("Serving on %s", ", ".join(str(sock.getsockname()) for sock in server.sockets))
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if self.scheduler is not None:
+            self.scheduler.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless AI content scoring service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="scoring processes (0 scores on threads inside the server process)")
+    parser.add_argument("--max-body-mb", type=float, default=DEFAULT_MAX_BODY_BYTES / 1024 ** 2)
+    parser.add_argument("--keepalive-timeout", type=float, default=DEFAULT_KEEPALIVE_TIMEOUT,
+                        help="seconds an idle keep-alive connection is held open")
+    parser.add_argument("--no-preload-cnn", action="store_true",
+                        help="load the CNN on first use instead of at worker start-up")
+    parser.add_argument("--text-only", action="store_true", default=TEXT_ONLY,
+                        help="serve text scoring only; torch and PIL are never imported")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    service = ScoringService(
+        workers=args.workers,
+        max_body_bytes=int(args.max_body_mb * 1024 ** 2),
+        keepalive_timeout=args.keepalive_timeout,
+        preload_cnn=not args.no_preload_cnn,
+        text_only=args.text_only,
+    )
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""Constant-memory text analysis for documents too long to hold in memory.
+
+StreamingTextAnalyzer consumes text chunk by chunk and keeps only running
+statistics: token counts and last positions (bounded by ``max_vocab``),
+sentence length moments and complexity sums, the script histogram,
+language pattern counts and, for every installed reference n-gram model,
+a running log-probability sum. ``finish()`` returns the same
+``(ai_prob, human_prob, insights)`` triple as ``enhanced_text_analysis``.
+
+Results match the whole-text analysis up to floating-point summation
+order, unless the vocabulary cap is hit or a single sentence/word runs
+past ``max_pending_chars``; both cases are reported in
+``insights['streaming']``.
+"""
+import codecs
+import math
+from collections import Counter, deque
+
+import numpy as np
+
+from detector.ngram import available_models
+from detector.text import (
+    LEXICON_MATCHER,
+    SCRIPT_TABLE_SIZE,
+    SENTENCE_SPLIT_RE,
+    enhanced_text_analysis,
+    score_text_metrics,
+    script_histogram,
+    scripts_from_histogram,
+)
+
+DEFAULT_CHUNK_CHARS = 1 << 16
+DEFAULT_MAX_VOCAB = 500_000
+DEFAULT_MAX_PENDING_CHARS = 1 << 20
+
+
+def iter_chunks(source, chunk_chars=DEFAULT_CHUNK_CHARS):
+    """Yield text chunks from a string, a (text or binary) file handle or an iterable of chunks"""
+    if isinstance(source, str):
+        for start in range(0, len(source), chunk_chars):
+            yield source[start:start + chunk_chars]
+        return
+    if hasattr(source, "read"):
+        handle = source
+        source = iter(lambda: handle.read(chunk_chars), handle.read(0))
+    decoder = None
+    for chunk in source:
+        if isinstance(chunk, (bytes, bytearray)):
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            chunk = decoder.decode(chunk)
+        if chunk:
+            yield chunk
+    if decoder is not None:
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+
+
+class StreamingTextAnalyzer:
+    def __init__(self, window_words=None, window_step=None, max_vocab=DEFAULT_MAX_VOCAB,
+                 max_pending_chars=DEFAULT_MAX_PENDING_CHARS):
+        self.window_words = window_words
+        self.window_step = window_step or (window_words // 2 if window_words else None) or 1
+        self.max_vocab = max_vocab
+        self.max_pending_chars = max_pending_chars
+
+        self.char_count = 0
+        self.chunk_count = 0
+        self.script_counts = np.zeros(SCRIPT_TABLE_SIZE + 1, dtype=np.int64)
+        self.pattern_counts = LEXICON_MATCHER.empty_counts()
+
+        # Token state for perplexity and burstiness
+        self.word_carry = ""
+        self.token_count = 0
+        self.word_freq = Counter()
+        self.word_positions = {}
+        self.burst_sum = 0.0
+        self.burst_count = 0
+        self.vocab_pruned = False
+
+        # The script is only known at the end, so every reference model scores the stream
+        self.reference_models = available_models()
+        self.reference_log10 = dict.fromkeys(self.reference_models, 0.0)
+        self.reference_context = max((model.order for model in self.reference_models.values()), default=1) - 1
+        self.reference_history = []
+
+        # Sentence state for length statistics and complexity
+        self.sentence_carry = ""
+        self.sentence_count = 0
+        self.length_mean = 0.0
+        self.length_m2 = 0.0
+        self.complexity_sum = 0.0
+        self.complexity_count = 0
+        self.forced_splits = 0
+
+        self.window = deque(maxlen=window_words) if window_words else None
+        self.words_since_window = 0
+
+    def feed(self, chunk):
+        """Consume one chunk of text; returns the window scores completed by it"""
+        self.char_count += len(chunk)
+        self.chunk_count += 1
+        self.script_counts += script_histogram(chunk)
+        windows = self._feed_words(chunk)
+        self._feed_sentences(chunk)
+        return windows
+
+    def _feed_words(self, chunk):
+        text = self.word_carry + chunk
+        words = text.split()
+        self.word_carry = ""
+        if words and not text[-1].isspace():
+            self.word_carry = words.pop()
+            if len(self.word_carry) > self.max_pending_chars:
+                words.append(self.word_carry)
+                self.word_carry = ""
+        return self._consume_words(words)
+
+    def _consume_words(self, words):
+        windows = []
+        tokens = []
+        for word in words:
+            token = word.lower()
+            tokens.append(token)
+            i = self.token_count
+            self.token_count += 1
+            self.word_freq[token] += 1
+            last_pos = self.word_positions.get(token)
+            if last_pos is not None:
+                self.burst_sum += 1.0 / (i - last_pos + 1)
+                self.burst_count += 1
+            self.word_positions[token] = i
+
+            if self.window is not None:
+                self.window.append(word)
+                self.words_since_window += 1
+                if len(self.window) == self.window_words and self.words_since_window >= self.window_step:
+                    windows.append(self._score_window())
+
+        if self.reference_models and tokens:
+            self._score_reference(tokens)
+        if self.max_vocab and len(self.word_freq) > self.max_vocab:
+            self._prune_vocab()
+        return windows
+
+    def _prune_vocab(self):
+        # Drop the rarest words down to 90% of the cap so pruning stays amortised
+        keep = int(self.max_vocab * 0.9)
+        for word, _ in self.word_freq.most_common()[keep:]:
+            del self.word_freq[word]
+            self.word_positions.pop(word, None)
+        self.vocab_pruned = True
+
+    def _score_reference(self, tokens):
+        # The last order - 1 tokens of the previous batch are carried as context only
+        history = self.reference_history
+        context = history + tokens
+        start = self.token_count - len(context)
+        positions = np.arange(start, start + len(context), dtype=np.int64)
+        for code, model in self.reference_models.items():
+            self.reference_log10[code] += float(model.log10_probs(context, positions)[len(history):].sum())
+        self.reference_history = context[max(len(context) - self.reference_context, 0):] if self.reference_context else []
+
+    def _score_window(self):
+        self.words_since_window = 0
+        ai_prob, human_prob, _ = enhanced_text_analysis(" ".join(self.window))
+        return {
+            'start_word': self.token_count - len(self.window),
+            'end_word': self.token_count,
+            'ai_prob': ai_prob,
+            'human_prob': human_prob,
+        }
+
+    def _feed_sentences(self, chunk):
+        text = self.sentence_carry + chunk
+        last_end = None
+        for match in SENTENCE_SPLIT_RE.finditer(text):
+            last_end = match.end()
+        if last_end is None:
+            if len(text) <= self.max_pending_chars:
+                self.sentence_carry = text
+                return
+            last_end = len(text)
+            self.forced_splits += 1
+        self._consume_sentences(text[:last_end])
+        self.sentence_carry = text[last_end:]
+
+    def _consume_sentences(self, text):
+        # Delimiters are not word characters, so lexicon boundaries behave as they would on the whole text
+        LEXICON_MATCHER.count(text, self.pattern_counts)
+
+        for sentence in SENTENCE_SPLIT_RE.split(text):
+            words = sentence.split()
+            if not words:
+                continue
+            word_count = len(words)
+            self.sentence_count += 1
+            delta = word_count - self.length_mean
+            self.length_mean += delta / self.sentence_count
+            self.length_m2 += delta * (word_count - self.length_mean)
+            if word_count >= 5:
+                avg_word_len = sum(map(len, words)) / word_count
+                self.complexity_sum += (len(set(words)) / word_count) * (avg_word_len / 5)
+                self.complexity_count += 1
+
+    def _perplexity(self, lang_code):
+        total_words = sum(self.word_freq.values()) if self.vocab_pruned else self.token_count
+        if self.token_count < 10:
+            return 100
+        if lang_code in self.reference_log10:
+            return 10 ** (-self.reference_log10[lang_code] / self.token_count)
+        log_sum = sum(count * math.log(count / total_words) for count in self.word_freq.values())
+        return math.exp(-log_sum / total_words)
+
+    def _burstiness(self):
+        if self.token_count < 20:
+            return 0.5
+        return self.burst_sum / self.burst_count if self.burst_count else 0.0
+
+    def _syntactic_complexity(self):
+        if self.sentence_count < 3:
+            return 0.5
+        return self.complexity_sum / self.complexity_count if self.complexity_count else 0.5
+
+    def finish(self):
+        """Flush buffered text and return (ai_prob, human_prob, insights, windows)"""
+        windows = []
+        if self.word_carry:
+            windows.extend(self._consume_words([self.word_carry]))
+            self.word_carry = ""
+        if self.sentence_carry:
+            self._consume_sentences(self.sentence_carry)
+            self.sentence_carry = ""
+        if self.window is not None and self.words_since_window:
+            windows.append(self._score_window())
+
+        script_info = scripts_from_histogram(self.script_counts)
+        ai_prob, human_prob, insights = score_text_metrics(
+            script_info=script_info,
+            char_count=self.char_count,
+            word_count=self.token_count,
+            sentence_count=self.sentence_count,
+            avg_sentence_length=self.length_mean if self.sentence_count else 0,
+            length_variance=self.length_m2 / self.sentence_count if self.sentence_count > 2 else None,
+            perplexity=self._perplexity(script_info['code']),
+            burstiness=self._burstiness(),
+            syntactic_complexity=self._syntactic_complexity(),
+            lang_patterns=dict(self.pattern_counts.get(script_info['code'], {})),
+        )
+        insights['streaming'] = {
+            'chunks': self.chunk_count,
+            'vocab_size': len(self.word_freq),
+            'vocab_pruned': self.vocab_pruned,
+            'forced_sentence_splits': self.forced_splits,
+        }
+        return ai_prob, human_prob, insights, windows
+
+
+def analyze_stream(source, chunk_chars=DEFAULT_CHUNK_CHARS, window_words=None, window_step=None,
+                   on_window=None, **kwargs):
+    """Streaming counterpart of enhanced_text_analysis
+
+    ``source`` may be a string, a file handle or any iterable of text chunks.
+    With ``window_words`` set, per-window scores are passed to ``on_window``
+    as they complete, or collected into ``insights['windows']`` when no
+    callback is given.
+    """
+    analyzer = StreamingTextAnalyzer(window_words=window_words, window_step=window_step, **kwargs)
+    collected = []
+    emit = on_window or collected.append
+    for chunk in iter_chunks(source, chunk_chars):
+        for window in analyzer.feed(chunk):
+            emit(window)
+    ai_prob, human_prob, insights, windows = analyzer.finish()
+    for window in windows:
+        emit(window)
+    if on_window is None and window_words:
+        insights['windows'] = collected
+    return ai_prob, human_prob, insights
@@ -0,0 +1,136 @@
+"""Tiled CNN inference on full-resolution images.
+
+Instead of squashing the whole image to 224x224, fixed-size patches are
+cropped from the full-resolution pixels and scored in batches. Only one
+batch of patch tensors exists at a time, so model-input memory depends on
+the batch size, not on the image size. Patch probabilities are averaged
+into the image score and kept as a coarse heatmap (one cell per patch).
+
+The decoded image itself is not bounded: PIL decodes JPEG and PNG whole,
+so the full-resolution pixels are held once (about 4 bytes per pixel for
+RGB, e.g. ~190 MB for a 48-megapixel photo) while the patches are cut.
+The upload stays in its own mode and each patch is converted to RGB on
+its own, so no second full-size RGB copy is made.
+
+Patches are visited in a fixed pseudo-random order that spreads early
+batches over the whole image, so ``early_stop`` can end the scan as soon
+as the running score is decisive.
+"""
+import io
+import os
+
+import numpy as np
+from PIL import Image
+
+from detector.metrics import stage
+from detector.preprocess import INPUT_SIZE, PreparedImage, prepare_image
+
+# Part of the tiled cache tag: bump when tiling or aggregation changes
+TILING_VERSION = "1"
+TILE_SIZE = INPUT_SIZE[0]
+DEFAULT_TILE_BATCH = 32
+DEFAULT_MIN_TILES = 8
+ORDER_SEED = 0
+# e.g. 0.9 stops once the running mean is >= 0.9 or <= 0.1; unset scans every patch
+DEFAULT_EARLY_STOP = float(os.environ["DETECTOR_TILE_EARLY_STOP"]) if os.environ.get("DETECTOR_TILE_EARLY_STOP") else None
+
+
+def tile_origins(length, tile, stride):
+    """Patch offsets along one axis; the last patch is aligned to the edge so every pixel is covered"""
+    if length <= tile:
+        return [0]
+    origins = list(range(0, length - tile + 1, stride))
+    if origins[-1] != length - tile:
+        origins.append(length - tile)
+    return origins
+
+
+def visit_order(count, seed=ORDER_SEED):
+    return np.random.default_rng(seed).permutation(count)
+
+
+def _decode_native(source):
+    """Decode an upload (path, file object, raw bytes or PIL image) in its own mode, without an RGB copy"""
+    if not isinstance(source, Image.Image):
+        source = Image.open(io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source)
+    source.load()
+    return source
+
+
+def _rgb(image):
+    return image if image.mode == "RGB" else image.convert("RGB")
+
+
+def _forward(patches, batch_size, scheduler):
+    if scheduler is not None:
+        return scheduler.submit(patches)
+    from detector.models import detect_images
+    return detect_images(patches, batch_size=batch_size)
+
+
+def score_tiled(source, tile=TILE_SIZE, stride=None, batch_size=DEFAULT_TILE_BATCH, early_stop=DEFAULT_EARLY_STOP,
+                min_tiles=DEFAULT_MIN_TILES, scheduler=None):
+    """Score an upload patch by patch at full resolution
+
+    Returns {'ai_prob', 'real_prob', 'tiles_scored', 'tiles_total',
+    'early_stopped', 'grid', 'heatmap'}; heatmap rows hold each patch's
+    ai_prob, or None for patches skipped by early stopping. Images smaller
+    than one patch fall back to the whole-image CNN path. The whole image
+    is decoded up front (see the module docstring).
+    """
+    stride = stride or tile
+    with stage("image.decode"):
+        image = _decode_native(source)
+    width, height = image.size
+
+    if width < tile or height < tile:
+        result = _forward([prepare_image(_rgb(image))], batch_size, scheduler)[0]
+        return dict(result, tiles_scored=1, tiles_total=1, early_stopped=False, grid=[1, 1],
+                    heatmap=[[result['ai_prob']]])
+
+    xs, ys = tile_origins(width, tile, stride), tile_origins(height, tile, stride)
+    rows, cols = len(ys), len(xs)
+    heatmap = np.full((rows, cols), np.nan)
+    order = visit_order(rows * cols)
+    scored, early_stopped = 0, False
+
+    for start in range(0, len(order), batch_size):
+        cells = order[start:start + batch_size]
+        with stage("tiling.crop"):
+            patches = []
+            for cell in cells:
+                x, y = xs[cell % cols], ys[cell // cols]
+                patches.append(PreparedImage((tile, tile), None, _rgb(image.crop((x, y, x + tile, y + tile)))))
+        for cell, result in zip(cells, _forward(patches, batch_size, scheduler)):
+            heatmap[cell // cols, cell % cols] = result['ai_prob']
+        scored += len(cells)
+        del patches
+
+        if early_stop is not None and scored >= min_tiles and scored < len(order):
+            running = np.nanmean(heatmap)
+            if running >= early_stop or running <= 1 - early_stop:
+                early_stopped = True
+                break
+
+    ai_prob = float(np.nanmean(heatmap))
+    return {
+        'ai_prob': ai_prob,
+        'real_prob': 1 - ai_prob,
+        'tiles_scored': scored,
+        'tiles_total': rows * cols,
+        'early_stopped': early_stopped,
+        'grid': [rows, cols],
+        'heatmap': [[None if np.isnan(value) else float(value) for value in row] for row in heatmap],
+    }
+
+
+def heatmap_image(heatmap, size):
+    """RGB PIL image of a heatmap (red = AI-like, green = real-like, grey = not scored) scaled to ``size``"""
+    values = np.array([[np.nan if value is None else value for value in row] for row in heatmap], dtype=np.float64)
+    scored = ~np.isnan(values)
+    filled = np.where(scored, values, 0.5)
+    pixels = np.empty(values.shape + (3,), dtype=np.uint8)
+    pixels[..., 0] = np.where(scored, filled * 255, 128)
+    pixels[..., 1] = np.where(scored, (1 - filled) * 255, 128)
+    pixels[..., 2] = np.where(scored, 40, 128)
+    return Image.fromarray(pixels).resize(size, Image.NEAREST)
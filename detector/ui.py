@@ -0,0 +1,198 @@
+"""Static tables for the Streamlit app: page CSS and UI translations.
+
+Streamlit re-executes app.py on every rerun, but modules it imports are
+loaded once per process, so these are built once rather than on every
+interaction.
+"""
+
+# Custom CSS for better UI with translation button
+CSS = """
+<style>
+    .main-header {
+        text-align: center;
+        padding: 2rem 0;
+        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+        color: white;
+        border-radius: 15px;
+        margin-bottom: 2rem;
+    }
+    .section-container {
+        background: white;
+        padding: 2rem;
+        border-radius: 15px;
+        box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
+        margin: 1rem 0;
+        border-left: 5px solid;
+    }
+    .image-section {
+        border-left-color: #667eea;
+    }
+    .text-section {
+        border-left-color: #f5576c;
+    }
+    .result-box {
+        background: #f8f9fa;
+        padding: 1.5rem;
+        border-radius: 10px;
+        margin: 1rem 0;
+        border-left: 4px solid;
+    }
+    .ai-result {
+        border-left-color: #dc3545;
+        background: linear-gradient(135deg, #ffe6e6 0%, #ffcccc 100%);
+    }
+    .human-result {
+        border-left-color: #28a745;
+        background: linear-gradient(135deg, #e6ffe6 0%, #ccffcc 100%);
+    }
+    .uncertain-result {
+        border-left-color: #ffc107;
+        background: linear-gradient(135deg, #fff3cd 0%, #ffeaa7 100%);
+    }
+    .insight-box {
+        background: #e9ecef;
+        padding: 1rem;
+        border-radius: 8px;
+        margin: 0.5rem 0;
+        border-left: 3px solid #6c757d;
+    }
+    .metric-card {
+        background: white;
+        padding: 1rem;
+        border-radius: 10px;
+        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+        text-align: center;
+        margin: 0.5rem;
+    }
+    .sentence-highlights {
+        line-height: 1.8;
+        white-space: pre-wrap;
+    }
+    .language-selector {
+        background: linear-gradient(135deg, #ff7e5f 0%, #feb47b 100%);
+        padding: 1rem;
+        border-radius: 10px;
+        color: white;
+        margin-bottom: 1rem;
+    }
+</style>
+"""
+
+# Translation dictionary for UI elements
+TRANSLATIONS = {
+    "en": {
+        "title": "🤖 AI Content Detector",
+        "subtitle": "Advanced detection for AI-generated images and text",
+        "image_tab": "🖼 Image Detection",
+        "text_tab": "📝 Multi-Lingual Text Detection",
+        "image_header": "AI-Generated Image Detection",
+        "image_desc": "Upload an image to detect if it's AI-generated",
+        "upload_label": "Choose an image, animated GIF/WebP or video file",
+        "analyze_image": "Analyze Image",
+        "analyze_text": "Analyze Text",
+        "real_photo": "Real Photo Probability",
+        "ai_generated": "AI-Generated Probability",
+        "confidence": "Confidence",
+        "high_confidence_human": "HIGH CONFIDENCE - HUMAN WRITTEN",
+        "high_confidence_ai": "HIGH CONFIDENCE - AI GENERATED",
+        "likely_human": "LIKELY HUMAN WRITTEN",
+        "likely_ai": "LIKELY AI GENERATED",
+        "detailed_analysis": "Detailed Analysis",
+        "method": "Method",
+        "image_size": "Image Size",
+        "aspect_ratio": "Aspect Ratio",
+        "analysis": "Analysis",
+        "text_placeholder": "Paste your text in any Indian language...",
+        "supported_languages": "Supported Languages",
+        "detected_language": "Detected Language",
+        "human_written": "Human-Written",
+        "advanced_metrics": "Advanced Text Metrics",
+        "perplexity": "Perplexity",
+        "burstiness": "Burstiness",
+        "complexity": "Complexity",
+        "ai_indicators": "AI Indicators Found",
+        "human_indicators": "Human Indicators Found",
+        "language_analysis": "Language-Specific Analysis",
+        "no_ai_indicators": "No strong AI indicators detected",
+        "limited_human_patterns": "Limited human writing patterns",
+        "language_patterns": "Language Patterns Detected",
+        "text_statistics": "Text Statistics",
+        "characters": "Characters",
+        "words": "Words",
+        "sentences": "Sentences",
+        "avg_sentence_length": "Avg. Sentence Length",
+        "heuristic_analysis": "Heuristic Analysis",
+        "deep_learning": "Deep Learning Analysis",
+        "tiled_analysis": "Deep Learning - Full Resolution Tiles",
+        "cascade_analysis": "Cascade - Heuristic First, CNN When Uncertain",
+        "text_cascade": "Quick mode: skip the heavy metrics when the quick statistics are decisive",
+        "text_incremental": "Live mode: re-analyse only the sentences changed since the last run",
+        "sentence_highlights": "Sentence Highlights",
+        "near_duplicate": "Near-duplicate of an earlier submission - its stored verdict is shown",
+        "upload_prompt": "👆 Upload an image to analyze",
+        "enter_text_prompt": "👆 Enter text above to analyze",
+        "footer": "Advanced AI Content Detector | Multi-Lingual Support • 22+ Indian Languages",
+        "select_language": "Select Language",
+        "language": "Language",
+        "performance": "Performance",
+        "show_performance": "Show performance breakdown"
+    },
+    "hi": {
+        "title": "🤖 एआई कंटेंट डिटेक्टर",
+        "subtitle": "एआई-जनित छवियों और पाठ के लिए उन्नत पहचान",
+        "image_tab": "🖼 छवि पहचान",
+        "text_tab": "📝 बहुभाषी पाठ पहचान",
+        "image_header": "एआई-जनित छवि पहचान",
+        "image_desc": "एआई-जनित है या नहीं जांचने के लिए छवि अपलोड करें",
+        "upload_label": "छवि, एनिमेटेड GIF/WebP या वीडियो फ़ाइल चुनें",
+        "analyze_image": "छवि विश्लेषण करें",
+        "analyze_text": "पाठ विश्लेषण करें",
+        "real_photo": "वास्तविक फोटो संभावना",
+        "ai_generated": "एआई-जनित संभावना",
+        "confidence": "विश्वसनीयता",
+        "high_confidence_human": "उच्च विश्वास - मानव लिखित",
+        "high_confidence_ai": "उच्च विश्वास - एआई जनित",
+        "likely_human": "संभावित मानव लिखित",
+        "likely_ai": "संभावित एआई जनित",
+        "detailed_analysis": "विस्तृत विश्लेषण",
+        "method": "विधि",
+        "image_size": "छवि आकार",
+        "aspect_ratio": "पहलू अनुपात",
+        "analysis": "विश्लेषण",
+        "text_placeholder": "किसी भी भारतीय भाषा में पाठ चिपकाएँ...",
+        "supported_languages": "समर्थित भाषाएँ",
+        "detected_language": "पहचानी गई भाषा",
+        "human_written": "मानव-लिखित",
+        "advanced_metrics": "उन्नत पाठ मेट्रिक्स",
+        "perplexity": "पेरप्लेक्सिटी",
+        "burstiness": "बर्स्टिनेस",
+        "complexity": "जटिलता",
+        "ai_indicators": "एआई संकेतक मिले",
+        "human_indicators": "मानव संकेतक मिले",
+        "language_analysis": "भाषा-विशिष्ट विश्लेषण",
+        "no_ai_indicators": "कोई मजबूत एआई संकेतक नहीं मिले",
+        "limited_human_patterns": "सीमित मानव लेखन पैटर्न",
+        "language_patterns": "भाषा पैटर्न मिले",
+        "text_statistics": "पाठ आंकड़े",
+        "characters": "वर्ण",
+        "words": "शब्द",
+        "sentences": "वाक्य",
+        "avg_sentence_length": "औसत वाक्य लंबाई",
+        "heuristic_analysis": "ह्युरिस्टिक विश्लेषण",
+        "deep_learning": "डीप लर्निंग विश्लेषण",
+        "tiled_analysis": "डीप लर्निंग - पूर्ण रिज़ॉल्यूशन टाइल्स",
+        "cascade_analysis": "कैस्केड - पहले ह्युरिस्टिक, अनिश्चित होने पर CNN",
+        "text_cascade": "त्वरित मोड: त्वरित आँकड़े निर्णायक हों तो भारी मेट्रिक्स छोड़ें",
+        "text_incremental": "लाइव मोड: पिछली बार से बदले वाक्यों का ही पुनः विश्लेषण करें",
+        "sentence_highlights": "वाक्य हाइलाइट",
+        "near_duplicate": "पहले जमा की गई सामग्री से लगभग समान - उसका सहेजा गया परिणाम दिखाया गया है",
+        "upload_prompt": "👆 विश्लेषण करने के लिए छवि अपलोड करें",
+        "enter_text_prompt": "👆 विश्लेषण करने के लिए पाठ दर्ज करें",
+        "footer": "उन्नत एआई कंटेंट डिटेक्टर | बहुभाषी समर्थन • 22+ भारतीय भाषाएँ",
+        "select_language": "भाषा चुनें",
+        "language": "भाषा",
+        "performance": "प्रदर्शन",
+        "show_performance": "प्रदर्शन विवरण दिखाएँ"
+    }
+}
+
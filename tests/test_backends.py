@@ -0,0 +1,30 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from detector.backends import BACKENDS, DEFAULT_TOLERANCE, calibration_batches, unavailable_reason  # noqa: E402
+from detector.models import ModelRegistry  # noqa: E402
+from detector.preprocess import INPUT_SIZE  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def registry():
+    return ModelRegistry()
+
+
+@pytest.fixture(scope="module")
+def batch():
+    # Noise plus gradients and flat colours, like the int8 calibration data but from another seed
+    return torch.cat([torch.rand(4, 3, *INPUT_SIZE, generator=torch.Generator().manual_seed(1)),
+                      list(calibration_batches(INPUT_SIZE, batches=2, batch_size=4, seed=1))[1]])
+
+
+@pytest.mark.parametrize("backend", [backend for backend in BACKENDS if backend != "eager"])
+def test_backend_matches_eager_fp32(registry, batch, backend):
+    reason = unavailable_reason(backend)
+    if reason is not None:
+        pytest.skip(reason)
+    reference = registry.get(backend="eager").forward(batch)
+    probabilities = registry.get(backend=backend).forward(batch)
+    assert probabilities.shape == reference.shape
+    assert (probabilities - reference).abs().max().item() <= DEFAULT_TOLERANCE
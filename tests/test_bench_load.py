@@ -0,0 +1,61 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from benchmarks.bench_load import _format, max_concurrency_within, run_level
+
+SLOW_SECONDS = 0.6
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        if self.path == "/slow":
+            time.sleep(SLOW_SECONDS)
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server.server_address
+    server.shutdown()
+
+
+def test_requests_finishing_after_the_window_are_counted(server):
+    host, port = server
+    payloads = {'text': [("/fast", b"x", "text/plain")], 'tiled': [("/slow", b"x", "image/jpeg")]}
+    # Each slow request outlasts the whole window; the second round of them starts inside it
+    level = run_level(host, port, payloads, {'tiled': 1}, 2, duration=0.3, warmup=0.5)
+    assert level['requests'] >= 1 and level['errors'] == 0
+    assert level['p99_ms'] >= SLOW_SECONDS * 1000 * 0.9
+    mixed = run_level(host, port, payloads, {'text': 1, 'tiled': 1}, 2, duration=1.0, warmup=0.1)
+    assert mixed['by_kind']['tiled']['requests'] >= 1
+    assert mixed['p99_ms'] >= SLOW_SECONDS * 1000 * 0.9
+
+
+def level(concurrency, p99_ms, requests=10, errors=0):
+    return {'concurrency': concurrency, 'p99_ms': p99_ms, 'requests': requests, 'errors': errors}
+
+
+def test_slo_needs_every_level_up_to_the_answer():
+    assert max_concurrency_within([level(1, 100), level(2, 200), level(4, 900)], 500) == 2
+    assert max_concurrency_within([level(1, None, requests=0), level(2, 100), level(4, 100)], 500) is None
+    assert max_concurrency_within([level(1, 100), level(2, 100, errors=1), level(4, 100)], 500) == 1
+
+
+def test_missing_values_keep_the_column_width():
+    assert _format(None, "9.1f") == _format(1.0, "9.1f").replace("1.0", "  -") == "        -"
+    assert _format(None, ".1f") == "-"
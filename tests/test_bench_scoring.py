@@ -0,0 +1,30 @@
+import subprocess
+import sys
+
+SCRIPT = """
+import io, sys
+from benchmarks.bench_scoring import run_benchmarks
+results = run_benchmarks(quick=True, name_filter=sys.argv[1], log=io.StringIO())
+models = sys.modules.get('detector.models')
+print(len(results), 'torch' in sys.modules, len(models.get_registry().stats()) if models else 0)
+"""
+
+
+def run(name_filter):
+    output = subprocess.run([sys.executable, "-c", SCRIPT, name_filter], check=True, capture_output=True, text=True)
+    return output.stdout.split()
+
+
+def test_text_filter_loads_no_model():
+    count, torch_loaded, models_loaded = run("burstiness")
+    assert int(count) > 0 and torch_loaded == "False" and models_loaded == "0"
+
+
+def test_prepare_image_filter_loads_no_model():
+    count, _, models_loaded = run("prepare_image")
+    assert int(count) > 0 and models_loaded == "0"
+
+
+def test_model_cases_load_the_model():
+    count, _, models_loaded = run("cnn_forward")
+    assert count == models_loaded == "1"
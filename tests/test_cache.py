@@ -0,0 +1,87 @@
+import time
+
+import numpy as np
+import pytest
+
+from detector import cache as cache_module
+from detector.cache import ResultCache, content_key, result_generation, result_tag
+from detector.neardup import NearDuplicateIndex
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(path=str(tmp_path / "results.sqlite3"))
+
+
+def store(cache, method, tag, text):
+    key = content_key(text, tag)
+    cache.put(key, {'text': text}, method, tag)
+    cache.add_signature(NearDuplicateIndex("text"), key, np.arange(64, dtype=np.uint64), method, tag)
+    return key
+
+
+def disk_keys(cache, table="results"):
+    return {row[0] for row in cache._db().execute(f"SELECT key FROM {table}")}
+
+
+def test_other_settings_keep_their_rows(cache, tmp_path):
+    cache.check_tag("cnn", "cnn:model-eager", "gen1")
+    eager = store(cache, "cnn", "cnn:model-eager", "a")
+    # A second process on the same file with another backend
+    other = ResultCache(path=cache.path)
+    other.check_tag("cnn", "cnn:model-int8", "gen1")
+    int8 = store(other, "cnn", "cnn:model-int8", "a")
+    cache._checked_tags.clear()
+    cache.check_tag("cnn", "cnn:model-eager", "gen1")
+    assert disk_keys(cache) == disk_keys(cache, "signatures") == {eager, int8}
+    assert cache.get(eager) == other.get(int8) == {'text': 'a'}
+
+
+def test_stale_generation_is_purged(cache):
+    cache.check_tag("cnn", "cnn:old", "gen1")
+    old = store(cache, "cnn", "cnn:old", "a")
+    text = store(cache, "text", "text:1", "a")
+    cache._db().execute("INSERT INTO results VALUES ('cnn:legacy:x', 'cnn', 'cnn:legacy', '{}', 0)")
+    cache.check_tag("cnn", "cnn:new", "gen2")
+    new = store(cache, "cnn", "cnn:new", "a")
+    assert disk_keys(cache) == {text, new}
+    assert disk_keys(cache, "signatures") == {text, new}
+    assert cache.get(old) is None
+    assert cache.stats()['invalidated'] == 2
+
+
+def test_prune_drops_oldest_rows_and_their_signatures(tmp_path):
+    cache = ResultCache(path=str(tmp_path / "results.sqlite3"), max_rows=5, max_age_days=0)
+    keys = [store(cache, "text", "text:1", str(i)) for i in range(8)]
+    assert cache.prune() == 3
+    assert disk_keys(cache) == disk_keys(cache, "signatures") == set(keys[3:])
+    assert cache.prune() == 0
+
+
+def test_prune_drops_rows_past_max_age(tmp_path):
+    cache = ResultCache(path=str(tmp_path / "results.sqlite3"), max_rows=0, max_age_days=1)
+    old, new = store(cache, "text", "text:1", "old"), store(cache, "text", "text:1", "new")
+    with cache._db() as conn:
+        conn.execute("UPDATE results SET created = ? WHERE key = ?", (time.time() - 2 * 86400, old))
+    assert cache.prune() == 1
+    assert disk_keys(cache) == {new}
+
+
+def test_stores_prune_periodically(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_module, "PRUNE_EVERY", 4)
+    cache = ResultCache(path=str(tmp_path / "results.sqlite3"), max_rows=2, max_age_days=0)
+    for i in range(7):
+        store(cache, "text", "text:1", str(i))
+    assert len(disk_keys(cache)) == 5
+    store(cache, "text", "text:1", "7")
+    assert len(disk_keys(cache)) == 2
+    assert cache.stats()['pruned'] == 6
+
+
+def test_generation_leaves_out_settings(monkeypatch):
+    tag, generation = result_tag("text-cascade"), result_generation("text-cascade")
+    monkeypatch.setattr(cache_module, "DEFAULT_TEXT_BAND", 0.123)
+    assert result_tag("text-cascade") != tag
+    assert result_generation("text-cascade") == generation
+    monkeypatch.setattr(cache_module, "TEXT_ANALYSIS_VERSION", "test")
+    assert result_generation("text-cascade") != generation
@@ -0,0 +1,103 @@
+import random
+
+import numpy as np
+import pytest
+
+from detector import ngram
+from detector.cascade import neutral_perplexity
+from detector.corpus import FEATURE_NAMES, corpus_features, score_corpus
+from detector.text import (PERPLEXITY_THRESHOLDS, analyze_burstiness, analyze_scripts, analyze_syntactic_complexity,
+                           calculate_perplexity, enhanced_text_analysis, perplexity_thresholds, reference_perplexity)
+
+WORDS = {
+    'hi': "यह एक छोटा परीक्षण है और इसमें कुछ शब्द हैं मैं कल बाज़ार गया था लेकिन दुकान बंद थी".split(),
+    'en': "this is a plain sentence with several words however it is important to note that".split(),
+}
+PUNCTUATION = [".", "!", "?", "।"]
+
+
+def texts(seed=0):
+    """Documents of varied length, including the short ones that hit each metric's default"""
+    rng = random.Random(seed)
+    documents = ["", "एक", "one two three four five six seven eight nine ten"]
+    for _ in range(40):
+        words = WORDS[rng.choice(list(WORDS))]
+        sentences = [" ".join(rng.choice(words) for _ in range(rng.randint(2, 14))) + rng.choice(PUNCTUATION)
+                     for _ in range(rng.randint(1, 12))]
+        documents.append(" ".join(sentences))
+    return documents
+
+
+@pytest.fixture
+def ngram_dir(tmp_path, monkeypatch):
+    """A Hindi reference model in a temporary DETECTOR_NGRAM_DIR"""
+    monkeypatch.setattr(ngram, "NGRAM_DIR", str(tmp_path))
+    monkeypatch.setattr(ngram, "_models", {})
+    tables, unk_log10 = ngram.build_tables([ngram.tokenize(text) for text in texts(seed=1)], order=3)
+    held_out = [ngram.tokenize(text) for text in texts(seed=2)]
+    ngram.write_model(tables, unk_log10, ngram.model_path("hi"), ngram.calibrate(tables, unk_log10, held_out))
+    return tmp_path
+
+
+def assert_matches_scalar(documents, perplexity):
+    features = corpus_features(documents)
+    np.testing.assert_allclose(features[:, FEATURE_NAMES.index("perplexity")],
+                               [perplexity(text) for text in documents], rtol=1e-9)
+    np.testing.assert_allclose(features[:, FEATURE_NAMES.index("burstiness")],
+                               [analyze_burstiness(text) for text in documents], rtol=1e-9)
+    np.testing.assert_allclose(features[:, FEATURE_NAMES.index("syntactic_complexity")],
+                               [analyze_syntactic_complexity(text) for text in documents], rtol=1e-9)
+    scores = score_corpus(documents)
+    expected = [enhanced_text_analysis(text) for text in documents]
+    np.testing.assert_allclose(scores['ai_prob'], [ai_prob for ai_prob, _, _ in expected], rtol=1e-9)
+
+
+def test_features_match_scalar_functions():
+    assert_matches_scalar(texts(), calculate_perplexity)
+
+
+def test_features_match_scalar_functions_with_reference_model(ngram_dir):
+    documents = texts()
+    assert ngram.get_model("hi") is not None
+    assert_matches_scalar(documents, lambda text: reference_perplexity(text, analyze_scripts(text)['code']))
+    # The model must actually be used for the Hindi documents
+    hindi = [text for text in documents if analyze_scripts(text)['code'] == "hi" and len(text.split()) >= 10]
+    assert hindi and any(reference_perplexity(text, "hi") != calculate_perplexity(text) for text in hindi)
+
+
+def test_reference_thresholds_are_held_out_quantiles(ngram_dir):
+    model = ngram.get_model("hi")
+    held_out = [tokens for tokens in map(ngram.tokenize, texts(seed=2)) if len(tokens) >= ngram.MIN_SCORED_TOKENS]
+    # Calibrated on the unquantized tables, so only close to the stored model's quantiles
+    expected = np.quantile([model.perplexity(tokens) for tokens in held_out], ngram.CALIBRATION_QUANTILES)
+    np.testing.assert_allclose(model.perplexity_thresholds, expected, rtol=0.01)
+    assert perplexity_thresholds("hi", 10) == model.perplexity_thresholds
+    # Too short for the model, or no model: the self-unigram thresholds
+    assert perplexity_thresholds("hi", 9) == PERPLEXITY_THRESHOLDS
+    assert perplexity_thresholds("en", 50) == PERPLEXITY_THRESHOLDS
+    low, high = model.perplexity_thresholds
+    assert low < neutral_perplexity("hi", 50) < high
+
+
+def test_reference_perplexity_is_scored_against_model_thresholds(ngram_dir):
+    low, high = ngram.get_model("hi").perplexity_thresholds
+    hindi = [text for text in texts(seed=3) if analyze_scripts(text)['code'] == "hi" and len(text.split()) >= 10]
+    flags = []
+    for text in hindi:
+        _, _, insights = enhanced_text_analysis(text)
+        perplexity = insights['advanced_metrics']['perplexity']
+        flags.append((perplexity < low, perplexity > high))
+        assert flags[-1] == ("Low perplexity (predictable word patterns)" in insights['ai_indicators'],
+                             "High perplexity (creative word usage)" in insights['human_indicators'])
+    # Texts like the held-out ones fall on both sides of and between the thresholds
+    assert {(True, False), (False, False), (False, True)} <= set(flags)
+
+
+def test_uncalibrated_model_is_not_used(ngram_dir):
+    tables, unk_log10 = ngram.build_tables([ngram.tokenize(text) for text in texts(seed=1)], order=3)
+    ngram.write_model(tables, unk_log10, ngram.model_path("hi"))
+    ngram._models.clear()
+    assert ngram.calibrate(tables, unk_log10, [["एक"] * 20] * (ngram.MIN_CALIBRATION_DOCUMENTS - 1)) is None
+    assert ngram.get_model("hi") is None and ngram.models_fingerprint() == "none"
+    text = next(text for text in texts() if analyze_scripts(text)['code'] == "hi" and len(text.split()) >= 10)
+    assert reference_perplexity(text, "hi") == calculate_perplexity(text)
@@ -0,0 +1,38 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image, UnidentifiedImageError
+
+from detector.frames import is_clip, score_frames
+from detector.preprocess import prepare_image
+
+
+def encoded(frames, format):
+    images = [Image.fromarray(np.full((32, 32, 3), 40 * i, dtype=np.uint8)) for i in range(frames)]
+    buffer = io.BytesIO()
+    images[0].save(buffer, format=format, save_all=frames > 1, append_images=images[1:], duration=100)
+    return buffer.getvalue()
+
+
+def test_animated_images_are_clips():
+    assert is_clip(encoded(3, "GIF"), "animation.gif")
+    assert not is_clip(encoded(1, "GIF"), "still.gif")
+    assert not is_clip(encoded(1, "PNG"), "still.png")
+
+
+def test_video_extensions_are_clips():
+    assert is_clip(b"not decoded", "clip.MP4")
+
+
+@pytest.mark.parametrize("data", [b"", b"garbage", encoded(1, "PNG")[:40]])
+def test_unidentifiable_uploads_fail_as_images(data):
+    assert not is_clip(data, "upload.png")
+    with pytest.raises(UnidentifiedImageError):
+        prepare_image(data)
+
+
+def test_heuristic_scores_every_frame():
+    result = score_frames(encoded(6, "GIF"), method="heuristic", stride=2, early_exit=None)
+    assert [frame['index'] for frame in result['frames']] == [0, 2, 4]
+    assert result['frames_decoded'] == 6
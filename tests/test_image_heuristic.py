@@ -0,0 +1,72 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from detector.image import analyze_image_characteristics, channel_std
+
+MODES = ("RGB", "L", "RGBA", "P", "LA")
+SIZES = ((64, 48), (512, 512), (1024, 576), (333, 200))
+
+
+def array_analysis(image):
+    """analyze_image_characteristics as it was before channel_std, on the full pixel array"""
+    width, height = image.size
+    img_array = np.array(image)
+    ai_score = real_score = 0.5
+    ratio = width / height
+    if any(abs(ratio - r) < 0.02 for r in [1.0, 1.33, 1.5, 1.77, 0.75, 0.67]): ai_score += 0.2
+    if (width, height) in [(512, 512), (1024, 1024), (768, 768), (1024, 576), (576, 1024)]: ai_score += 0.3
+    if len(img_array.shape) == 3:
+        avg_color_std = np.mean(np.std(img_array, axis=(0, 1)))
+        if avg_color_std < 40: ai_score += 0.1
+        else: real_score += 0.1
+    if hasattr(image, 'format') and image.format in ['JPEG', 'PNG']: real_score += 0.1
+    total = ai_score + real_score
+    return ai_score / total, real_score / total
+
+
+def samples(width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    gradient = np.linspace(0, 255, width)[None, :, None]
+    return {
+        'flat': np.full((height, width, 3), 128, dtype=np.uint8),
+        'noise': rng.integers(0, 256, (height, width, 3), dtype=np.uint8),
+        'gradient': np.broadcast_to(gradient, (height, width, 3)).astype(np.uint8),
+        'low_contrast': rng.normal(120, 20, (height, width, 3)).clip(0, 255).astype(np.uint8),
+        'near_threshold': rng.normal(128, 40, (height, width, 3)).clip(0, 255).astype(np.uint8),
+    }
+
+
+def cases():
+    return [pytest.param(pixels, mode, id=f"{name}-{mode}-{width}x{height}")
+            for width, height in SIZES for name, pixels in samples(width, height).items() for mode in MODES]
+
+
+@pytest.mark.parametrize("pixels,mode", cases())
+def test_channel_std_matches_array_std(pixels, mode):
+    image = Image.fromarray(pixels).convert(mode)
+    array = np.array(image)
+    actual = channel_std(image)
+    if array.ndim == 2:
+        # Single-band images (L, P) were skipped by the array version
+        assert actual is None
+    else:
+        np.testing.assert_allclose(actual, np.std(array, axis=(0, 1)), atol=1e-6)
+
+
+@pytest.mark.parametrize("pixels,mode", cases())
+def test_decisions_match_array_version(pixels, mode):
+    image = Image.fromarray(pixels).convert(mode)
+    assert analyze_image_characteristics(image) == pytest.approx(array_analysis(image), abs=1e-12)
+
+
+@pytest.mark.parametrize("format", ["PNG", "JPEG"])
+def test_decoded_uploads_match_array_version(format):
+    for name, pixels in samples(512, 512, seed=1).items():
+        buffer = io.BytesIO()
+        Image.fromarray(pixels).save(buffer, format=format)
+        image = Image.open(io.BytesIO(buffer.getvalue()))
+        image.load()
+        assert analyze_image_characteristics(image) == pytest.approx(array_analysis(image), abs=1e-12), name
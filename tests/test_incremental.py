@@ -0,0 +1,118 @@
+import math
+import random
+
+import numpy as np
+import pytest
+
+from detector import ngram
+from detector.incremental import IncrementalTextAnalyzer, repeat_gaps, split_segments
+from detector.text import enhanced_text_analysis
+
+SENTENCES = [
+    "यह एक छोटा परीक्षण है और इसमें कुछ शब्द हैं। ",
+    "मैं कल बाज़ार गया था लेकिन दुकान बंद थी! ",
+    "This is a plain English sentence with several words. ",
+    "However, it is important to note that results vary? ",
+    "Really. ",
+    "আমি আজ স্কুলে যাব এবং বন্ধুদের সাথে দেখা করব। ",
+    "Short one!! ",
+]
+INSERTS = [" ", ". ", "! ", "word ", "है। ", "\n", "x", "?? ", "important to note ", "अलग "]
+
+
+def close(incremental, full):
+    """Equal results, comparing floats with a tolerance (perplexity is summed in another order)"""
+    if isinstance(full, dict):
+        assert set(incremental) - {'incremental'} == set(full)
+        return all(close(incremental[key], full[key]) for key in full)
+    if isinstance(full, (list, tuple)):
+        return len(incremental) == len(full) and all(close(a, b) for a, b in zip(incremental, full))
+    if isinstance(full, (float, np.floating)):
+        return math.isclose(incremental, full, rel_tol=1e-9, abs_tol=1e-12)
+    return incremental == full
+
+
+def random_edit(text, rng):
+    start = rng.randrange(len(text) + 1)
+    stop = min(len(text), start + rng.randrange(40))
+    choice = rng.random()
+    if choice < 0.35:
+        return text[:start] + rng.choice(INSERTS) + text[start:]
+    if choice < 0.6:
+        return text[:start] + text[stop:]
+    if choice < 0.85:
+        return text[:start] + rng.choice(SENTENCES) + text[stop:]
+    if choice < 0.95:
+        # Repeated sentences make exact ties in the averaged metrics likely
+        return text + rng.choice(SENTENCES) * rng.randint(1, 4)
+    return rng.choice(["", "x", ". ", "".join(SENTENCES)])
+
+
+@pytest.fixture
+def ngram_dir(tmp_path, monkeypatch):
+    """Calibrated reference models for every language the test texts can be detected as"""
+    monkeypatch.setattr(ngram, "NGRAM_DIR", str(tmp_path))
+    monkeypatch.setattr(ngram, "_models", {})
+    rng = random.Random(1)
+    documents = [ngram.tokenize("".join(rng.choice(SENTENCES) for _ in range(8))) for _ in range(250)]
+    training, held_out = ngram.split_holdout(documents)
+    tables, unk_log10 = ngram.build_tables(training, order=3)
+    thresholds = ngram.calibrate(tables, unk_log10, held_out)
+    for code in ("hi", "en", "bn"):
+        ngram.write_model(tables, unk_log10, ngram.model_path(code), thresholds)
+    return tmp_path
+
+
+def check_random_edits(seed):
+    rng = random.Random(seed)
+    text = "".join(rng.choice(SENTENCES) for _ in range(12))
+    analyzer = IncrementalTextAnalyzer()
+    for step in range(300):
+        result = analyzer.update(text)
+        assert [features.text for features in analyzer.segments] == split_segments(text), step
+        np.testing.assert_array_equal(analyzer.gaps, repeat_gaps(analyzer.word_ids))
+        assert close(result, enhanced_text_analysis(text)), step
+        text = random_edit(text, rng)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_random_edits_match_full_analysis(seed):
+    check_random_edits(seed)
+
+
+@pytest.mark.parametrize("seed", range(2))
+def test_random_edits_match_full_analysis_with_reference_models(ngram_dir, seed):
+    check_random_edits(seed)
+
+
+def test_edit_rescores_only_nearby_segments(ngram_dir, monkeypatch):
+    text = "".join(SENTENCES) * 50
+    analyzer = IncrementalTextAnalyzer()
+    analyzer.update(text)
+    scored = []
+    log10_probs = ngram.NGramModel.log10_probs
+    monkeypatch.setattr(ngram.NGramModel, "log10_probs",
+                        lambda model, tokens, positions=None: scored.append(tokens) or log10_probs(model, tokens, positions))
+    middle = len(text) // 2
+    edited = text[:middle] + " नया शब्द " + text[middle:]
+    assert close(analyzer.update(edited), enhanced_text_analysis(edited))
+    assert 0 < len(scored) <= 4
+
+
+def test_edit_reanalyses_only_nearby_segments():
+    text = "".join(SENTENCES) * 20
+    analyzer = IncrementalTextAnalyzer()
+    analyzer.update(text)
+    middle = len(text) // 2
+    _, _, insights = analyzer.update(text[:middle] + " नया शब्द " + text[middle:])
+    assert insights['incremental']['reanalyzed'] <= 3
+    assert insights['incremental']['segments'] == len(analyzer.segments)
+
+
+def test_sentence_scores_cover_the_text():
+    text = "".join(SENTENCES)
+    analyzer = IncrementalTextAnalyzer()
+    analyzer.update(text)
+    scores = analyzer.sentence_scores()
+    assert "".join(score['text'] for score in scores) == text
+    assert all(0 <= score['ai_prob'] <= 1 for score in scores)
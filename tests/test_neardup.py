@@ -0,0 +1,53 @@
+import random
+
+import numpy as np
+import pytest
+
+from detector import cache as cache_module
+from detector.cache import ResultCache, cached_score_text
+from detector.neardup import NearDuplicateIndex, text_signature
+
+VOCABULARY = [f"word{i}" for i in range(2000)]
+
+
+def edited_pair(n, rng):
+    words = [rng.choice(VOCABULARY) for _ in range(n)]
+    edited = list(words)
+    edited[rng.randrange(n)] = rng.choice(VOCABULARY)
+    return " ".join(words), " ".join(edited)
+
+
+@pytest.mark.parametrize("n,recall", [(31, 0.9), (40, 0.97)])
+def test_one_word_edit_is_matched(n, recall):
+    rng = random.Random(n)
+    index = NearDuplicateIndex("text")
+    found = 0
+    for i in range(200):
+        text, edited = edited_pair(n, rng)
+        index.add(i, text_signature(text))
+        match = index.query(text_signature(edited))
+        found += match is not None and match[0] == i
+    assert found / 200 >= recall
+
+
+def test_short_and_unrelated_texts_are_not_matched():
+    rng = random.Random(0)
+    assert text_signature(" ".join(VOCABULARY[:30])) is None
+    index = NearDuplicateIndex("text")
+    for i in range(200):
+        index.add(i, text_signature(edited_pair(40, rng)[0]))
+    assert all(index.query(text_signature(edited_pair(40, rng)[0])) is None for _ in range(200))
+
+
+@pytest.mark.parametrize("path", ["", "results.sqlite3"])
+def test_near_hits_are_counted_apart_from_exact_hits(path, tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_module, "NEAR_DUPLICATES", True)
+    cache = ResultCache(path=str(tmp_path / path) if path else "")
+    text, edited = edited_pair(60, random.Random(1))
+    first = cached_score_text(text, cache=cache)
+    near = cached_score_text(edited, cache=cache)
+    assert near['near_duplicate']['distance'] <= near['near_duplicate']['max_distance']
+    assert np.isclose(near['ai_prob'], first['ai_prob'])
+    assert cached_score_text(text, cache=cache) == first
+    stats = cache.stats()
+    assert (stats['memory_hits'], stats['disk_hits'], stats['misses'], stats['near_duplicate_hits']) == (1, 0, 2, 1)
@@ -0,0 +1,101 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("torch")
+
+from detector import models  # noqa: E402
+from detector.scheduler import InferenceScheduler, SchedulerBusy, SchedulerTimeout  # noqa: E402
+
+
+class FakeModel:
+    """detect_images stand-in that scores each image as its own value and can be held mid-batch"""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.release.set()
+        self.started = threading.Event()
+        self.batches = []
+
+    def __call__(self, images, batch_size=None):
+        self.batches.append(list(images))
+        self.started.set()
+        self.release.wait(10)
+        return [{'ai_prob': image, 'real_prob': 1 - image} for image in images]
+
+
+@pytest.fixture
+def model(monkeypatch):
+    fake = FakeModel()
+    monkeypatch.setattr(models, "detect_images", fake)
+    return fake
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = InferenceScheduler(max_wait_ms=1, max_queue=4, timeout=5)
+    yield scheduler
+    scheduler.close()
+
+
+def in_thread(target, *args, **kwargs):
+    outcome = {}
+
+    def run():
+        try:
+            outcome['result'] = target(*args, **kwargs)
+        except Exception as exc:
+            outcome['error'] = exc
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, outcome
+
+
+def hold(model, scheduler):
+    """Occupy the inference thread with one running batch"""
+    model.release.clear()
+    model.started.clear()
+    thread, outcome = in_thread(scheduler.submit, [0.5])
+    assert model.started.wait(5)
+    return thread, outcome
+
+
+def wait_for_queue(scheduler, images):
+    deadline = time.monotonic() + 5
+    while scheduler.stats()['queue_depth'] != images and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert scheduler.stats()['queue_depth'] == images
+
+
+def test_results_come_back_in_order(model, scheduler):
+    assert [result['ai_prob'] for result in scheduler.submit([0.1, 0.2, 0.3])] == [0.1, 0.2, 0.3]
+
+
+def test_queue_is_bounded_by_images(model, scheduler):
+    running, _ = hold(model, scheduler)
+    waiting, outcome = in_thread(scheduler.submit, [0.1, 0.2, 0.3])
+    wait_for_queue(scheduler, 3)
+    with pytest.raises(SchedulerBusy):
+        scheduler.submit([0.4, 0.5])
+    model.release.set()
+    running.join(5)
+    waiting.join(5)
+    assert [result['ai_prob'] for result in outcome['result']] == [0.1, 0.2, 0.3]
+    assert scheduler.stats()['rejected'] == 1
+
+
+def test_large_request_runs_when_the_queue_is_empty(model, scheduler):
+    assert len(scheduler.submit([0.1] * 10)) == 10
+
+
+def test_timeout_fails_cleanly_and_drops_the_request(model, scheduler):
+    running, _ = hold(model, scheduler)
+    with pytest.raises(SchedulerTimeout):
+        scheduler.submit([0.9], timeout=0.05)
+    model.release.set()
+    running.join(5)
+    assert scheduler.submit([0.2]) == [{'ai_prob': 0.2, 'real_prob': 0.8}]
+    assert [0.9] not in model.batches
+    stats = scheduler.stats()
+    assert (stats['timed_out'], stats['queue_depth']) == (1, 0)
@@ -0,0 +1,124 @@
+import io
+import math
+import random
+
+import numpy as np
+import pytest
+
+from detector import ngram
+from detector.streaming import analyze_stream
+from detector.text import calculate_perplexity, enhanced_text_analysis
+
+WORDS = {
+    'hi': "यह एक छोटा परीक्षण है और इसमें कुछ शब्द हैं मैं कल बाज़ार गया था लेकिन दुकान बंद थी हालांकि यार वाह".split(),
+    'en': "This is a plain sentence with several words however it is important to note that I we you".split(),
+    'bn': "আমি আজ স্কুলে যাব এবং বন্ধুদের সাথে দেখা করব তবে বৃষ্টি হলে বাড়িতে থাকব".split(),
+}
+PUNCTUATION = [".", "!", "?", "।", "॥", "..."]
+# 1 and 7 split nearly every word, sentence and (as UTF-8 bytes) multi-byte character
+CHUNK_SIZES = [1, 7, 64, 1 << 16]
+
+
+def document(seed, sentences=80, languages=tuple(WORDS)):
+    rng = random.Random(seed)
+    parts = []
+    for _ in range(sentences):
+        words = WORDS[rng.choice(languages)]
+        parts.append(" ".join(rng.choice(words) for _ in range(rng.randint(1, 16))) + rng.choice(PUNCTUATION))
+    return rng.choice([" ", "\n", "  "]).join(parts)
+
+
+def close(streamed, full):
+    """Equal results, comparing floats with a tolerance (running sums add up in another order)"""
+    if isinstance(full, dict):
+        assert set(streamed) - {'streaming', 'windows'} == set(full)
+        return all(close(streamed[key], full[key]) for key in full)
+    if isinstance(full, (list, tuple)):
+        return len(streamed) == len(full) and all(close(a, b) for a, b in zip(streamed, full))
+    if isinstance(full, (float, np.floating)):
+        return math.isclose(streamed, full, rel_tol=1e-9, abs_tol=1e-12)
+    return streamed == full
+
+
+def byte_chunks(text, size):
+    data = text.encode("utf-8")
+    return (data[start:start + size] for start in range(0, len(data), size))
+
+
+@pytest.fixture(autouse=True)
+def no_reference_models(tmp_path, monkeypatch):
+    monkeypatch.setattr(ngram, "NGRAM_DIR", str(tmp_path))
+    monkeypatch.setattr(ngram, "_models", {})
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("chunk_chars", CHUNK_SIZES)
+def test_string_chunks_match_full_analysis(seed, chunk_chars):
+    text = document(seed)
+    assert close(analyze_stream(text, chunk_chars=chunk_chars), enhanced_text_analysis(text))
+
+
+@pytest.mark.parametrize("chunk_bytes", [1, 2, 5, 4096])
+def test_byte_chunks_split_inside_characters(chunk_bytes):
+    text = document(3)
+    expected = enhanced_text_analysis(text)
+    assert close(analyze_stream(byte_chunks(text, chunk_bytes)), expected)
+    assert close(analyze_stream(io.BytesIO(text.encode("utf-8")), chunk_chars=chunk_bytes), expected)
+    assert close(analyze_stream(io.StringIO(text), chunk_chars=chunk_bytes), expected)
+
+
+@pytest.mark.parametrize("text", ["", "   ", "एक", "no delimiters at all in this short text", "।।।", "word. " * 30])
+def test_edge_cases_match_full_analysis(text):
+    for chunk_chars in (1, 3, 100):
+        assert close(analyze_stream(text, chunk_chars=chunk_chars), enhanced_text_analysis(text))
+
+
+def test_reference_model_matches_full_analysis(tmp_path):
+    tables, unk_log10 = ngram.build_tables([ngram.tokenize(document(seed, languages=('hi',))) for seed in range(10, 14)],
+                                           order=3)
+    held_out = [ngram.tokenize(document(seed, sentences=5, languages=('hi',))) for seed in range(20, 50)]
+    ngram.write_model(tables, unk_log10, ngram.model_path("hi"), ngram.calibrate(tables, unk_log10, held_out))
+    text = document(5, languages=('hi', 'en'))[:3000] + document(6, languages=('hi',))
+    expected = enhanced_text_analysis(text)
+    assert expected[2]['language']['code'] == 'hi'
+    assert expected[2]['advanced_metrics']['perplexity'] != calculate_perplexity(text)
+    for chunk_chars in (1, 7, 1 << 16):
+        assert close(analyze_stream(text, chunk_chars=chunk_chars), expected)
+
+
+@pytest.mark.parametrize("chunk_chars", [1, 13, 1 << 16])
+def test_windows_score_their_words(chunk_chars):
+    text = document(4, sentences=120)
+    words = text.split()
+    _, _, insights = analyze_stream(text, chunk_chars=chunk_chars, window_words=50, window_step=20)
+    windows = insights['windows']
+    assert [window['start_word'] for window in windows[:-1]] == list(range(0, 20 * (len(windows) - 1), 20))
+    assert windows[-1]['end_word'] == len(words)
+    for window in windows:
+        assert window['end_word'] - window['start_word'] == 50
+        ai_prob, human_prob, _ = enhanced_text_analysis(" ".join(words[window['start_word']:window['end_word']]))
+        assert (window['ai_prob'], window['human_prob']) == (ai_prob, human_prob)
+
+
+def test_windows_go_to_the_callback():
+    text = document(4)
+    received = []
+    _, _, insights = analyze_stream(text, window_words=30, on_window=received.append)
+    assert 'windows' not in insights and received
+    assert received == analyze_stream(text, window_words=30)[2]['windows']
+
+
+def test_vocabulary_cap_bounds_memory():
+    rng = random.Random(0)
+    text = " ".join(f"w{rng.randrange(5000)}" for _ in range(20000)) + "."
+    _, _, insights = analyze_stream(text, chunk_chars=1000, max_vocab=1000)
+    assert insights['streaming']['vocab_pruned']
+    assert insights['streaming']['vocab_size'] <= 1000
+
+
+def test_results_unchanged_below_the_vocabulary_cap():
+    text = document(6)
+    uncapped = analyze_stream(text, max_vocab=0)
+    capped = analyze_stream(text, max_vocab=len(set(text.lower().split())))
+    assert not capped[2]['streaming']['vocab_pruned']
+    assert close(capped, uncapped[:2] + ({k: v for k, v in uncapped[2].items() if k != 'streaming'},))
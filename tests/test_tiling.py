@@ -0,0 +1,47 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from detector import tiling
+from detector.image import open_image
+
+
+def fake_forward(patches, batch_size, scheduler):
+    """Scores each patch by its pixels, so any change in what is cropped shows up in the heatmap"""
+    results = []
+    for patch in patches:
+        assert patch.image.mode == "RGB"
+        pixels = np.asarray(patch.image, dtype=np.float64)
+        ai_prob = float((pixels * np.arange(1, 4)).mean() / (255 * 6) + pixels[::7, ::5].std() / 1e4)
+        results.append({'ai_prob': ai_prob, 'real_prob': 1 - ai_prob})
+    return results
+
+
+def rgb_tiled(source, **options):
+    """score_tiled as it was, on the upload converted to RGB before cropping"""
+    return tiling.score_tiled(open_image(source), **options)
+
+
+@pytest.fixture(autouse=True)
+def no_model(monkeypatch):
+    monkeypatch.setattr(tiling, "_forward", fake_forward)
+
+
+@pytest.mark.parametrize("mode", ["RGB", "L", "P", "RGBA", "LA", "CMYK"])
+@pytest.mark.parametrize("size", [(700, 500), (224, 224), (100, 300)])
+def test_native_mode_crops_match_rgb_crops(mode, size):
+    pixels = np.random.default_rng(0).integers(0, 256, size[::-1] + (3,), dtype=np.uint8)
+    image = Image.fromarray(pixels).convert(mode)
+    buffer = io.BytesIO()
+    image.save(buffer, format="TIFF" if mode == "CMYK" else "PNG")
+    for source in (image, buffer.getvalue()):
+        assert tiling.score_tiled(source, stride=150) == rgb_tiled(source, stride=150)
+
+
+def test_early_stop_and_heatmap_shape():
+    image = Image.new("RGB", (1000, 700), (255, 255, 255))
+    result = tiling.score_tiled(image, batch_size=4, early_stop=0.4, min_tiles=4)
+    assert result['early_stopped'] and result['tiles_scored'] == 4
+    assert result['grid'] == [4, 5] and sum(value is not None for row in result['heatmap'] for value in row) == 4